@@ -4,17 +4,23 @@ import re
 import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
+from summary_stats import SUMMARY_THRESHOLD, summarize_categories, largest_category_size, draw_summary
+
+# Keywords identifying the rows with the three SV categories
+keywords = [
+    "Number of deletions (PASS)",
+    "Number of insertions (PASS)",
+    "Number of duplications (PASS)"
+]
+
+def extract_rows(lines):
+    """ Returns the comma-split rows of one sv_metrics file that contain one of the keywords. """
+    return [line.strip().split(',') for line in lines if any(keyword in line for keyword in keywords)]
 
 def find_and_extract_data(root_directory):
     # Define the file name pattern
     file_pattern = re.compile(r'^\d+\.sv_metrics\.csv$')
-    # Define the keywords to search for rows with the categories
-    keywords = [
-        "Number of deletions (PASS)", 
-        "Number of insertions (PASS)",
-        "Number of duplications (PASS)"
-    ]
-    
+
     # Initialize an empty list to hold extracted rows
     collected_data = []
     
@@ -27,9 +33,7 @@ def find_and_extract_data(root_directory):
                 print(f"Processing file: {file_path}")
                 # Open the file and extract rows containing the keywords
                 with open(file_path, 'r') as f:
-                    for line in f:
-                        if any(keyword in line for keyword in keywords):
-                            collected_data.append(line.strip().split(','))  # Split by comma
+                    collected_data.extend(extract_rows(f))
     
     # Convert collected data to a Pandas DataFrame
     if collected_data:
@@ -39,32 +43,45 @@ def find_and_extract_data(root_directory):
         print("No matching data found.")
         return pd.DataFrame()
 
-def create_bar_plot(data):
+def create_bar_plot(data, summary_threshold=SUMMARY_THRESHOLD, summary_kind="box",
+                    output_plot_file="deletions_insertions_duplications_bar_plot_with_dots.png"):
     # Create a DataFrame with necessary columns
     data.columns = ["Type", "ID", "Category", "Value", "Percentage"]
     
-    # Filter only the relevant rows for the three categories
-    data_filtered = data[data["Category"].isin([
-        "Number of deletions (PASS)", 
-        "Number of insertions (PASS)", 
+    categories = [
+        "Number of deletions (PASS)",
+        "Number of insertions (PASS)",
         "Number of duplications (PASS)"
-    ])]
+    ]
+    custom_labels = ["Deletions", "Insertions", "Duplications"]
+
+    # Filter only the relevant rows for the three categories
+    data_filtered = data[data["Category"].isin(categories)]
     
     # Convert 'Value' to numeric (if necessary) and handle missing values
     data_filtered['Value'] = pd.to_numeric(data_filtered['Value'], errors='coerce')
     data_filtered = data_filtered.dropna(subset=['Value'])  # Drop rows with invalid 'Value'
 
-    # Create a bar plot for the three categories
+    values_by_category = {
+        label: data_filtered.loc[data_filtered["Category"] == category, "Value"].to_numpy()
+        for category, label in zip(categories, custom_labels)
+    }
+
     plt.figure(figsize=(10, 6))
-    sns.barplot(x="Category", y="Value", data=data_filtered, palette="Set2", ci=None)
-    
-    # Custom x-tick labels for the categories
-    custom_labels = ["Deletions", "Insertions", "Duplications"]
-    plt.xticks(ticks=range(len(custom_labels)), labels=custom_labels, rotation=0)  # Adjust ticks and labels
-    
-    # Add individual black dots for each data point
-    sns.stripplot(x="Category", y="Value", data=data_filtered, color='black', jitter=True, size=6, dodge=True)
-    
+    if largest_category_size(values_by_category) > summary_threshold:
+        # Large cohorts: summary plot from precomputed statistics instead of one dot per sample
+        stats = summarize_categories(values_by_category)
+        draw_summary(plt.gca(), stats, sns.color_palette("Set2"), kind=summary_kind)
+    else:
+        # Create a bar plot for the three categories
+        sns.barplot(x="Category", y="Value", data=data_filtered, palette="Set2", ci=None)
+
+        # Custom x-tick labels for the categories
+        plt.xticks(ticks=range(len(custom_labels)), labels=custom_labels, rotation=0)  # Adjust ticks and labels
+
+        # Add individual black dots for each data point
+        sns.stripplot(x="Category", y="Value", data=data_filtered, color='black', jitter=True, size=6, dodge=True)
+
     # Add titles and labels
     plt.title("Number of Deletions, Insertions, and Duplications")
     plt.ylabel("Count")
@@ -73,7 +90,6 @@ def create_bar_plot(data):
     plt.tight_layout()
 
     # Save the plot
-    output_plot_file = "deletions_insertions_duplications_bar_plot_with_dots.png"
     plt.savefig(output_plot_file)
     plt.close()
     print(f"Bar plot with dots saved as {output_plot_file}")
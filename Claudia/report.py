@@ -0,0 +1,112 @@
+import os
+import re
+import argparse
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+# Select the non-interactive backend before any plotting module imports pyplot
+import matplotlib
+matplotlib.use("Agg")
+
+import label
+import v_metrics_plot
+import total_var_plot
+import del_ins_dup_plot
+from summary_stats import SUMMARY_THRESHOLD
+
+vc_pattern = re.compile(r'^(\d+)\.vc_metrics\.csv$')
+sv_pattern = re.compile(r'^\d+\.sv_metrics\.csv$')
+
+def load_metrics(root_directory):
+    """
+    Walk root_directory once and parse every metrics file needed by the figures.
+    Each file is read a single time and its lines handed to the per-figure parsers.
+    """
+    metric_rows = {}
+    total_rows = []
+    sv_rows = []
+
+    for root, _, files in os.walk(root_directory):
+        for file_name in files:
+            if not file_name.endswith(".csv"):
+                continue
+            file_path = os.path.join(root, file_name)
+            sample = os.path.relpath(file_path, root_directory)[:-len(".csv")]
+            try:
+                with open(file_path, 'r') as f:
+                    lines = f.readlines()
+
+                metric_rows[sample] = label.parse_metric_lines(lines, label.target_strings, file_name)
+
+                vc_match = vc_pattern.match(file_name)
+                if vc_match:
+                    total_rows.extend(total_var_plot.parse_total_lines(lines, vc_match.group(1)))
+                if sv_pattern.match(file_name):
+                    sv_rows.extend(del_ins_dup_plot.extract_rows(lines))
+            except Exception as e:
+                print(f"Error processing {file_name}: {e}")
+
+    metrics = label.build_metrics_matrix(metric_rows, label.target_strings)
+    totals = pd.DataFrame(total_rows, columns=["Sample", "Category", "Record"])
+    sv_data = pd.DataFrame(sv_rows)
+    return metrics, totals, sv_data
+
+def plan_figures(metrics, totals, sv_data, output_dir, summary_threshold, summary_kind):
+    """ List the (function, args, kwargs) render jobs for the figures that have data. """
+    jobs = []
+    if not metrics.empty:
+        summary = {"summary_threshold": summary_threshold, "summary_kind": summary_kind}
+        jobs.append((label.create_combined_plots, (metrics,),
+                     dict(summary, output_plot_file=os.path.join(output_dir, "anna.png"))))
+        jobs.append((v_metrics_plot.create_combined_plots, (metrics,),
+                     dict(summary, output_plot_file=os.path.join(output_dir, "variants_plot.png"))))
+    if not totals.empty:
+        jobs.append((total_var_plot.flower_plot, (totals,),
+                     {"output_plot_file": os.path.join(output_dir, "total_plot.png")}))
+    if not sv_data.empty:
+        jobs.append((del_ins_dup_plot.create_bar_plot, (sv_data,),
+                     {"summary_threshold": summary_threshold, "summary_kind": summary_kind,
+                      "output_plot_file": os.path.join(
+                          output_dir, "deletions_insertions_duplications_bar_plot_with_dots.png")}))
+    return jobs
+
+def _render(job):
+    """ Run one render job inside a worker process. """
+    func, args, kwargs = job
+    func(*args, **kwargs)
+    return kwargs["output_plot_file"]
+
+def render_report(root_directory, output_dir, workers=None,
+                  summary_threshold=SUMMARY_THRESHOLD, summary_kind="box"):
+    """ Load the metrics once and render every figure in parallel into output_dir. """
+    os.makedirs(output_dir, exist_ok=True)
+    metrics, totals, sv_data = load_metrics(root_directory)
+    jobs = plan_figures(metrics, totals, sv_data, output_dir, summary_threshold, summary_kind)
+    if not jobs:
+        print("No matching data found.")
+        return []
+
+    with ProcessPoolExecutor(max_workers=workers or len(jobs)) as pool:
+        outputs = list(pool.map(_render, jobs))
+    print(f"Report written to {output_dir} ({len(outputs)} figures)")
+    return outputs
+
+def main():
+    parser = argparse.ArgumentParser(description="Render all Claudia metric plots from one directory scan.")
+    parser.add_argument("root_directory", help="Directory containing the *_metrics.csv files")
+    parser.add_argument("--output-dir", default=".", help="Where to write the PNG files")
+    parser.add_argument("--workers", type=int, default=None, help="Number of render processes")
+    parser.add_argument("--summary-threshold", type=int, default=SUMMARY_THRESHOLD,
+                        help="Sample count above which summary plots replace bar + strip plots")
+    parser.add_argument("--summary-kind", choices=["box", "violin", "density"], default="box",
+                        help="Summary plot used above the threshold")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.root_directory):
+        parser.error(f"{args.root_directory} is not a valid directory.")
+
+    render_report(args.root_directory, args.output_dir, args.workers,
+                  args.summary_threshold, args.summary_kind)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import numpy as np
+
+# Above this many samples per category, bar + strip plots are replaced by summary plots
+SUMMARY_THRESHOLD = 500
+
+def summarize_categories(values_by_category, bins=50):
+    """
+    Precompute per-category summary statistics (mean, quartiles, whiskers, histogram).
+    values_by_category maps a category name to a 1-D array of values; NaNs are ignored.
+    The returned dicts can be passed directly to matplotlib's Axes.bxp.
+    """
+    stats = []
+    for category, values in values_by_category.items():
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            continue
+
+        q1, median, q3 = np.percentile(values, [25, 50, 75])
+        iqr = q3 - q1
+        # Whiskers stop at the most extreme values inside 1.5 IQR, as in a standard box plot
+        inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+        counts, bin_edges = np.histogram(values, bins=bins)
+
+        stats.append({
+            "label": category,
+            "n": values.size,
+            "mean": values.mean(),
+            "med": median,
+            "q1": q1,
+            "q3": q3,
+            "whislo": inside.min(),
+            "whishi": inside.max(),
+            "min": values.min(),
+            "max": values.max(),
+            "fliers": np.empty(0),
+            "hist": counts,
+            "bin_edges": bin_edges,
+        })
+    return stats
+
+def largest_category_size(values_by_category):
+    """ Number of non-missing values in the most populated category. """
+    return max((int(np.count_nonzero(~np.isnan(np.asarray(v, dtype=float))))
+                for v in values_by_category.values()), default=0)
+
+def draw_summary(ax, stats, colors, kind="box", annotate=False, label_format="{:.2f}"):
+    """
+    Draw precomputed category summaries on ax without touching the raw values.
+    kind is "box" (quartiles and whiskers), "violin" (histogram-shaped density)
+    or "density" (per-category 2-D histogram strip, the aggregated analogue of a hexbin).
+    """
+    positions = np.arange(len(stats))
+    colors = [colors[i % len(colors)] for i in positions]
+
+    if kind == "box":
+        boxes = ax.bxp(stats, positions=positions, patch_artist=True,
+                       showmeans=True, showfliers=False)
+        for patch, color in zip(boxes["boxes"], colors):
+            patch.set_facecolor(color)
+            patch.set_alpha(0.8)
+    elif kind == "violin":
+        vpstats = []
+        for s in stats:
+            centers = (s["bin_edges"][:-1] + s["bin_edges"][1:]) / 2
+            density = s["hist"] / max(s["hist"].max(), 1)
+            vpstats.append({"coords": centers, "vals": density, "mean": s["mean"],
+                            "median": s["med"], "min": s["min"], "max": s["max"]})
+        parts = ax.violin(vpstats, positions=positions, showmeans=True, showmedians=True)
+        for body, color in zip(parts["bodies"], colors):
+            body.set_facecolor(color)
+            body.set_alpha(0.8)
+    elif kind == "density":
+        for pos, s in zip(positions, stats):
+            ax.pcolormesh([pos - 0.4, pos + 0.4], s["bin_edges"], s["hist"][:, np.newaxis],
+                          cmap="Greys", shading="flat")
+            ax.hlines(s["mean"], pos - 0.4, pos + 0.4, color=colors[pos], linewidth=2)
+    else:
+        raise ValueError(f"Unknown summary plot kind: {kind}")
+
+    ax.set_xticks(positions)
+    ax.set_xticklabels([s["label"] for s in stats])
+
+    # One label per category (the mean), instead of one per bar patch
+    if annotate:
+        for pos, s in zip(positions, stats):
+            ax.annotate(label_format.format(s["mean"]), (pos, s["max"]),
+                        ha='center', va='center', fontsize=10, color='red',
+                        xytext=(0, 20), textcoords='offset points')
@@ -3,8 +3,8 @@ import re
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
-import matplotlib.colors as mcolors
-from matplotlib.cm import get_cmap
+from matplotlib import colormaps
+from matplotlib.collections import PolyCollection
 import sys
 
 # Function to build the database from CSV files in a directory
@@ -29,78 +29,112 @@ def build_database(root_directory):
 
                 # Read the file and process its contents
                 with open(file_path, 'r') as f:
-                    for line in f:
-                        parts = line.strip().split(",")  # Split the line into columns
-                        if len(parts) < 4:  # Skip invalid lines
-                            continue
-                        if parts[2].strip() in categories_to_extract:  # Filter by category
-                            category = parts[2].strip()
-                            record = float(parts[3].strip())
-                            data.append({"Sample": sample, "Category": category, "Record": record})
+                    data.extend(parse_total_lines(f, sample, categories_to_extract))
 
     # Convert the collected data to a DataFrame
     df = pd.DataFrame(data, columns=["Sample", "Category", "Record"])
     return df
 
+def parse_total_lines(lines, sample, categories_to_extract=("Total",)):
+    """
+    Extract the requested categories from the lines of one vc_metrics file
+    as a list of {"Sample", "Category", "Record"} rows.
+    """
+    rows = []
+    for line in lines:
+        parts = line.strip().split(",")  # Split the line into columns
+        if len(parts) < 4:  # Skip invalid lines
+            continue
+        if parts[2].strip() in categories_to_extract:  # Filter by category
+            category = parts[2].strip()
+            record = float(parts[3].strip())
+            rows.append({"Sample": sample, "Category": category, "Record": record})
+    return rows
+
+# Above this many samples only every n-th bar gets a text label
+MAX_LABELS = 200
+
 # Function to create a flower plot for the Total category
-def flower_plot(df):
+def flower_plot(df, output_plot_file="total_plot.png", seed=None, cmap="turbo",
+                max_labels=MAX_LABELS, show=False):
     """
     Create a polar bar plot ("flower plot") for the Total category.
+    Colors are drawn from cmap with a seeded generator, labels are thinned to at most
+    max_labels, and the figure is only shown interactively when show=True.
     """
     total_data = df[df['Category'] == 'Total']  # Filter data for the Total category
     if total_data.empty:
         print("No data found for category 'Total'. Exiting.")
         return
 
+    n_samples = len(total_data.index)
+
     # Normalize heights of bars
-    max_value = total_data['Record'].max()
-    heights = (total_data['Record'] / max_value) * 70 + 30  # Normalize heights
-    width = 2 * np.pi / len(total_data.index)  # Equal width for all bars
-    angles = np.arange(len(total_data.index)) * width
+    records = total_data['Record'].to_numpy(dtype=float)
+    heights = (records / records.max()) * 70 + 30  # Normalize heights
+    width = 2 * np.pi / n_samples  # Equal width for all bars
+    angles = np.arange(n_samples) * width
 
-    # Generate 200 random colors
-    random_colors = [mcolors.to_hex(np.random.rand(3)) for _ in range(len(total_data))]
+    # One vectorized draw of reproducible random colors from the colormap
+    rng = np.random.default_rng(seed)
+    random_colors = colormaps[cmap](rng.random(n_samples))
 
     # Create the polar plot
-    plt.figure(figsize=(10, 10))
-    ax = plt.subplot(111, polar=True)
-
-    bars = ax.bar(
-        x=angles,
-        height=heights,
-        width=width,
-        bottom=30,  # Set the radial base
-        color=random_colors,
-        edgecolor="white",
-        linewidth=1.5
-    )
-
-    # Add labels to the bars
+    fig = plt.figure(figsize=(10, 10))
+    ax = fig.add_subplot(111, polar=True)
+
+    if n_samples <= max_labels:
+        ax.bar(
+            x=angles,
+            height=heights,
+            width=width,
+            bottom=30,  # Set the radial base
+            color=random_colors,
+            edgecolor="white",
+            linewidth=1.5
+        )
+    else:
+        # Thousands of Rectangle artists are slow to build and draw: one PolyCollection
+        # of (theta, r) quadrilaterals renders the same wedges in a single artist
+        left, right = angles - width / 2, angles + width / 2
+        base, top = np.full(n_samples, 30.0), 30 + heights
+        wedges = np.stack([np.column_stack([left, base]), np.column_stack([right, base]),
+                           np.column_stack([right, top]), np.column_stack([left, top])], axis=1)
+        ax.add_collection(PolyCollection(wedges, facecolors=random_colors, linewidths=0))
+        ax.autoscale_view()
+
+    # Add labels to the bars, thinned so at most max_labels text artists are laid out
+    step = max(1, int(np.ceil(n_samples / max_labels)))
+    label_idx = np.arange(0, n_samples, step)
+    label_angles = angles[label_idx]
+    right = (label_angles >= np.pi / 2) & (label_angles < 3 * np.pi / 2)
+    rotations = np.rad2deg(label_angles) + np.where(right, 180, 0)
     label_padding = 5
-    for bar, angle, label in zip(bars, angles, total_data["Sample"]):
-        rotation = np.rad2deg(angle)
-        alignment = "left" if angle < np.pi / 2 or angle >= 3 * np.pi / 2 else "right"
-        rotation += 180 if alignment == "right" else 0
+    samples = total_data["Sample"].to_numpy()
+    for i, angle, rotation, is_right in zip(label_idx, label_angles, rotations, right):
         ax.text(
             x=angle,
-            y=30 + bar.get_height() + label_padding,
-            s=label,
-            ha=alignment,
+            y=30 + heights[i] + label_padding,
+            s=samples[i],
+            ha="right" if is_right else "left",
             va='center',
             rotation=rotation,
             rotation_mode="anchor"
         )
 
     # Set plot title
-    ax.set_title("Total filtered variants", size=18, pad=20)
+    title = "Total filtered variants"
+    if step > 1:
+        title += f" ({n_samples} samples, one label every {step} samples)"
+    ax.set_title(title, size=18, pad=20)
     ax.axis('off')  # Remove grid and axis
 
-    plt.tight_layout()
-    output_plot_file = "total_plot.png"
-    plt.savefig(output_plot_file)
-    #plt.close()
+    fig.tight_layout()
+    fig.savefig(output_plot_file)
     print(f"Bar plot saved as {output_plot_file}")
-    plt.show()
+    if show:
+        plt.show()
+    plt.close(fig)
 
 # Main script
 if __name__ == "__main__":
@@ -0,0 +1,220 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+
+# Rows of the STR table annotated per block
+CHUNK_SIZE = 500_000
+
+# Column names the app gives to the 19-column dbNSFP annotation file (server-annotation.R)
+DBNSFP_COLUMNS = ['REF', 'ALT', 'dbsnp', 'GENENAME', 'PROTEIN_ensembl', 'field9',
+                  'MutationAssessor', 'SIFT', 'Polyphen2', 'M_CAP', 'CADD_PHED', 'AF_gnomAD',
+                  'ClinVar', 'clinvar_MedGen_id', 'HGVSc_VEP', 'HGVSp_VEP']
+
+# Store layout, one folder per source:
+#   <store>/<source>/index.tsv            chrom, row_start, n_rows (interval sources only)
+#   <store>/<source>/starts.npy, ends.npy 1-based inclusive coordinates, sorted by start per chromosome
+#   <store>/<source>/max_ends.npy         running maximum of ends per chromosome
+#   <store>/<source>/<column>.codes.npy   int32 code of every row, and
+#   <store>/<source>/<column>.categories.txt   the distinct values the codes point to
+
+def _write_columns(source_dir, df):
+    """ Columnar attributes: int32 codes per row plus the distinct values (categories) of each column. """
+    with open(os.path.join(source_dir, "columns.txt"), 'w') as f:
+        f.write("\n".join(df.columns) + "\n")
+    for column in df.columns:
+        codes, categories = pd.factorize(df[column].astype(str))
+        np.save(os.path.join(source_dir, f"{column}.codes.npy"), codes.astype(np.int32))
+        with open(os.path.join(source_dir, f"{column}.categories.txt"), 'w') as f:
+            f.write("\n".join(categories) + "\n")
+
+def _read_columns(source_dir):
+    """ Memory-mapped attributes of a source: {column: (codes, categories)}. """
+    with open(os.path.join(source_dir, "columns.txt")) as f:
+        columns = [line.rstrip('\n') for line in f if line.strip()]
+    attributes = {}
+    for column in columns:
+        with open(os.path.join(source_dir, f"{column}.categories.txt")) as f:
+            categories = np.array(f.read().split('\n')[:-1], dtype=object)
+        attributes[column] = (np.load(os.path.join(source_dir, f"{column}.codes.npy"), mmap_mode='r'), categories)
+    return attributes
+
+def read_interval_file(path, one_based=False):
+    """
+    Reads a BED-like file (chr, start, end, attributes...) with the column names the app uses:
+    4 columns -> SYMBOL (target/gene BED), 19 columns -> the dbNSFP annotation fields.
+    A '#' header line names the columns instead when present. Coordinates become 1-based inclusive.
+    """
+    with open(path) as f:
+        first = f.readline()
+    has_header = first.startswith('#')
+    df = pd.read_csv(path, sep='\t', header=None, dtype=str, keep_default_na=False,
+                     skiprows=1 if has_header else 0)
+    if has_header:
+        names = first.lstrip('#').rstrip('\n').split('\t')
+        df.columns = ['chr', 'start', 'end'] + names[3:]
+    elif df.shape[1] == 4:
+        df.columns = ['chr', 'start', 'end', 'SYMBOL']
+    elif df.shape[1] == 3 + len(DBNSFP_COLUMNS):
+        df.columns = ['chr', 'start', 'end'] + DBNSFP_COLUMNS
+    else:
+        df.columns = ['chr', 'start', 'end'] + [f"V{i + 1}" for i in range(3, df.shape[1])]
+    df['start'] = df['start'].astype(np.int64) + (0 if one_based else 1)
+    df['end'] = df['end'].astype(np.int64)
+    return df
+
+def compile_intervals(store_dir, name, df):
+    """ Writes one interval source: per-chromosome runs sorted by start, plus columnar attributes. """
+    source_dir = os.path.join(store_dir, name)
+    os.makedirs(source_dir, exist_ok=True)
+    df = df.sort_values(by=['chr', 'start'], kind='stable').reset_index(drop=True)
+
+    index = df.groupby('chr', sort=False).size().rename('n_rows').reset_index()
+    index['row_start'] = np.concatenate([[0], np.cumsum(index['n_rows'].to_numpy())[:-1]])
+    index[['chr', 'row_start', 'n_rows']].rename(columns={'chr': 'chrom'}).to_csv(
+        os.path.join(source_dir, "index.tsv"), sep='\t', index=False)
+
+    ends = df['end'].to_numpy()
+    max_ends = np.empty_like(ends)
+    for row_start, n_rows in zip(index['row_start'], index['n_rows']):
+        max_ends[row_start:row_start + n_rows] = np.maximum.accumulate(ends[row_start:row_start + n_rows])
+    np.save(os.path.join(source_dir, "starts.npy"), df['start'].to_numpy())
+    np.save(os.path.join(source_dir, "ends.npy"), ends)
+    np.save(os.path.join(source_dir, "max_ends.npy"), max_ends)
+    _write_columns(source_dir, df.drop(columns=['chr', 'start', 'end']))
+    print(f"Interval source '{name}' ({len(df)} intervals) saved to {source_dir}")
+
+def compile_table(store_dir, name, path):
+    """ Writes a keyed table (e.g. the OMIM gene TSV, joined on SYMBOL) as columnar attributes. """
+    source_dir = os.path.join(store_dir, name)
+    os.makedirs(source_dir, exist_ok=True)
+    df = pd.read_csv(path, sep='\t', dtype=str, keep_default_na=False)
+    _write_columns(source_dir, df)
+    print(f"Table '{name}' ({len(df)} rows) saved to {source_dir}")
+
+def load_table(store_dir, name):
+    """ A compiled keyed table back as a DataFrame. """
+    attributes = _read_columns(os.path.join(store_dir, name))
+    return pd.DataFrame({column: categories[codes] for column, (codes, categories) in attributes.items()})
+
+def open_intervals(store_dir, name):
+    """ (index, starts, ends, max_ends, attributes) of an interval source, all memory-mapped. """
+    source_dir = os.path.join(store_dir, name)
+    index = pd.read_csv(os.path.join(source_dir, "index.tsv"), sep='\t', dtype={'chrom': str})
+    arrays = [np.load(os.path.join(source_dir, f"{a}.npy"), mmap_mode='r') for a in ['starts', 'ends', 'max_ends']]
+    return (index.set_index('chrom'), *arrays, _read_columns(source_dir))
+
+def _store_chrom(index, chrom):
+    """ The store's name for a chromosome, accepting '1' for 'chr1' and the other way round. """
+    if chrom in index.index:
+        return chrom
+    alternative = chrom[3:] if chrom.startswith('chr') else f"chr{chrom}"
+    return alternative if alternative in index.index else None
+
+def overlap_join(chroms, starts, ends, intervals):
+    """
+    All (query row, store row) pairs whose 1-based inclusive ranges overlap.
+    Per chromosome, store rows that can reach a query lie between the first row whose running
+    maximum end reaches the query start and the last row starting before the query end; both
+    bounds come from one searchsorted each, and the pairs are expanded without a Python loop.
+    """
+    index, store_starts, store_ends, max_ends, _ = intervals
+    chroms = pd.Series(chroms).astype(str).to_numpy()
+    query_hits, store_hits = [], []
+    for chrom in pd.unique(chroms):
+        key = _store_chrom(index, chrom)
+        if key is None:
+            continue
+        row_start, n_rows = int(index.at[key, 'row_start']), int(index.at[key, 'n_rows'])
+        s = slice(row_start, row_start + n_rows)
+        rows = np.flatnonzero(chroms == chrom)
+        lo = np.searchsorted(max_ends[s], starts[rows], side='left')
+        hi = np.searchsorted(store_starts[s], ends[rows], side='right')
+        counts = np.maximum(hi - lo, 0)
+        if counts.sum() == 0:
+            continue
+        q = np.repeat(rows, counts)
+        j = np.repeat(lo, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        keep = np.asarray(store_ends[s])[j] >= starts[q]
+        query_hits.append(q[keep])
+        store_hits.append(j[keep] + row_start)
+    if not query_hits:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(query_hits), np.concatenate(store_hits)
+
+def annotate(df, intervals, prefix, columns=None):
+    """
+    Adds <prefix>_<column> to every row of an STR table (CHROM, POS, END), joining the values of
+    all overlapping intervals with ',' (distinct values, in store order); '.' where nothing overlaps.
+    """
+    attributes = intervals[4]
+    columns = columns or list(attributes)
+    pos = df['POS'].astype(np.int64).to_numpy()
+    end = pd.to_numeric(df['END'], errors='coerce').fillna(pd.Series(pos, index=df.index)).astype(np.int64).to_numpy()
+    query, store = overlap_join(df['CHROM'].to_numpy(), pos, end, intervals)
+
+    result = df.copy()
+    for column in columns:
+        codes, categories = attributes[column]
+        hit_values = categories[np.asarray(codes)[store]]
+        hits = pd.DataFrame({'row': query, 'value': hit_values}).drop_duplicates()
+        joined = hits.groupby('row', sort=False)['value'].agg(','.join)
+        annotation = np.full(len(df), '.', dtype=object)
+        annotation[joined.index.to_numpy()] = joined.to_numpy()
+        result[f"{prefix}_{column}"] = annotation
+    return result
+
+def annotate_file(txt_file, store_dir, sources, output_file, tables=(), chunk_size=CHUNK_SIZE):
+    """
+    Annotates a process_vcf_files output block by block with every interval source, then joins
+    keyed tables (name:KEY) on the matching annotation column, e.g. omim:SYMBOL on genes_SYMBOL.
+    Rows overlapping several genes carry a joined 'G1,G2' value and get no keyed-table match.
+    """
+    opened = {name: open_intervals(store_dir, name) for name in sources}
+    keyed = []
+    for spec in tables:
+        name, key = spec.split(':', 1)
+        keyed.append((load_table(store_dir, name), key))
+
+    first = True
+    for chunk in pd.read_csv(txt_file, sep='\t', dtype=str, keep_default_na=False, chunksize=chunk_size):
+        for name, intervals in opened.items():
+            chunk = annotate(chunk, intervals, name)
+        for table, key in keyed:
+            matches = [c for c in chunk.columns if c.endswith(f"_{key}")]
+            if matches:
+                joined = chunk.merge(table.drop_duplicates(key), how='left', left_on=matches[0],
+                                     right_on=key, suffixes=('', f"_{key}"))
+                chunk = joined.drop(columns=key if key not in chunk.columns else f"{key}_{key}").fillna('.')
+        chunk.to_csv(output_file, sep='\t', index=False, mode='w' if first else 'a', header=first)
+        first = False
+    print(f"Annotated table saved to {output_file}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile annotation sources into a memory-mapped store and annotate STR tables with it.")
+    parser.add_argument("store", help="Annotation store folder")
+    parser.add_argument("--bed", action='append', default=[], help="Interval source to compile, NAME=PATH (repeatable)")
+    parser.add_argument("--one-based", action='append', default=[], help="NAME of a --bed source with 1-based starts")
+    parser.add_argument("--table", action='append', default=[], help="Keyed TSV to compile, NAME=PATH (e.g. the OMIM gene table)")
+    parser.add_argument("--annotate", help="process_vcf_files output to annotate")
+    parser.add_argument("--sources", nargs='*', help="Interval sources to annotate with (default: all compiled)")
+    parser.add_argument("--join", action='append', default=[], help="Keyed table to join after annotation, NAME:KEY")
+    parser.add_argument("--output", default="annotated.txt", help="Annotated table")
+    args = parser.parse_args()
+
+    for spec in args.bed:
+        name, path = spec.split('=', 1)
+        compile_intervals(args.store, name, read_interval_file(path, one_based=name in args.one_based))
+    for spec in args.table:
+        name, path = spec.split('=', 1)
+        compile_table(args.store, name, path)
+
+    if args.annotate:
+        sources = args.sources
+        if sources is None:
+            sources = sorted(d for d in os.listdir(args.store)
+                             if os.path.exists(os.path.join(args.store, d, "index.tsv")))
+        annotate_file(args.annotate, args.store, sources, args.output, args.join)
+
+if __name__ == "__main__":
+    main()
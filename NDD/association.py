@@ -0,0 +1,207 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+KEY_COLUMNS = ['CHROM', 'POS', 'REF', 'ALT', 'END', 'REP_UNIT', 'VAR_ID']
+
+# Rows read (and tested) per block, to keep temporary arrays bounded on millions of loci
+CHUNK_SIZE = 500_000
+
+def load_allele_counts(txt_file, chunk_size=CHUNK_SIZE):
+    """
+    Reads only the key columns and AC of a process_vcf_files output (e.g. cases_1.txt).
+    Returns the table and the number of samples it was built from.
+    """
+    header = pd.read_csv(txt_file, sep='\t', nrows=0).columns
+    n_samples = len(header) - len(KEY_COLUMNS) - 1
+
+    chunks = pd.read_csv(txt_file, sep='\t', usecols=KEY_COLUMNS + ['AC'], dtype=str,
+                         keep_default_na=False, chunksize=chunk_size)
+    df = pd.concat(chunks, ignore_index=True)
+    df['POS'] = df['POS'].astype(np.int64)
+    df['AC'] = df['AC'].astype(np.int64)
+    return df, n_samples
+
+def join_allele_counts(cases, controls):
+    """ Outer-joins case and control AC on the locus key; a locus absent from one group has AC 0 there. """
+    merged = pd.merge(cases.rename(columns={'AC': 'AC_CASE'}),
+                      controls.rename(columns={'AC': 'AC_CONTROL'}),
+                      how='outer', on=KEY_COLUMNS)
+    merged[['AC_CASE', 'AC_CONTROL']] = merged[['AC_CASE', 'AC_CONTROL']].fillna(0).astype(np.int64)
+    return merged
+
+def _two_sided_exact(x, margins, distribution):
+    """
+    Two-sided exact p-values (sum of outcomes no more likely than the observed one) for many tests.
+    margins holds one row per test; distribution(*margin) returns the support and pmf for that margin.
+    The distribution is computed once per distinct margin and every test sharing it is answered
+    with one sorted lookup, so the Python loop runs over margins rather than over loci.
+    """
+    pvalues = np.ones(len(x), dtype=float)
+    unique_margins, inverse = np.unique(margins, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    order = np.argsort(inverse, kind='stable')
+    bounds = np.searchsorted(inverse[order], np.arange(len(unique_margins) + 1))
+
+    for g, margin in enumerate(unique_margins):
+        rows = order[bounds[g]:bounds[g + 1]]
+        support, pmf = distribution(*margin)
+        sorted_pmf = np.sort(pmf)
+        cumulative = np.cumsum(sorted_pmf)
+        observed = pmf[x[rows] - support[0]]
+        # Same relative tolerance scipy uses for ties between equally likely outcomes
+        idx = np.searchsorted(sorted_pmf, observed * (1 + 1e-7), side='right')
+        pvalues[rows] = cumulative[idx - 1]
+    return np.minimum(pvalues, 1.0)
+
+def _hypergeom_distribution(k, n1, n2):
+    support = np.arange(max(0, k - n2), min(k, n1) + 1)
+    return support, stats.hypergeom.pmf(support, n1 + n2, k, n1)
+
+def _binomial_distribution(k, n1, n2):
+    support = np.arange(k + 1)
+    return support, stats.binom.pmf(support, k, n1 / (n1 + n2))
+
+def fisher_exact_two_sided(a, n1, n2, k):
+    """
+    Two-sided Fisher exact p-values for many 2x2 tables at once.
+    a: alt alleles in cases, n1/n2: case/control allele numbers, k: total alt alleles.
+    """
+    a, n1, n2, k = np.broadcast_arrays(*(np.asarray(x, dtype=np.int64) for x in (a, n1, n2, k)))
+    return _two_sided_exact(a, np.stack([k, n1, n2], axis=1), _hypergeom_distribution)
+
+def chi2_pvalues(a, b, n1, n2):
+    """ Pearson chi-square (1 df, no continuity correction) p-values for case/control allele tables. """
+    a, b, n1, n2 = (np.asarray(x, dtype=float) for x in (a, b, n1, n2))
+    total = n1 + n2
+    k = a + b
+    observed = np.stack([a, n1 - a, b, n2 - b])
+    expected = np.stack([n1 * k, n1 * (total - k), n2 * k, n2 * (total - k)]) / total
+    with np.errstate(divide='ignore', invalid='ignore'):
+        statistic = np.where(expected > 0, (observed - expected) ** 2 / expected, 0.0).sum(axis=0)
+    pvalues = stats.chi2.sf(statistic, 1)
+    # A locus with no alt alleles (or only alt alleles) carries no information
+    return np.where((k > 0) & (k < total), pvalues, 1.0)
+
+def binomial_pvalues(a, k, n1, n2):
+    """ Two-sided exact binomial test of the case share of alt alleles against the case share of allele numbers. """
+    a, k, n1, n2 = np.broadcast_arrays(*(np.asarray(x, dtype=np.int64) for x in (a, k, n1, n2)))
+    return _two_sided_exact(a, np.stack([k, n1, n2], axis=1), _binomial_distribution)
+
+def benjamini_hochberg(pvalues):
+    """ Benjamini-Hochberg adjusted q-values; NaN p-values stay NaN and are not counted. """
+    pvalues = np.asarray(pvalues, dtype=float)
+    qvalues = np.full(pvalues.shape, np.nan)
+    valid = ~np.isnan(pvalues)
+    p = pvalues[valid]
+    if p.size == 0:
+        return qvalues
+    order = np.argsort(p)
+    ranked = p[order] * p.size / np.arange(1, p.size + 1)
+    ranked = np.minimum.accumulate(ranked[::-1])[::-1]
+    q = np.empty_like(p)
+    q[order] = np.minimum(ranked, 1.0)
+    qvalues[valid] = q
+    return qvalues
+
+def run_tests(a, b, n1, n2, chunk_size=CHUNK_SIZE):
+    """ Fisher, chi-square and binomial p-values plus a Haldane-corrected odds ratio, in row blocks. """
+    a, b, n1, n2 = np.broadcast_arrays(*(np.asarray(x, dtype=np.int64) for x in (a, b, n1, n2)))
+    results = {name: np.empty(a.shape, dtype=float) for name in ['OR', 'FISHER_P', 'CHI2_P', 'BINOM_P']}
+    for start in range(0, a.size, chunk_size):
+        s = slice(start, start + chunk_size)
+        k = a[s] + b[s]
+        results['OR'][s] = ((a[s] + 0.5) * (n2[s] - b[s] + 0.5)) / ((n1[s] - a[s] + 0.5) * (b[s] + 0.5))
+        results['FISHER_P'][s] = fisher_exact_two_sided(a[s], n1[s], n2[s], k)
+        results['CHI2_P'][s] = chi2_pvalues(a[s], b[s], n1[s], n2[s])
+        results['BINOM_P'][s] = binomial_pvalues(a[s], k, n1[s], n2[s])
+
+    for test in ['FISHER', 'CHI2', 'BINOM']:
+        results[f'{test}_Q'] = benjamini_hochberg(results[f'{test}_P'])
+    return pd.DataFrame(results)
+
+def locus_association(table, n_cases, n_controls, chunk_size=CHUNK_SIZE):
+    """ Per-locus tests on the joined AC table; allele numbers are 2 x the group sizes. """
+    tests = run_tests(table['AC_CASE'].to_numpy(), table['AC_CONTROL'].to_numpy(),
+                      2 * n_cases, 2 * n_controls, chunk_size)
+    return pd.concat([table.reset_index(drop=True), tests], axis=1)
+
+def window_association(table, n_cases, n_controls, window_size, window_step, chunk_size=CHUNK_SIZE):
+    """
+    Burden tests over sliding windows (window_size a multiple of window_step) per chromosome.
+    Allele counts are summed per step-sized bin with bincount and per window with a cumulative
+    sum, so every locus is touched once whatever the overlap between windows.
+    """
+    if window_size % window_step:
+        raise ValueError("window_size must be a multiple of window_step")
+    bins_per_window = window_size // window_step
+
+    rows = []
+    for chrom, group in table.groupby('CHROM', sort=False):
+        bins = group['POS'].to_numpy() // window_step
+        n_bins = bins.max() + 1
+        sums = []
+        for column in [None, 'AC_CASE', 'AC_CONTROL']:
+            weights = None if column is None else group[column].to_numpy()
+            per_bin = np.bincount(bins, weights=weights, minlength=n_bins)
+            cumulative = np.concatenate([[0], np.cumsum(per_bin)])
+            # Window w covers bins w .. w + bins_per_window - 1
+            starts = np.arange(n_bins)
+            ends = np.minimum(starts + bins_per_window, n_bins)
+            sums.append(cumulative[ends] - cumulative[starts])
+        n_loci, ac_case, ac_control = sums
+        keep = n_loci > 0
+        starts = np.flatnonzero(keep) * window_step
+        rows.append(pd.DataFrame({
+            'CHROM': chrom,
+            'START': starts,
+            'END': starts + window_size,
+            'N_LOCI': n_loci[keep].astype(np.int64),
+            'AC_CASE': ac_case[keep].astype(np.int64),
+            'AC_CONTROL': ac_control[keep].astype(np.int64),
+        }))
+
+    if rows:
+        windows = pd.concat(rows, ignore_index=True)
+    else:  # no loci: an empty table with the output columns
+        windows = pd.DataFrame({'CHROM': pd.Series(dtype=str), 'START': pd.Series(dtype=np.int64),
+                                'END': pd.Series(dtype=np.int64), 'N_LOCI': pd.Series(dtype=np.int64),
+                                'AC_CASE': pd.Series(dtype=np.int64), 'AC_CONTROL': pd.Series(dtype=np.int64)})
+    # Each locus in a window contributes a full allele number to both groups
+    tests = run_tests(windows['AC_CASE'].to_numpy(), windows['AC_CONTROL'].to_numpy(),
+                      2 * n_cases * windows['N_LOCI'].to_numpy(),
+                      2 * n_controls * windows['N_LOCI'].to_numpy(), chunk_size)
+    return pd.concat([windows, tests], axis=1)
+
+def write_ranked(df, output_path):
+    """ Writes the results ranked by Fisher p-value (ties broken by chi-square p-value). """
+    ranked = df.sort_values(by=['FISHER_P', 'CHI2_P'], kind='stable')
+    ranked.to_csv(output_path, sep='\t', index=False, float_format='%.6g')
+    print(f"Association results saved to {output_path}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Case/control association tests on STR allele counts.")
+    parser.add_argument("cases_file", help="cases_1.txt produced by full_project.py")
+    parser.add_argument("controls_file", help="controls_0.txt produced by full_project.py")
+    parser.add_argument("--output-dir", default=".", help="Where to write the ranked tables")
+    parser.add_argument("--window-size", type=int, default=1_000_000, help="Sliding window size in bp")
+    parser.add_argument("--window-step", type=int, default=250_000, help="Sliding window step in bp")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Rows per block")
+    args = parser.parse_args()
+
+    cases, n_cases = load_allele_counts(args.cases_file, args.chunk_size)
+    controls, n_controls = load_allele_counts(args.controls_file, args.chunk_size)
+    print(f"Loaded {len(cases)} case loci ({n_cases} samples) and {len(controls)} control loci ({n_controls} samples)")
+    table = join_allele_counts(cases, controls)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    write_ranked(locus_association(table, n_cases, n_controls, args.chunk_size),
+                 os.path.join(args.output_dir, "association_loci.txt"))
+    write_ranked(window_association(table, n_cases, n_controls, args.window_size,
+                                    args.window_step, args.chunk_size),
+                 os.path.join(args.output_dir, "association_windows.txt"))
+
+if __name__ == "__main__":
+    main()
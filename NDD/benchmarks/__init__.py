@@ -0,0 +1 @@
+""" Synthetic STR cohorts and throughput benchmarks for the VCF parsers (run from the NDD folder: python -m benchmarks.run). """
@@ -0,0 +1,167 @@
+import os
+import io
+import sys
+import gzip
+import json
+import time
+import hashlib
+import argparse
+import platform
+import resource
+import subprocess
+import contextlib
+import importlib.util
+import multiprocessing
+import pandas as pd
+
+from benchmarks.synthetic_vcf import write_cohort
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Parser name -> script (relative to the repository root), entry point and extra keyword arguments.
+# 'reference' names another parser whose output this one must reproduce exactly.
+PARSERS = {
+    'full_project': {'path': 'NDD/full_project.py', 'function': 'process_vcf_files', 'kwargs': {}},
+    'full_project_polars': {'path': 'NDD/full_project.py', 'function': 'process_vcf_files',
+                            'kwargs': {'backend': 'polars'}, 'reference': 'full_project'},
+    'parsing_multiallelic': {'path': 'Project/parsing_multiallelic.py', 'function': 'process_vcf_files', 'kwargs': {}},
+    'parsing_vcf_test_set': {'path': 'Project/Scripts/parsing_vcf_test_set.py', 'function': 'process_vcf_files', 'kwargs': {}},
+}
+
+def load_parser(name):
+    """ Imports a parser script by path, with its own folder on sys.path for its flat imports. """
+    path = os.path.join(REPO_ROOT, PARSERS[name]['path'])
+    sys.path.insert(0, os.path.dirname(path))
+    spec = importlib.util.spec_from_file_location(f"bench_{name}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return getattr(module, PARSERS[name]['function'])
+
+def _child(name, vcf_dir, output_dir, output_file, queue):
+    """ Runs one parser in a fresh process so its peak RSS is its own. """
+    process = load_parser(name)
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        process([vcf_dir], output_file, output_dir, **PARSERS[name]['kwargs'])
+        seconds = time.perf_counter() - start
+    # ru_maxrss is in KiB on Linux
+    queue.put({'seconds': seconds, 'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024})
+
+def run_parser(name, vcf_dir, output_dir):
+    """ Times one parser on one cohort; returns the measurements and the path of its output. """
+    os.makedirs(output_dir, exist_ok=True)
+    output_file = f"{name}.txt"
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    child = context.Process(target=_child, args=(name, vcf_dir, os.path.abspath(output_dir), output_file, queue))
+    child.start()
+    child.join()
+    if child.exitcode != 0:
+        raise RuntimeError(f"{name} failed with exit code {child.exitcode}")
+    return queue.get(), os.path.join(output_dir, output_file)
+
+def output_digest(path):
+    """
+    sha256 of an output table with its columns and rows put in a canonical order, so two runs
+    that write the same content in a different order are equivalent.
+    """
+    df = pd.read_csv(path, sep='\t', dtype=str, keep_default_na=False)
+    df = df[sorted(df.columns)]
+    df = df.sort_values(by=list(df.columns), kind='stable')
+    return hashlib.sha256(df.to_csv(sep='\t', index=False).encode()).hexdigest(), len(df)
+
+def count_records(vcf_dir):
+    """ Data lines over all VCFs of a cohort, the unit of the records/sec figures. """
+    total = 0
+    for f in os.listdir(vcf_dir):
+        if f.endswith('.gz'):
+            with gzip.open(os.path.join(vcf_dir, f), 'rt') as vcf:
+                total += sum(1 for line in vcf if not line.startswith('#'))
+    return total
+
+def git_version():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(sizes, parsers, work_dir, multiallelic_fraction=0.2, missing_rate=0.05, seed=0, repeat=1):
+    """ Every parser on every (records, samples) cohort; the best of `repeat` timings is kept. """
+    runs = []
+    for n_records, n_samples in sizes:
+        cohort = f"{n_records}x{n_samples}_m{multiallelic_fraction}_miss{missing_rate}_s{seed}"
+        vcf_dir = os.path.join(work_dir, cohort, "vcf")
+        if not os.path.isdir(vcf_dir):
+            write_cohort(vcf_dir, n_records, n_samples, multiallelic_fraction, missing_rate, seed)
+        input_records = count_records(vcf_dir)
+
+        digests = {}
+        for name in parsers:
+            timings = [run_parser(name, vcf_dir, os.path.join(work_dir, cohort, "out")) for _ in range(repeat)]
+            best, output_path = min(timings, key=lambda t: t[0]['seconds'])
+            digest, output_rows = output_digest(output_path)
+            digests[name] = digest
+            reference = PARSERS[name].get('reference')
+            run = {
+                'parser': name, 'records': n_records, 'samples': n_samples,
+                'input_records': input_records,
+                'seconds': round(best['seconds'], 4),
+                'records_per_sec': round(input_records / best['seconds'], 1),
+                'peak_rss_mb': round(max(t[0]['peak_rss_mb'] for t in timings), 1),
+                'output_rows': output_rows, 'digest': digest,
+                'matches_reference': digests.get(reference) == digest if reference in digests else None,
+            }
+            runs.append(run)
+            print(f"{name:>24} {n_records:>9}x{n_samples:<5} {run['records_per_sec']:>12.0f} rec/s "
+                  f"{run['peak_rss_mb']:>8.1f} MB  {run['seconds']:.2f} s")
+    return runs
+
+def compare(runs, baseline_runs):
+    """ Speed ratio and output equality of each run against the same parser and size in a baseline. """
+    previous = {(r['parser'], r['records'], r['samples']): r for r in baseline_runs}
+    for run in runs:
+        old = previous.get((run['parser'], run['records'], run['samples']))
+        if old is None:
+            continue
+        speedup = run['records_per_sec'] / old['records_per_sec']
+        same = "same output" if run['digest'] == old['digest'] else "OUTPUT CHANGED"
+        print(f"{run['parser']:>24} {run['records']:>9}x{run['samples']:<5} {speedup:6.2f}x vs baseline, {same}")
+
+def parse_size(text):
+    records, samples = text.lower().split('x')
+    return int(records), int(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput, peak memory and output equivalence of the VCF parsers.")
+    parser.add_argument("--sizes", nargs='+', default=["1000x10", "10000x20"], help="Cohorts as RECORDSxSAMPLES")
+    parser.add_argument("--parsers", nargs='+', default=list(PARSERS), choices=list(PARSERS), help="Parsers to run")
+    parser.add_argument("--multiallelic-fraction", type=float, default=0.2)
+    parser.add_argument("--missing-rate", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=1, help="Timings per parser and size (best is kept)")
+    parser.add_argument("--work-dir", default="benchmark_data", help="Cached cohorts and parser outputs")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON results")
+    parser.add_argument("--baseline", help="Earlier JSON results to compare against")
+    args = parser.parse_args()
+
+    runs = run_benchmarks([parse_size(s) for s in args.sizes], args.parsers, args.work_dir,
+                          args.multiallelic_fraction, args.missing_rate, args.seed, args.repeat)
+    results = {
+        'version': git_version(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'settings': {'multiallelic_fraction': args.multiallelic_fraction, 'missing_rate': args.missing_rate,
+                     'seed': args.seed, 'repeat': args.repeat},
+        'runs': runs,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Benchmark results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(runs, json.load(f)['runs'])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import os
+import gzip
+import argparse
+import numpy as np
+import pandas as pd
+
+REPEAT_UNITS = ['A', 'AT', 'CAG', 'CGG', 'GAA', 'AAAG', 'GGGGCC', 'CCTG']
+CHROMOSOMES = [f"chr{i}" for i in range(1, 23)] + ['chrX']
+
+HEADER = """##fileformat=VCFv4.1
+##INFO=<ID=END,Number=1,Type=Integer,Description="End position of the variant">
+##INFO=<ID=REF,Number=1,Type=Integer,Description="Reference copy number">
+##INFO=<ID=RL,Number=1,Type=Integer,Description="Reference length in bp">
+##INFO=<ID=RU,Number=1,Type=String,Description="Repeat unit in the reference orientation">
+##INFO=<ID=VARID,Number=1,Type=String,Description="Variant identifier as specified in the variant catalog">
+##INFO=<ID=REPID,Number=1,Type=String,Description="Repeat identifier as specified in the variant catalog">
+##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">
+##FORMAT=<ID=SO,Number=1,Type=String,Description="Type of reads that support the allele">
+"""
+
+def synthetic_loci(n_records, multiallelic_fraction=0.2, max_alts=3, seed=0):
+    """
+    Catalogue of STR loci shared by every sample: position, repeat unit, reference copy number
+    and up to max_alts alternative copy numbers (more than one at multiallelic_fraction of loci).
+    """
+    rng = np.random.default_rng(seed)
+    chrom = np.sort(rng.integers(0, len(CHROMOSOMES), n_records))
+    pos = rng.integers(10_000, 150_000_000, n_records)
+    order = np.lexsort((pos, chrom))
+    loci = pd.DataFrame({
+        'CHROM': np.asarray(CHROMOSOMES)[chrom[order]],
+        'POS': pos[order],
+        'RU': np.asarray(REPEAT_UNITS)[rng.integers(0, len(REPEAT_UNITS), n_records)],
+        'REF_REPEATS': rng.integers(5, 30, n_records),
+    }).drop_duplicates(subset=['CHROM', 'POS'], ignore_index=True)
+    n = len(loci)
+    loci['N_ALTS'] = np.where(rng.random(n) < multiallelic_fraction, rng.integers(2, max_alts + 1, n), 1)
+    # Distinct alternative copy numbers per locus, different from the reference
+    offsets = np.sort(rng.choice(np.arange(1, 60), size=(n, max_alts), replace=True), axis=1)
+    offsets += np.arange(max_alts)  # keeps the sorted offsets distinct
+    loci[[f"ALT{i + 1}" for i in range(max_alts)]] = loci['REF_REPEATS'].to_numpy()[:, None] + offsets
+    return loci
+
+def sample_genotypes(loci, missing_rate=0.05, ref_probability=0.6, rng=None):
+    """ Two allele indices (0 = reference, 1..N_ALTS) per locus for one sample; -1 marks a missing call. """
+    rng = rng or np.random.default_rng()
+    n = len(loci)
+    n_alts = loci['N_ALTS'].to_numpy()
+    alleles = np.where(rng.random((n, 2)) < ref_probability, 0,
+                       1 + (rng.random((n, 2)) * n_alts[:, None]).astype(np.int64))
+    alleles.sort(axis=1)
+    alleles[rng.random(n) < missing_rate] = -1
+    return alleles
+
+def vcf_lines(loci, alleles):
+    """
+    ExpansionHunter-style records of one sample: ALT lists only the alleles the sample carries,
+    so the GT indices refer to this sample's own ALT list.
+    """
+    a, b = alleles[:, 0], alleles[:, 1]
+    alt_repeats = loci[[c for c in loci.columns if c.startswith('ALT')]].to_numpy()
+    rows = np.arange(len(loci))
+    first = alt_repeats[rows, np.maximum(a, 1) - 1]
+    second = alt_repeats[rows, np.maximum(b, 1) - 1]
+
+    missing = a < 0
+    hom_ref = (a == 0) & (b == 0)
+    het_ref = (a == 0) & (b > 0)
+    hom_alt = (a > 0) & (a == b)
+    het_alt = (a > 0) & (b > a)
+
+    alt = np.full(len(loci), '.', dtype=object)
+    alt[het_ref] = ['<STR%d>' % r for r in second[het_ref]]
+    alt[hom_alt] = ['<STR%d>' % r for r in first[hom_alt]]
+    alt[het_alt] = ['<STR%d>,<STR%d>' % (r, s) for r, s in zip(first[het_alt], second[het_alt])]
+    gt = np.select([missing, hom_ref, het_ref, hom_alt], ['./.', '0/0', '0/1', '1/1'], '1/2')
+
+    ru = loci['RU'].to_numpy()
+    ref_repeats = loci['REF_REPEATS'].to_numpy()
+    ref_length = ref_repeats * np.char.str_len(ru.astype(str))
+    pos = loci['POS'].to_numpy()
+    var_id = loci['CHROM'].to_numpy().astype(object) + '_' + pos.astype(str).astype(object)
+    info = ('END=' + (pos + ref_length).astype(str).astype(object) + ';REF=' + ref_repeats.astype(str).astype(object)
+            + ';RL=' + ref_length.astype(str).astype(object) + ';RU=' + ru.astype(object)
+            + ';VARID=' + var_id + ';REPID=' + var_id)
+    frame = pd.DataFrame({
+        'CHROM': loci['CHROM'], 'POS': pos, 'ID': '.', 'REF': 'N', 'ALT': alt, 'QUAL': '.',
+        'FILTER': 'PASS', 'INFO': info, 'FORMAT': 'GT:SO', 'GT': gt.astype(object) + ':SPANNING',
+    })
+    return frame
+
+def write_cohort(output_dir, n_records, n_samples, multiallelic_fraction=0.2, missing_rate=0.05, seed=0):
+    """ Writes one <sample>.vcf.gz per sample into output_dir; the same arguments always give the same files. """
+    os.makedirs(output_dir, exist_ok=True)
+    loci = synthetic_loci(n_records, multiallelic_fraction, seed=seed)
+    rng = np.random.default_rng(seed + 1)
+    paths = []
+    for i in range(n_samples):
+        sample = f"SYN{i:05d}"
+        frame = vcf_lines(loci, sample_genotypes(loci, missing_rate, rng=rng))
+        path = os.path.join(output_dir, f"{sample}.vcf.gz")
+        # mtime=0 keeps the gzip bytes identical between runs
+        with open(path, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=1, mtime=0) as gz:
+            gz.write(HEADER.encode())
+            gz.write(("#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\t" + sample + "\n").encode())
+            gz.write(frame.to_csv(sep='\t', header=False, index=False).encode())
+        paths.append(path)
+    return paths
+
+def main():
+    parser = argparse.ArgumentParser(description="Deterministic synthetic STR cohort (one ExpansionHunter-style VCF per sample).")
+    parser.add_argument("output_dir", help="Folder for the .vcf.gz files")
+    parser.add_argument("--records", type=int, default=10_000, help="STR loci per sample")
+    parser.add_argument("--samples", type=int, default=20, help="Number of samples")
+    parser.add_argument("--multiallelic-fraction", type=float, default=0.2, help="Share of loci with several ALT alleles")
+    parser.add_argument("--missing-rate", type=float, default=0.05, help="Share of ./. calls")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+
+    paths = write_cohort(args.output_dir, args.records, args.samples, args.multiallelic_fraction,
+                         args.missing_rate, args.seed)
+    print(f"{len(paths)} synthetic VCFs written to {args.output_dir}")
+
+if __name__ == "__main__":
+    main()
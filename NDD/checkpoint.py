@@ -0,0 +1,160 @@
+import os
+import re
+import json
+import pickle
+import hashlib
+import threading
+
+# Journal of the run, one JSON object per line (a settings header, then parsed files and written outputs)
+MANIFEST = "manifest.jsonl"
+# Names of the intermediates (and their temporary files) a checkpoint writes next to its manifest
+INTERMEDIATE = re.compile(r'[0-9a-f]{16}\.pkl(\.tmp)?')
+
+def sha256_file(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def atomic_write(path, data):
+    """ Writes bytes to path through a temporary file and os.replace, so path is either the old or the whole new file. """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def _input_signature(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def _input_signatures(paths):
+    return {path: _input_signature(path) for path in paths}
+
+class RunCheckpoint:
+    """
+    Parse results and finished outputs of a run, kept in a folder so an interrupted run can resume.
+    Every parsed VCF is pickled there (atomic_write) and a manifest line records the input's size and
+    mtime and the sha256 of its intermediate. With resume=True a file whose entry still matches both
+    is loaded instead of parsed, and an output is not rewritten while its checksum and the size and
+    mtime of the inputs it was made from still match. Without resume, or when the run settings
+    (filters, ...) differ, the checkpoint starts empty. Only the files a checkpoint writes are ever
+    deleted, and a non-empty folder without a manifest is refused (ValueError).
+    """
+
+    def __init__(self, directory, settings, resume=False):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, MANIFEST)
+        self.settings = settings
+        self.files = {}  # input path -> manifest entry
+        self.outputs = {}  # output path -> manifest entry
+        self.lock = threading.Lock()  # outputs may be recorded from the background writer
+
+        if resume and self._read_manifest():
+            print(f"Resuming from {directory}: {len(self.files)} parsed files, {len(self.outputs)} finished outputs")
+            return
+        if os.path.isdir(directory) and os.listdir(directory) and not os.path.exists(self.manifest_path):
+            raise ValueError(f"{directory} is not empty and is not a checkpoint folder; choose another checkpoint folder")
+        if resume:
+            print(f"No usable checkpoint in {directory}, starting from the beginning")
+        self._clear()
+        os.makedirs(directory, exist_ok=True)
+        self._append({'settings': settings})
+
+    def _clear(self):
+        """ Deletes the manifest and intermediates of this checkpoint folder, and nothing else. """
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name == MANIFEST or INTERMEDIATE.fullmatch(name):
+                os.remove(os.path.join(self.directory, name))
+
+    def _read_manifest(self):
+        """ Loads the entries of an existing manifest; False if there is none or it was made with other settings. """
+        if not os.path.exists(self.manifest_path):
+            return False
+        with open(self.manifest_path, 'r') as f:
+            lines = f.read().splitlines()
+        entries = []
+        for line in lines:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:  # a line cut short by the interruption
+                continue
+        if not entries or entries[0].get('settings') != self.settings:
+            return False
+        for entry in entries[1:]:
+            if 'file' in entry:
+                self.files[entry['file']] = entry
+            elif 'output' in entry:
+                self.outputs[entry['output']] = entry
+        return True
+
+    def _append(self, entry):
+        with self.lock:
+            with open(self.manifest_path, 'a') as f:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _intermediate_path(self, path):
+        return os.path.join(self.directory, hashlib.sha1(path.encode()).hexdigest()[:16] + ".pkl")
+
+    def is_parsed(self, path):
+        """ Whether an input file has a saved parse result made from its current contents (size and mtime). """
+        entry = self.files.get(path)
+        return (entry is not None and entry['input'] == _input_signature(path)
+                and os.path.exists(self._intermediate_path(path)))
+
+    def load(self, path):
+        """ The saved parse result of an input file, or None if it has to be parsed (again). """
+        if not self.is_parsed(path):
+            return None
+        entry = self.files[path]
+        with open(self._intermediate_path(path), 'rb') as f:
+            data = f.read()
+        if hashlib.sha256(data).hexdigest() != entry['sha256']:
+            print(f"Checkpoint of {path} is damaged, parsing it again")
+            return None
+        return pickle.loads(data)
+
+    def save(self, path, result):
+        """ Stores the parse result of an input file and records it as parsed. """
+        data = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+        atomic_write(self._intermediate_path(path), data)
+        entry = {'file': path, 'status': 'parsed', 'input': _input_signature(path),
+                 'sha256': hashlib.sha256(data).hexdigest()}
+        self.files[path] = entry
+        self._append(entry)
+
+    def output_done(self, output_paths, input_paths):
+        """
+        True if every output was recorded as written from the input files as they are now (same paths,
+        sizes and mtimes) and still has the recorded checksum.
+        """
+        inputs = _input_signatures(input_paths)
+        for path in output_paths:
+            entry = self.outputs.get(path)
+            if (entry is None or entry['inputs'] != inputs or not os.path.exists(path)
+                    or sha256_file(path) != entry['sha256']):
+                return False
+        return True
+
+    def mark_output(self, output_paths, input_paths):
+        """ Records outputs as written, with the signatures of the input files they were made from. """
+        inputs = _input_signatures(input_paths)
+        for path in output_paths:
+            entry = {'output': path, 'status': 'written', 'sha256': sha256_file(path), 'inputs': inputs}
+            with self.lock:
+                self.outputs[path] = entry
+            self._append(entry)
+
+    def remove(self):
+        """ Deletes the checkpoint once the run has finished (the folder too, if nothing else is in it). """
+        self._clear()
+        try:
+            os.rmdir(self.directory)
+        except OSError:
+            pass
@@ -0,0 +1,114 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+KEY_COLUMNS = ['CHROM', 'POS', 'REF', 'ALT', 'END', 'REP_UNIT', 'VAR_ID']
+# Inputs (paths, sizes, mtimes) and settings a cached matrix was built from, stored next to it
+FINGERPRINT = "fingerprint.json"
+
+def genotype_dosage(genotype):
+    """ Alt-allele dosage of one merged-output genotype string ('.', '0/1', '1/1', or '1' for carriers). """
+    if genotype in {".", "./.", "0/0", ""}:
+        return 0
+    if genotype == "1/1":
+        return 2
+    return 1
+
+def _dosage_matrix(values):
+    """ Converts a 2-D array of genotype strings to int8 dosages, decoding each distinct string once. """
+    codes, uniques = pd.factorize(values.ravel())
+    lookup = np.array([genotype_dosage(g) for g in uniques], dtype=np.int8)
+    return lookup[codes].reshape(values.shape)
+
+def load_merged_outputs(txt_files):
+    """
+    Reads one or more process_vcf_files outputs (e.g. cases_1.txt and controls_0.txt) into a
+    single cohort matrix. Returns (loci, dosages, samples): the locus key table, an int8
+    (loci x samples) alt-allele dosage matrix and the sample names of its columns.
+    A locus missing from one file has dosage 0 for that file's samples.
+    """
+    tables = []
+    for txt_file in txt_files:
+        df = pd.read_csv(txt_file, sep='\t', dtype=str, keep_default_na=False)
+        samples = [c for c in df.columns if c not in KEY_COLUMNS and c != 'AC']
+        tables.append((df[KEY_COLUMNS], _dosage_matrix(df[samples].to_numpy()), samples))
+
+    # One row per distinct locus key across all files, in first-seen order
+    loci = pd.concat([keys for keys, _, _ in tables], ignore_index=True).drop_duplicates(ignore_index=True)
+    locus_index = pd.MultiIndex.from_frame(loci)
+
+    samples = [s for _, _, file_samples in tables for s in file_samples]
+    dosages = np.zeros((len(loci), len(samples)), dtype=np.int8)
+    column = 0
+    for keys, file_dosages, file_samples in tables:
+        rows = locus_index.get_indexer(pd.MultiIndex.from_frame(keys))
+        dosages[rows, column:column + len(file_samples)] = file_dosages
+        column += len(file_samples)
+
+    loci['POS'] = loci['POS'].astype(np.int64)
+    return loci, dosages, samples
+
+def cohort_from_merged(merged_df, sample_columns):
+    """ Builds (loci, dosages, samples) from a merge_vcf_files result without writing it to disk. """
+    loci = merged_df[KEY_COLUMNS].reset_index(drop=True)
+    loci['POS'] = loci['POS'].astype(np.int64)
+    return loci, _dosage_matrix(merged_df[sample_columns].to_numpy()), list(sample_columns)
+
+def save_cohort_matrix(output_dir, loci, dosages, samples):
+    """ Stores the cohort matrix as loci.txt, samples.txt and a memory-mappable dosages.npy. """
+    os.makedirs(output_dir, exist_ok=True)
+    loci.to_csv(os.path.join(output_dir, "loci.txt"), sep='\t', index=False)
+    with open(os.path.join(output_dir, "samples.txt"), 'w') as f:
+        f.write("\n".join(samples) + "\n")
+    np.save(os.path.join(output_dir, "dosages.npy"), dosages)
+    print(f"Cohort matrix ({dosages.shape[0]} loci x {dosages.shape[1]} samples) saved to {output_dir}")
+
+def load_cohort_matrix(matrix_dir, mmap=True):
+    """ Loads a matrix written by save_cohort_matrix; dosages are memory-mapped unless mmap=False. """
+    loci = pd.read_csv(os.path.join(matrix_dir, "loci.txt"), sep='\t', dtype=str, keep_default_na=False)
+    loci['POS'] = loci['POS'].astype(np.int64)
+    with open(os.path.join(matrix_dir, "samples.txt")) as f:
+        samples = [line.strip() for line in f if line.strip()]
+    dosages = np.load(os.path.join(matrix_dir, "dosages.npy"), mmap_mode='r' if mmap else None)
+    return loci, dosages, samples
+
+def dosage_path(matrix_dir):
+    """ Path of the dosage array inside a saved cohort matrix. """
+    return os.path.join(matrix_dir, "dosages.npy")
+
+def gz_files_under(paths):
+    """ The .gz files given directly or anywhere under the given folders (recursively, sorted per folder). """
+    gz_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            found = [os.path.join(root, f) for root, _, names in os.walk(path) for f in names if f.endswith('.gz')]
+            gz_files.extend(sorted(found))
+        elif path.endswith('.gz'):
+            gz_files.append(path)
+    return gz_files
+
+def matrix_fingerprint(input_files, settings=None):
+    """ Absolute path, size and mtime of every input file, with the settings the matrix is built with. """
+    inputs = {}
+    for path in input_files:
+        stat = os.stat(path)
+        inputs[os.path.abspath(path)] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    return {'inputs': inputs, 'settings': settings or {}}
+
+def save_fingerprint(matrix_dir, fingerprint):
+    """ Written after the matrix itself, so an interrupted build is never taken as current. """
+    with open(os.path.join(matrix_dir, FINGERPRINT), 'w') as f:
+        json.dump(fingerprint, f, indent=1)
+
+def cached_matrix_is_current(array_path, fingerprint):
+    """ Whether the cached array exists and its stored fingerprint matches the current inputs and settings. """
+    fingerprint_path = os.path.join(os.path.dirname(array_path), FINGERPRINT)
+    if not os.path.exists(array_path) or not os.path.exists(fingerprint_path):
+        return False
+    try:
+        with open(fingerprint_path) as f:
+            stored = json.load(f)
+    except ValueError:
+        return False
+    return stored == json.loads(json.dumps(fingerprint))
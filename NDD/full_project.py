@@ -2,8 +2,26 @@ import os
 import sys
 import gzip
 import shutil
+import numpy as np
 import pandas as pd
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import profiling
+import writers
+import lazy_backend
+from prefetch import FILES_AHEAD, prefetch_files
+from genotypes import alt_allele_counts, decompose_alts
+from region_index import INDEX_SUFFIX
+from checkpoint import RunCheckpoint
+from spill import SpillStore, parse_memory
+from vcf_filters import add_filter_arguments, filter_from_args
+
+# Columns of a parsed record before the sample genotypes
+RECORD_COLUMNS = ['CHROM', 'POS', 'REF', 'REP_UNIT', 'VAR_ID', 'ALT', 'END']
+
+# Per-ALT genotype written for 0, 1 and 2 (or more) copies of that ALT
+DOSAGE_GENOTYPES = np.array(['.', '0/1', '1/1'], dtype=object)
 
 def read_sample_file(txt_file):
     """ Reads the sample file and creates two groups based on 0 or 1 labels. """
@@ -23,6 +41,27 @@ def read_sample_file(txt_file):
 
     return group_0, group_1
 
+def read_label_file(txt_file, column=None):
+    """
+    Reads sample labels as {sample_name: label}.
+    Without a column the file is read like affected.txt (two whitespace-separated fields per line);
+    with a column it is read as a tab-separated table whose first column holds the sample names.
+    """
+    if column is None:
+        labels = {}
+        with open(txt_file, 'r') as f:
+            for line in f:
+                parts = line.strip().split()
+                if len(parts) != 2:
+                    continue
+                sample_name, label = parts
+                labels[sample_name] = label
+        return labels
+
+    table = pd.read_csv(txt_file, sep='\t', dtype=str, keep_default_na=False)
+    labels = table.set_index(table.columns[0])[column]
+    return {sample: label for sample, label in labels.items() if label not in {"", "."}}
+
 def move_files(folder, group_0, group_1):
     """ Moves VCF files into two separate folders based on the sample names in affected.txt. """
     # Create directories for controls and cases
@@ -42,154 +81,344 @@ def move_files(folder, group_0, group_1):
             elif sample_name in group_1:
                 shutil.move(src_path, os.path.join(cases_folder, filename))
 
-def process_vcf_files(file_paths, output_file, output_dir):
-    """ Processes VCF files and merges them into a single output file. """
-    dataframes = []
-    all_sample_names = set()
-
+def process_vcf_files(file_paths, output_file, output_dir, record_filter=None, bed=False, parquet=False, executor=None,
+                      files_ahead=FILES_AHEAD, memory_limit=None, spill_dir=None, backend='pandas', checkpoint=None):
+    """
+    Processes VCF files and merges them into a single output file, plus a 0-based BED
+    (CHROM, POS-1, END, VAR_ID) and/or a Parquet copy next to it, all written in one pass.
+    With an executor the writing is submitted to it and its Future returned, so the caller
+    can parse the next group while this one is written.
+    With a memory_limit (bytes) parsed files spill to disk and the output is merged and
+    written one chromosome at a time (merge_vcf_files_out_of_core); the file is the same.
+    backend: 'pandas' or 'polars' for the merge step (see merge_frames).
+    checkpoint (checkpoint.RunCheckpoint): parsed files are saved to it and reused, and outputs it
+    already holds unchanged are not written again.
+    """
+    output_path = os.path.join(output_dir, output_file)
+    stem = os.path.splitext(output_path)[0]
+    outputs = ([output_path, output_path + INDEX_SUFFIX] + ([stem + ".bed"] if bed else [])
+               + ([stem + ".parquet"] if parquet else []))
+    inputs = _vcf_paths(file_paths)
+    if checkpoint is not None and checkpoint.output_done(outputs, inputs):
+        print(f"{output_path} was already written by the interrupted run, skipping")
+        return None
+
+    if memory_limit is None:
+        merged = merge_vcf_files(file_paths, record_filter, files_ahead, backend, checkpoint)
+    else:
+        merged = merge_vcf_files_out_of_core(file_paths, memory_limit, record_filter, files_ahead, spill_dir, backend,
+                                             checkpoint)
+    if merged is None:
+        return None
+    # A DataFrame, or an iterator of per-chromosome DataFrames out of core
+    table, sample_columns = merged
+
+    def write_outputs():
+        with profiling.stage('write'):
+            frames = [table] if memory_limit is None else table
+            writers.write_merged_chunks(frames, output_path, stem + ".bed" if bed else None,
+                                        stem + ".parquet" if parquet else None, region_index=True)
+        print(f"Merged DataFrame saved to {output_path}")
+        if checkpoint is not None:
+            checkpoint.mark_output(outputs, inputs)
+
+    if executor is None:
+        write_outputs()
+        return None
+    return executor.submit(write_outputs)
+
+def _chrom_sort_key(chrom):
+    """ Numbered chromosomes first, then the rest, each group sorted as strings. """
+    return (not chrom.isdigit(), chrom)
+
+def _vcf_paths(file_paths):
+    """ The .gz files given directly or inside the given folders. """
+    gz_files = []
     for file in file_paths:
         if os.path.isdir(file):
-            gz_files = [os.path.join(file, f) for f in os.listdir(file) if f.endswith('.gz')]
-        else:
-            gz_files = [file] if file.endswith('.gz') else []
-
-        for gz_file in gz_files:
-            print(f"Processing file: {gz_file}")
-            df, sample_names = _process_single_vcf(gz_file)
+            gz_files.extend(os.path.join(file, f) for f in os.listdir(file) if f.endswith('.gz'))
+        elif file.endswith('.gz'):
+            gz_files.append(file)
+    return gz_files
+
+def _parse_vcf_files(file_paths, record_filter=None, files_ahead=FILES_AHEAD, checkpoint=None):
+    """
+    Yields (df, sample_names) for every VCF file given directly or as a folder of .gz files.
+    Files the checkpoint already holds are loaded from it; the others are parsed and saved to it.
+    """
+    gz_files = _vcf_paths(file_paths)
+
+    saved = {f for f in gz_files if checkpoint is not None and checkpoint.is_parsed(f)}
+    prefetched = prefetch_files([f for f in gz_files if f not in saved], files_ahead)
+    profiling.progress('parse_vcf', 0, len(gz_files), 'files')
+    try:
+        for done, gz_file in enumerate(gz_files, 1):
+            result = checkpoint.load(gz_file) if gz_file in saved else None
+            if result is not None:
+                print(f"Loaded parsed file from checkpoint: {gz_file}")
+            else:
+                print(f"Processing file: {gz_file}")
+                # A damaged checkpoint entry is parsed again, without prefetching
+                lines = next(prefetched)[1] if gz_file not in saved else None
+                with profiling.stage('parse_vcf'):
+                    result = _process_single_vcf(gz_file, record_filter, lines)
+                if checkpoint is not None:
+                    checkpoint.save(gz_file, result)
+            yield result
+            profiling.count('files')
+            profiling.progress('parse_vcf', done, len(gz_files), 'files')
+    finally:
+        prefetched.close()
+
+def merge_vcf_files(file_paths, record_filter=None, files_ahead=FILES_AHEAD, backend='pandas', checkpoint=None):
+    """
+    Parses VCF files (or folders of .gz files) and merges them into one DataFrame with AC,
+    sorted by chromosome and position. Returns (merged_df, sample_columns), or None if nothing was parsed.
+    record_filter (vcf_filters.RecordFilter) drops records and samples while the files are read.
+    The next files_ahead files are read and decompressed in background threads while the current
+    one is parsed (0 still moves the current file's reading off the parsing thread).
+    """
+    dataframes = []
+    all_sample_names = set()
+    for df, sample_names in _parse_vcf_files(file_paths, record_filter, files_ahead, checkpoint):
+        # Files left without records (or samples) by the filter only contribute their sample columns
+        if len(df):
             dataframes.append(df)
-            all_sample_names.update(sample_names)
+        all_sample_names.update(sample_names)
 
     if not dataframes:
         print("No valid VCF files processed.")
-        return
-
-    merged_df = dataframes[0]
-    for df in dataframes[1:]:
-        merged_df = pd.merge(merged_df, df, how='outer', 
-                              on=['CHROM', 'POS', 'REF', 'ALT', 'END', 'REP_UNIT', 'VAR_ID'])
-
-    merged_df.fillna(".", inplace=True)
-
-    def count_genotypes(row):
-        total_count = 0
-        for genotype in row[7:]:
-            if genotype == "0/1":
-                total_count += 1
-            elif genotype == "1/1":
-                total_count += 2
-            elif genotype == "1/2":
-                total_count += 1
-        return total_count
-
-    merged_df['AC'] = merged_df.apply(count_genotypes, axis=1)
-
-    merged_df['POS'] = merged_df['POS'].astype(int)
-
-    chrom_order = {chrom: i for i, chrom in enumerate(sorted(set(merged_df['CHROM']), key=lambda x: (not x.isdigit(), x)))}
-    merged_df['CHROM_ORDER'] = merged_df['CHROM'].map(chrom_order)
+        return None
+    return _merge_function(backend)(dataframes, all_sample_names)
+
+def merge_vcf_files_out_of_core(file_paths, memory_limit, record_filter=None, files_ahead=FILES_AHEAD, spill_dir=None,
+                                backend='pandas', checkpoint=None):
+    """
+    merge_vcf_files under a memory budget (bytes). Parsed files are kept by a SpillStore, which
+    writes them to per-chromosome files in a temporary folder whenever they take more than
+    memory_limit; the merge, AC and sort then run one chromosome at a time. Returns
+    (partitions, sample_columns), where partitions yields the merged rows of each chromosome in
+    output order (together, the merge_vcf_files table) and removes the spill folder when done;
+    None if nothing was parsed. Peak memory is about memory_limit plus the largest chromosome.
+    """
+    store = SpillStore(memory_limit, spill_dir)
+    all_sample_names = set()
+    try:
+        for df, sample_names in _parse_vcf_files(file_paths, record_filter, files_ahead, checkpoint):
+            if len(df):
+                store.add(df)
+            all_sample_names.update(sample_names)
+    except BaseException:
+        store.close()
+        raise
 
-    merged_df.sort_values(by=['CHROM_ORDER', 'POS'], ascending=[True, True], inplace=True)
-    merged_df.drop(columns=['CHROM_ORDER'], inplace=True)
-    merged_df['POS'] = merged_df['POS'].astype(str)
+    if not len(store):
+        store.close()
+        print("No valid VCF files processed.")
+        return None
+
+    def partitions():
+        try:
+            for chrom in sorted(store.chromosomes(), key=_chrom_sort_key):
+                yield _merge_function(backend)(store.partition(chrom), all_sample_names)[0]
+        finally:
+            store.close()
+
+    return partitions(), sorted(all_sample_names)
+
+def _merge_function(backend):
+    """ merge_frames (the reference) or its lazy polars equivalent, which gives the same table. """
+    if backend == 'polars':
+        return lazy_backend.merge_frames_lazy
+    return merge_frames
+
+def merge_frames(dataframes, all_sample_names):
+    """
+    Outer-merges parsed per-file frames on the locus columns, adds AC and sorts by chromosome and
+    position. Returns (merged_df, sample_columns) with a column for every name in all_sample_names.
+    """
+    with profiling.stage('merge'):
+        merged_df = dataframes[0]
+        for df in dataframes[1:]:
+            merged_df = pd.merge(merged_df, df, how='outer', 
+                                  on=['CHROM', 'POS', 'REF', 'ALT', 'END', 'REP_UNIT', 'VAR_ID'])
+
+        merged_df.fillna(".", inplace=True)
+
+    # Non-reference alleles over all samples, each distinct genotype string decoded once
+    with profiling.stage('count_alleles'):
+        genotype_columns = [column for column in merged_df.columns if column in all_sample_names]
+        merged_df['AC'] = alt_allele_counts(merged_df[genotype_columns].to_numpy())
+
+    with profiling.stage('sort'):
+        merged_df['POS'] = merged_df['POS'].astype(int)
+
+        chrom_order = {chrom: i for i, chrom in enumerate(sorted(set(merged_df['CHROM']), key=_chrom_sort_key))}
+        merged_df['CHROM_ORDER'] = merged_df['CHROM'].map(chrom_order)
+
+        merged_df.sort_values(by=['CHROM_ORDER', 'POS'], ascending=[True, True], inplace=True)
+        merged_df.drop(columns=['CHROM_ORDER'], inplace=True)
+        merged_df['POS'] = merged_df['POS'].astype(str)
+    profiling.count('output_rows', len(merged_df))
 
     sample_columns = sorted(list(all_sample_names))
-    merged_df = merged_df[['CHROM', 'POS', 'REF', 'ALT', 'END', 'REP_UNIT', 'VAR_ID', 'AC'] + sample_columns]
-
-    output_path = os.path.join(output_dir, output_file)
-    merged_df.to_csv(output_path, sep='\t', index=False)
-    print(f"Merged DataFrame saved to {output_path}")
-
-def _process_single_vcf(input_file):
-    """ Processes a single VCF file and returns a DataFrame. """
-    open_func = gzip.open if input_file.endswith(".gz") else open
-    records = []
+    merged_df = merged_df.reindex(columns=['CHROM', 'POS', 'REF', 'ALT', 'END', 'REP_UNIT', 'VAR_ID', 'AC'] + sample_columns,
+                                  fill_value='.')
+    return merged_df, sample_columns
+
+def _process_single_vcf(input_file, record_filter=None, lines=None):
+    """
+    Processes a single VCF file and returns a DataFrame with one row per STR ALT allele.
+    Lines are read as bytes and split only up to the sample columns; records rejected by
+    record_filter are dropped there, before anything is decoded. The per-ALT genotypes of all
+    records are then decomposed at once (genotypes.decompose_alts).
+    lines: the file's lines as bytes when they are already being read (prefetch.prefetch_files).
+    """
+    if lines is None:
+        open_func = gzip.open if input_file.endswith(".gz") else open
+        with open_func(input_file, 'rb') as f:
+            return _process_single_vcf(input_file, record_filter, f)
+
+    loci = []
+    alt_repeats = []
+    genotypes = []
     columns = None
     sample_names = []
-
-    with open_func(input_file, 'rt') as f:
-        for line in f:
-            if line.startswith("#"):
-                if not line.startswith("##") and columns is None:
-                    columns = line.strip().split('\t')
-                    if columns[0].startswith('#'):
-                        columns[0] = 'CHROM'
-                    sample_names = columns[9:]
-                continue
-
-            fields = line.strip().split('\t')
-            chrom, pos, ref, alt, info = fields[0], int(fields[1]), fields[3], fields[4], fields[7]
-            sample_data = fields[9:]
-
-            info_dict = dict(item.split('=') for item in info.split(';') if '=' in item)
-            repeat_unit = info_dict.get('RU', '')
-            ref_repeats = int(info_dict.get('REF', 1))
-
-            alt_alleles = [allele.strip('<>').replace('STR', '') for allele in alt.split(',') if allele.startswith('<STR')]
-            allele_repeat_counts = {str(i + 1): int(repeat_count) for i, repeat_count in enumerate(alt_alleles)} if alt_alleles else {}
-
-            if not repeat_unit or not alt_alleles:
-                continue
-
-            # Initialize base record
-            base_record = {
-                'CHROM': chrom,
-                'POS': pos,
-                'REF': ref,
-                'REP_UNIT': repeat_unit,
-                'VAR_ID': info_dict.get('VARID', '.')
-            }
-
-            # Process each alternative allele
-            for alt_idx, alt_repeats in allele_repeat_counts.items():
-                alt_record = base_record.copy()
-                alt_record['ALT'] = f'STR{alt_repeats}'
-                alt_record['END'] = pos + (len(repeat_unit) * alt_repeats)
-                
-                # Initialize sample genotypes
-                sample_variants = {name: '.' for name in sample_names}
-
-                # Process each sample's genotype
-                for sample_idx, sample_gt in enumerate(sample_data):
-                    genotype = sample_gt.split(':')[0]
-                    if genotype in {"./.", "0/0"}:
-                        continue
-
-                    alleles = genotype.split('/')
-                    
-                    # Handle different genotype cases
-                    if genotype == f"{alt_idx}/{alt_idx}":
-                        sample_variants[sample_names[sample_idx]] = "1/1"
-                    elif alt_idx in alleles:
-                        other_allele = alleles[1] if alleles[0] == alt_idx else alleles[0]
-                        if other_allele == "0":
-                            sample_variants[sample_names[sample_idx]] = "0/1"
-                        else:
-                            sample_variants[sample_names[sample_idx]] = "0/1"
-
-                alt_record.update(sample_variants)
-                records.append(alt_record)
-
-    df = pd.DataFrame(records)
-    return df, sample_names
+    keep_samples = None
+    n_lines = 0
+    n_rejected = 0
+
+    for line in lines:
+        if line.startswith(b"#"):
+            if not line.startswith(b"##") and columns is None:
+                columns = line.decode().strip().split('\t')
+                if columns[0].startswith('#'):
+                    columns[0] = 'CHROM'
+                sample_names = columns[9:]
+                if record_filter is not None:
+                    keep_samples = record_filter.sample_indices(sample_names)
+                    if keep_samples is not None:
+                        sample_names = [sample_names[i] for i in keep_samples]
+                        if not sample_names:
+                            break
+            continue
+
+        n_lines += 1
+        fields = line.strip().split(b'\t', 9)
+        if record_filter is not None and not record_filter.accept(fields):
+            n_rejected += 1
+            continue
+        chrom, pos, ref, alt, info = fields[0].decode(), int(fields[1]), fields[3].decode(), fields[4].decode(), fields[7].decode()
+        sample_data = fields[9].decode().split('\t') if len(fields) > 9 else []
+        if keep_samples is not None:
+            sample_data = [sample_data[i] for i in keep_samples]
+
+        info_dict = dict(item.split('=') for item in info.split(';') if '=' in item)
+        repeat_unit = info_dict.get('RU', '')
+        ref_repeats = int(info_dict.get('REF', 1))
+
+        alt_alleles = [allele.strip('<>').replace('STR', '') for allele in alt.split(',') if allele.startswith('<STR')]
+
+        if not repeat_unit or not alt_alleles:
+            continue
+
+        loci.append((chrom, pos, ref, repeat_unit, info_dict.get('VARID', '.')))
+        alt_repeats.append([int(repeat_count) for repeat_count in alt_alleles])
+        genotypes.extend(sample_gt.split(':', 1)[0] for sample_gt in sample_data)
+
+    profiling.count('records', n_lines)
+    profiling.count('filtered_records', n_rejected)
+    if not loci:
+        return pd.DataFrame(columns=RECORD_COLUMNS + sample_names), sample_names
+
+    # One row per (record, ALT): copies of that ALT in every sample, all records at once
+    n_alts = [len(repeats) for repeats in alt_repeats]
+    record_rows, _, dosages = decompose_alts(
+        np.asarray(genotypes, dtype=object).reshape(len(loci), len(sample_names)), n_alts)
+    repeats = np.concatenate([np.asarray(r, dtype=np.int64) for r in alt_repeats])
+
+    locus_table = pd.DataFrame(loci, columns=RECORD_COLUMNS[:5]).iloc[record_rows].reset_index(drop=True)
+    locus_table['ALT'] = [f'STR{r}' for r in repeats]
+    locus_table['END'] = locus_table['POS'] + locus_table['REP_UNIT'].str.len() * repeats
+    sample_table = pd.DataFrame(DOSAGE_GENOTYPES[np.minimum(dosages, 2)], columns=sample_names)
+    return pd.concat([locus_table, sample_table], axis=1), sample_names
 
 def main():
     parser = argparse.ArgumentParser(description="Sort and process VCF files in subfolders.")
     parser.add_argument("txt_file", help="Path to the sample text file")
     parser.add_argument("--folder", required=True, help="Main folder containing subfolders")
+    parser.add_argument("--profile", nargs='*', choices=['cprofile', 'tracemalloc'],
+                        help="Time each stage and write a JSON report; optionally add cprofile and/or tracemalloc capture")
+    parser.add_argument("--profile-report", default="profile_report.json", help="Where to write the profile report")
+    parser.add_argument("--bed", action='store_true', help="Also write a 0-based BED (CHROM, POS-1, END, VAR_ID) per output")
+    parser.add_argument("--parquet", action='store_true', help="Also write a Parquet copy per output (needs pyarrow)")
+    parser.add_argument("--prefetch-files", type=int, default=FILES_AHEAD,
+                        help="VCFs read and decompressed ahead of the one being parsed")
+    parser.add_argument("--memory-limit", type=parse_memory,
+                        help="Memory for parsed VCFs (e.g. 24G); beyond it they spill to disk and the merge runs per chromosome")
+    parser.add_argument("--spill-dir", help="Folder for spill files (default: the system temporary folder)")
+    parser.add_argument("--backend", choices=['pandas', 'polars'], default='pandas',
+                        help="Merge/AC/sort engine; polars runs them as one lazy multi-threaded query with the same output")
+    parser.add_argument("--resume", action='store_true',
+                        help="Continue an interrupted run: reuse the files it parsed and the outputs it finished")
+    parser.add_argument("--checkpoint-dir",
+                        help="Checkpoint parsed files and finished outputs here so the run can be resumed "
+                             "(with --resume alone: .checkpoint next to the outputs); off by default")
+    parser.add_argument("--background-write", action='store_true', help="Write the controls output while the cases are parsed")
+    add_filter_arguments(parser)
     args = parser.parse_args()
+    record_filter = filter_from_args(args)
+    if args.parquet and writers.pq is None:
+        sys.exit("--parquet needs pyarrow (pip install pyarrow)")
+    if args.backend == 'polars' and lazy_backend.pl is None:
+        sys.exit("--backend polars needs polars (pip install polars)")
+
+    if args.profile is not None:
+        profiling.enable_profiling(cprofile='cprofile' in args.profile, tracemalloc='tracemalloc' in args.profile)
 
     # Step 1: Read the sample file and get group 0 (controls) and group 1 (cases)
     group_0, group_1 = read_sample_file(args.txt_file)
 
-    # Step 2: Move files into control and case folders inside the VCF folder
-    move_files(args.folder, group_0, group_1)
-
     # Step 3: Get the main folder where the script is located
     main_folder = os.path.dirname(os.path.abspath(args.txt_file))
 
+    # With --checkpoint-dir or --resume, parsed files and finished outputs are checkpointed so an
+    # interrupted run can be continued (opened before step 2, so a refused checkpoint folder leaves the
+    # VCFs where they are; files already moved by the interrupted run stay in place)
+    checkpoint = None
+    if args.checkpoint_dir or args.resume:
+        settings = {'folder': os.path.abspath(args.folder), 'filters': [args.regions, args.pass_only, args.min_qual,
+                    args.min_ru_length, args.max_ru_length, args.samples]}
+        try:
+            checkpoint = RunCheckpoint(args.checkpoint_dir or os.path.join(main_folder, ".checkpoint"), settings,
+                                       args.resume)
+        except ValueError as error:
+            sys.exit(str(error))
+
+    # Step 2: Move files into control and case folders inside the VCF folder
+    move_files(args.folder, group_0, group_1)
+
     # Step 4: Process VCF files in the controls_0 and cases_1 directories and save output in the main folder
-    process_vcf_files([os.path.join(args.folder, "controls_0")], "controls_0.txt", main_folder)
-    process_vcf_files([os.path.join(args.folder, "cases_1")], "cases_1.txt", main_folder)
+    executor = ThreadPoolExecutor(max_workers=1) if args.background_write else None
+    pending = [
+        process_vcf_files([os.path.join(args.folder, "controls_0")], "controls_0.txt", main_folder,
+                          record_filter, args.bed, args.parquet, executor, args.prefetch_files,
+                          args.memory_limit, args.spill_dir, args.backend, checkpoint),
+        process_vcf_files([os.path.join(args.folder, "cases_1")], "cases_1.txt", main_folder,
+                          record_filter, args.bed, args.parquet, executor, args.prefetch_files,
+                          args.memory_limit, args.spill_dir, args.backend, checkpoint),
+    ]
+    if executor is not None:
+        # result() re-raises any error from the writer thread
+        for future in pending:
+            if future is not None:
+                future.result()
+        executor.shutdown()
+    if checkpoint is not None:
+        checkpoint.remove()
+
+    if args.profile is not None:
+        profiling.get_profiler().write_report(args.profile_report)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+
+# Allele index of a missing allele ('.') in a decoded genotype
+MISSING_ALLELE = -1
+
+def parse_gt(genotype):
+    """
+    Allele indices of a GT string or whole FORMAT cell: '0/1', '1|2', '1' (haploid), '10/12',
+    './.', '.' -> (0, 1), (1, 2), (1,), (10, 12), (-1, -1), (-1,). Anything but digits is missing.
+    """
+    gt = genotype.split(':', 1)[0]
+    if not gt:
+        return ()
+    return tuple(int(a) if a.isdigit() else MISSING_ALLELE for a in gt.replace('|', '/').split('/'))
+
+def factorize_genotypes(values):
+    """ (codes, uniques) of an array of GT strings of any shape; codes keep the array's shape. """
+    values = np.asarray(values, dtype=object)
+    codes, uniques = pd.factorize(values.ravel())
+    return codes.reshape(values.shape), uniques
+
+def dosage_table(uniques):
+    """
+    (distinct GTs x allele indices) int8 copies of every allele in every distinct GT string,
+    decoded once each; missing alleles are not counted. Column 0 is the reference.
+    """
+    decoded = [parse_gt(g) for g in uniques]
+    width = max((max(alleles) for alleles in decoded if alleles), default=0) + 1
+    table = np.zeros((len(decoded), max(width, 1)), dtype=np.int8)
+    for i, alleles in enumerate(decoded):
+        for allele in alleles:
+            if allele >= 0:
+                table[i, allele] += 1
+    return table
+
+def alt_allele_counts(values):
+    """ Called non-reference alleles in every row of a (rows x samples) GT array, i.e. the AC column. """
+    codes, uniques = factorize_genotypes(values)
+    alt_copies = dosage_table(uniques)[:, 1:].sum(axis=1, dtype=np.int64)
+    return alt_copies[codes].sum(axis=1)
+
+def _table_dosages(codes, table, alleles):
+    """ Copies of allele index alleles[r] in every cell of row r of a factorized GT array. """
+    alleles = np.asarray(alleles, dtype=np.int64)
+    in_table = (alleles >= 0) & (alleles < table.shape[1])
+    dosages = table[codes, np.where(in_table, alleles, 0)[:, None]]
+    return np.where(in_table[:, None], dosages, 0).astype(np.int8)
+
+def allele_dosages(values, alleles):
+    """
+    Copies of allele index alleles[r] in every cell of row r of a (rows x samples) GT array,
+    the per-ALT split of multiallelic records. Allele indices no genotype uses give 0.
+    """
+    codes, uniques = factorize_genotypes(values)
+    return _table_dosages(codes, dosage_table(uniques), alleles)
+
+def decompose_alts(values, n_alts):
+    """
+    Expands multiallelic records into one row per ALT: values is a (records x samples) GT array and
+    n_alts the ALT count of every record. Returns (record index, ALT index 1..n_alts, dosages) with
+    one entry per output row, in record then ALT order; dosages is an int8 (rows x samples) array
+    of 0/1/2 copies of that row's ALT, compared for all samples and ALTs at once.
+    """
+    n_alts = np.asarray(n_alts, dtype=np.int64)
+    records = np.repeat(np.arange(len(n_alts)), n_alts)
+    first_row = np.repeat(np.cumsum(n_alts) - n_alts, n_alts)
+    alts = np.arange(len(records)) - first_row + 1
+    codes, uniques = factorize_genotypes(values)
+    return records, alts, _table_dosages(codes[records], dosage_table(uniques), alts)
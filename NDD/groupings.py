@@ -0,0 +1,133 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+
+from full_project import read_label_file, merge_vcf_files
+from cohort_matrix import (load_merged_outputs, cohort_from_merged, save_cohort_matrix, load_cohort_matrix,
+                           dosage_path, gz_files_under, matrix_fingerprint, save_fingerprint,
+                           cached_matrix_is_current)
+
+# Loci per matrix product, to bound the float32 copy of the dosage block
+LOCUS_BLOCK = 50_000
+
+def parse_grouping_spec(spec):
+    """
+    'affected.txt' -> two-column label file; 'phenotypes.tsv:sex' -> column 'sex' of a table;
+    'status=cohort2/affected.txt' names the grouping explicitly (default: the column or file name).
+    Returns (grouping name, path, column).
+    """
+    name, _, spec = spec.partition('=') if '=' in spec else ('', '', spec)
+    path, _, column = spec.partition(':')
+    column = column or None
+    name = name or column or os.path.splitext(os.path.basename(path))[0]
+    return name, path, column
+
+def read_groupings(specs):
+    """ {grouping name: {sample: label}} for --labels specs; two groupings may not share a name. """
+    groupings = {}
+    for spec in specs:
+        name, path, column = parse_grouping_spec(spec)
+        if name in groupings:
+            raise ValueError(f"Two groupings are named '{name}'; name them explicitly with name=spec")
+        groupings[name] = read_label_file(path, column)
+    return groupings
+
+def group_masks(samples, groupings):
+    """
+    One boolean sample mask per (grouping, label) pair, stacked into a (samples x groups) matrix.
+    groupings maps a grouping name to {sample: label}; unlabelled samples belong to no group of it.
+    """
+    sample_index = pd.Index(samples)
+    names = []
+    masks = []
+    for grouping, labels in groupings.items():
+        labels = pd.Series(labels).reindex(sample_index)
+        for label in sorted(labels.dropna().unique()):
+            names.append(f"{grouping}_{label}")
+            masks.append((labels == label).to_numpy())
+    return names, np.column_stack(masks) if masks else np.zeros((len(samples), 0), dtype=bool)
+
+def group_allele_counts(dosages, masks, block=LOCUS_BLOCK):
+    """
+    AC of every group at every locus in one pass: each block of the dosage matrix is multiplied
+    once by the (samples x groups) mask matrix, so ten groupings cost about as much as one.
+    """
+    mask_matrix = masks.astype(np.float32)
+    counts = np.empty((dosages.shape[0], masks.shape[1]), dtype=np.int64)
+    for start in range(0, dosages.shape[0], block):
+        block_dosages = np.asarray(dosages[start:start + block], dtype=np.float32)
+        counts[start:start + len(block_dosages)] = np.rint(block_dosages @ mask_matrix)
+    return counts
+
+def group_frequency_table(loci, dosages, samples, groupings):
+    """ Locus table with AC_<group>, AN_<group> and AF_<group> columns for every grouping label. """
+    names, masks = group_masks(samples, groupings)
+    counts = group_allele_counts(dosages, masks)
+    allele_numbers = 2 * masks.sum(axis=0)
+
+    columns = {}
+    for i, name in enumerate(names):
+        columns[f"AC_{name}"] = counts[:, i]
+        columns[f"AN_{name}"] = np.full(len(loci), allele_numbers[i])
+        columns[f"AF_{name}"] = counts[:, i] / allele_numbers[i]
+    return pd.concat([loci.reset_index(drop=True), pd.DataFrame(columns)], axis=1)
+
+def load_or_build_matrix(matrix_dir, folder=None, merged_files=None):
+    """
+    Loads the cached cohort matrix, (re)building it from a VCF folder (searched recursively) or merged
+    outputs unless it was built from those same files (paths, sizes and mtimes) with the same source.
+    Without a folder or merged files the cache is used as it is.
+    """
+    if folder:
+        inputs, source = gz_files_under([folder]), 'folder'
+        if not inputs:
+            raise ValueError(f"No VCF files found in {folder}")
+    elif merged_files:
+        inputs, source = merged_files, 'merged'
+    elif os.path.exists(dosage_path(matrix_dir)):
+        return load_cohort_matrix(matrix_dir)
+    else:
+        raise ValueError("No cached cohort matrix and no VCF folder or merged files to build it from")
+
+    fingerprint = matrix_fingerprint(inputs, {'source': source})
+    if cached_matrix_is_current(dosage_path(matrix_dir), fingerprint):
+        return load_cohort_matrix(matrix_dir)
+    if os.path.exists(dosage_path(matrix_dir)):
+        print(f"Cohort matrix in {matrix_dir} was built from other inputs, rebuilding it")
+    if source == 'folder':
+        merged = merge_vcf_files(inputs)
+        if merged is None:
+            raise ValueError(f"No VCF records parsed from {folder}")
+        save_cohort_matrix(matrix_dir, *cohort_from_merged(*merged))
+    else:
+        save_cohort_matrix(matrix_dir, *load_merged_outputs(inputs))
+    save_fingerprint(matrix_dir, fingerprint)
+    return load_cohort_matrix(matrix_dir)
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-group STR allele counts and frequencies for several sample groupings.")
+    parser.add_argument("--labels", action='append', required=True,
+                        help="Label file (affected.txt format) or table:column, optionally as name=spec; repeat for each grouping")
+    parser.add_argument("--folder", help="Folder of .vcf.gz files (subfolders included) to build the cohort matrix from "
+                                         "(files are not moved)")
+    parser.add_argument("--merged-files", nargs='*', help="process_vcf_files outputs to build the cohort matrix from")
+    parser.add_argument("--matrix-dir", default="cohort_matrix", help="Cached cohort matrix")
+    parser.add_argument("--output", default="group_frequencies.txt", help="Output table")
+    args = parser.parse_args()
+    try:
+        groupings = read_groupings(args.labels)
+    except ValueError as error:
+        parser.error(str(error))
+
+    try:
+        loci, dosages, samples = load_or_build_matrix(args.matrix_dir, args.folder, args.merged_files)
+    except ValueError as error:
+        parser.error(str(error))
+
+    table = group_frequency_table(loci, dosages, samples, groupings)
+    table.to_csv(args.output, sep='\t', index=False, float_format='%.6g')
+    print(f"Group frequencies for {len(groupings)} groupings saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
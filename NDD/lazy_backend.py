@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+import profiling
+from genotypes import dosage_table
+
+try:
+    import polars as pl
+except ImportError:  # the lazy backend is optional
+    pl = None
+
+KEY_COLUMNS = ['CHROM', 'POS', 'REF', 'ALT', 'END', 'REP_UNIT', 'VAR_ID']
+
+def _alt_copies(dataframes, sample_columns):
+    """ Every distinct genotype string of the parsed frames ('.' included) and its non-reference allele count. """
+    values = [df[[c for c in df.columns if c in sample_columns]].to_numpy(dtype=object).ravel() for df in dataframes]
+    uniques = pd.unique(np.concatenate(values + [np.array(['.'], dtype=object)]))
+    return list(uniques), dosage_table(uniques)[:, 1:].sum(axis=1, dtype=np.int64).tolist()
+
+def merge_plan(dataframes, all_sample_names):
+    """
+    The full_project.merge_frames steps as one lazy polars query: chained full joins on the locus
+    columns, '.' for missing genotypes, AC from a genotype -> alt-allele-count lookup, and one sort.
+    pandas' outer merge returns the join keys in lexicographic order and the CHROM/POS sort after
+    it is stable, so sorting on (chromosome order, POS, remaining keys) gives the same row order.
+    Returns (lazy frame, sample_columns).
+    """
+    sample_columns = sorted(all_sample_names)
+    present = [c for c in sample_columns if any(c in df.columns for df in dataframes)]
+    uniques, copies = _alt_copies(dataframes, set(present))
+    chroms = sorted(set().union(*(df['CHROM'].unique() for df in dataframes)), key=lambda x: (not x.isdigit(), x))
+
+    plan = pl.from_pandas(dataframes[0]).lazy()
+    for df in dataframes[1:]:
+        plan = plan.join(pl.from_pandas(df).lazy(), on=KEY_COLUMNS, how='full', coalesce=True)
+
+    plan = plan.with_columns(
+        [pl.col(c).fill_null('.') for c in present]
+        + [pl.lit('.').alias(c) for c in sample_columns if c not in present])
+    alt_counts = [pl.col(c).replace_strict(uniques, copies, return_dtype=pl.Int64) for c in present]
+    plan = plan.with_columns(
+        (pl.sum_horizontal(alt_counts) if alt_counts else pl.lit(0, dtype=pl.Int64)).alias('AC'),
+        pl.col('CHROM').replace_strict(chroms, list(range(len(chroms))), return_dtype=pl.Int64).alias('CHROM_ORDER'))
+    # A single frame is not merged, so its rows keep their parse order within a position
+    tie_break = KEY_COLUMNS[2:] if len(dataframes) > 1 else []
+    plan = plan.sort(['CHROM_ORDER', 'POS'] + tie_break, maintain_order=True)
+    return plan.select(['CHROM', pl.col('POS').cast(pl.String), 'REF', 'ALT', 'END', 'REP_UNIT', 'VAR_ID', 'AC']
+                       + sample_columns), sample_columns
+
+def merge_frames_lazy(dataframes, all_sample_names):
+    """ Drop-in for full_project.merge_frames: the same (merged_df, sample_columns), computed by merge_plan. """
+    if pl is None:
+        raise ImportError("The polars backend needs polars (pip install polars)")
+    with profiling.stage('merge'):
+        plan, sample_columns = merge_plan(dataframes, all_sample_names)
+        result = plan.collect()
+    profiling.count('output_rows', result.height)
+    merged_df = pd.DataFrame({column: result[column].to_numpy() for column in result.columns})
+    return merged_df, sample_columns
@@ -0,0 +1,109 @@
+import argparse
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from association import KEY_COLUMNS, CHUNK_SIZE, load_allele_counts
+
+# Defaults of the maximum credible AF panel in ui.R
+DEFAULTS = {'prev': 500, 'hetA': 0.1, 'hetG': 1.0, 'pen': 0.5}
+INHERITANCE = ['monoallelic', 'biallelic']
+
+def max_credible_af(inheritance, prev, hetA, hetG, pen):
+    """ Maximum credible population AF, as in server-maxAF.R (prev is the '1 in ...' value). """
+    my_prev = 1 / prev
+    if inheritance == "monoallelic":
+        return (1 / 2) * my_prev * hetA * hetG * (1 / pen)
+    if inheritance == "biallelic":
+        return np.sqrt(my_prev) * hetA * np.sqrt(hetG) * (1 / np.sqrt(pen))
+    raise ValueError(f"Unknown inheritance model: {inheritance}")
+
+def max_credible_ac(max_af, pop_size, ci=0.95):
+    """ Maximum tolerated allele count: qpois(CI, popSize * maxAF). """
+    return stats.poisson.ppf(ci, pop_size * max_af).astype(np.int64)
+
+def parse_model_spec(spec):
+    """
+    'biallelic' -> that inheritance with the panel defaults;
+    'monoallelic,prev=2000,pen=0.9' -> overrides for this model only.
+    Returns (inheritance, parameters).
+    """
+    inheritance, *overrides = spec.split(',')
+    if inheritance not in INHERITANCE:
+        raise ValueError(f"Unknown inheritance model: {inheritance}")
+    params = dict(DEFAULTS)
+    for item in overrides:
+        key, value = item.split('=', 1)
+        if key not in params:
+            raise ValueError(f"Unknown parameter {key} in model {spec}")
+        params[key] = float(value)
+    return inheritance, params
+
+def model_table(specs, pop_size, ci=0.95):
+    """ One row per model with its name, parameters, MAX_AF and MAX_AC. """
+    rows = []
+    for spec in specs:
+        inheritance, params = parse_model_spec(spec)
+        max_af = max_credible_af(inheritance, **params)
+        rows.append({'MODEL': spec, 'INHERITANCE': inheritance, **params,
+                     'MAX_AF': max_af, 'MAX_AC': int(max_credible_ac(max_af, pop_size, ci))})
+    models = pd.DataFrame(rows)
+    # Column-friendly names: the inheritance, numbered when it appears more than once
+    counts = models['INHERITANCE'].value_counts()
+    seen = models.groupby('INHERITANCE').cumcount() + 1
+    models['NAME'] = [inh if counts[inh] == 1 else f"{inh}_{n}"
+                      for inh, n in zip(models['INHERITANCE'], seen)]
+    return models
+
+def cohort_allele_counts(txt_files, chunk_size=CHUNK_SIZE):
+    """
+    Total AC per locus over one or more process_vcf_files outputs (e.g. cases_1.txt and
+    controls_0.txt); a locus missing from one file adds nothing. Returns (table, n_samples).
+    """
+    table = None
+    n_samples = 0
+    for txt_file in txt_files:
+        df, n = load_allele_counts(txt_file, chunk_size)
+        n_samples += n
+        if table is None:
+            table = df
+        else:
+            table = pd.merge(table, df, how='outer', on=KEY_COLUMNS, suffixes=('', '_NEXT'))
+            table['AC'] = table['AC'].fillna(0).astype(np.int64) + table.pop('AC_NEXT').fillna(0).astype(np.int64)
+    return table, n_samples
+
+def filter_candidates(table, models, an):
+    """
+    Adds AF and one PASS_<model> column per model (AC <= MAX_AC), comparing the AC vector
+    against every model at once, and keeps loci passing at least one model.
+    """
+    ac = table['AC'].to_numpy()
+    passes = ac[:, None] <= models['MAX_AC'].to_numpy()[None, :]
+    result = table.copy()
+    result['AF'] = ac / an
+    for i, name in enumerate(models['NAME']):
+        result[f"PASS_{name}"] = passes[:, i]
+    return result[passes.any(axis=1)].reset_index(drop=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep STR loci whose cohort AC is below the maximum credible AC of an inheritance model.")
+    parser.add_argument("merged_files", nargs='+', help="process_vcf_files outputs (cases_1.txt controls_0.txt)")
+    parser.add_argument("--model", action='append',
+                        help="monoallelic or biallelic, optionally with overrides: biallelic,prev=2000,pen=0.9 (repeatable)")
+    parser.add_argument("--ci", type=float, default=0.95, help="Confidence level of the Poisson bound")
+    parser.add_argument("--pop-size", type=int, default=None, help="Allele number for MAX_AC (default: 2 x cohort samples)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Rows per read block")
+    parser.add_argument("--output", default="maxaf_candidates.txt", help="Candidate table")
+    args = parser.parse_args()
+
+    table, n_samples = cohort_allele_counts(args.merged_files, args.chunk_size)
+    an = 2 * n_samples
+    models = model_table(args.model or INHERITANCE, args.pop_size or an, args.ci)
+    print(models[['NAME', 'MODEL', 'MAX_AF', 'MAX_AC']].to_string(index=False))
+
+    candidates = filter_candidates(table, models, an)
+    candidates.to_csv(args.output, sep='\t', index=False, float_format='%.6g')
+    print(f"{len(candidates)} of {len(table)} loci pass at least one model; saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
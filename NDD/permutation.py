@@ -0,0 +1,125 @@
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+from full_project import read_sample_file
+from association import benjamini_hochberg
+from cohort_matrix import dosage_path
+from groupings import load_or_build_matrix
+
+# Permutations handled per task, and loci per matrix product inside a task
+PERMUTATION_BATCH = 250
+LOCUS_BLOCK = 20_000
+
+# Per-worker state, set once by _init_worker so tasks never re-read the matrix or the observed statistics
+_dosages = None
+_columns = None
+_observed = None
+_group_sizes = None
+
+def label_bitsets(case_mask, n_permutations, seed=None):
+    """
+    Shuffles the case/control labels n_permutations times. Each permutation is a bitset
+    (np.packbits of the case mask), so the whole set costs n_permutations x n_samples / 8 bytes.
+    """
+    rng = np.random.default_rng(seed)
+    shuffled = rng.permuted(np.tile(case_mask, (n_permutations, 1)), axis=1)
+    return np.packbits(shuffled, axis=1)
+
+def mean_difference(case_ac, total_ac, n_cases, n_controls):
+    """ Absolute difference in mean alt-allele dosage between cases and controls. """
+    return np.abs(case_ac / n_cases - (total_ac - case_ac) / n_controls)
+
+def _init_worker(matrix_path, columns, observed, n_cases, n_controls):
+    global _dosages, _columns, _observed, _group_sizes
+    _dosages = np.load(matrix_path, mmap_mode='r')
+    _columns = columns
+    _observed = observed
+    _group_sizes = (n_cases, n_controls)
+
+def _count_exceedances(packed):
+    """ Number of permutations whose statistic reaches the observed one, per locus, for one batch of bitsets. """
+    observed = _observed
+    n_cases, n_controls = _group_sizes
+    n_samples = len(_columns)
+    # Labels as a float (samples x permutations) matrix, so case AC is one BLAS product per block
+    labels = np.unpackbits(packed, axis=1, count=n_samples).T.astype(np.float32)
+    exceed = np.zeros(len(observed), dtype=np.int64)
+    for start in range(0, len(observed), LOCUS_BLOCK):
+        block = np.asarray(_dosages[start:start + LOCUS_BLOCK][:, _columns], dtype=np.float32)
+        case_ac = block @ labels
+        total_ac = block.sum(axis=1, keepdims=True)
+        stat = mean_difference(case_ac, total_ac, n_cases, n_controls)
+        # Small tolerance so float32 rounding does not hide ties with the observed value
+        exceed[start:start + len(block)] = (stat >= observed[start:start + len(block), None] - 1e-6).sum(axis=1)
+    return exceed
+
+def permutation_test(matrix_dir, samples, group_0, group_1, n_permutations=10000,
+                     workers=None, seed=None):
+    """
+    Empirical per-locus p-values from label permutations over a saved cohort matrix.
+    Only samples labelled 0 or 1 are used; permutation batches are spread over a process pool
+    whose workers memory-map the dosage matrix once.
+    """
+    columns = np.array([i for i, s in enumerate(samples) if s in group_0 or s in group_1])
+    case_mask = np.array([samples[i] in group_1 for i in columns])
+    n_cases, n_controls = int(case_mask.sum()), int((~case_mask).sum())
+    if n_cases == 0 or n_controls == 0:
+        raise ValueError("Both cases and controls are needed for a permutation test")
+
+    dosages = np.load(dosage_path(matrix_dir), mmap_mode='r')
+    case_ac = np.zeros(dosages.shape[0], dtype=np.int64)
+    total_ac = np.zeros(dosages.shape[0], dtype=np.int64)
+    for start in range(0, dosages.shape[0], LOCUS_BLOCK):
+        block = np.asarray(dosages[start:start + LOCUS_BLOCK][:, columns], dtype=np.int64)
+        case_ac[start:start + len(block)] = block[:, case_mask].sum(axis=1)
+        total_ac[start:start + len(block)] = block.sum(axis=1)
+    observed = mean_difference(case_ac, total_ac, n_cases, n_controls)
+
+    bitsets = label_bitsets(case_mask, n_permutations, seed)
+    tasks = [bitsets[i:i + PERMUTATION_BATCH] for i in range(0, n_permutations, PERMUTATION_BATCH)]
+
+    exceed = np.zeros(len(observed), dtype=np.int64)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(dosage_path(matrix_dir), columns, observed, n_cases, n_controls)) as pool:
+        for done, batch_exceed in enumerate(pool.map(_count_exceedances, tasks), 1):
+            exceed += batch_exceed
+            print(f"Permutations done: {min(done * PERMUTATION_BATCH, n_permutations)}/{n_permutations}", end='\r')
+    print()
+
+    return pd.DataFrame({
+        'AC_CASE': case_ac,
+        'AC_CONTROL': total_ac - case_ac,
+        'STAT': observed,
+        'PERM_P': (1 + exceed) / (1 + n_permutations),
+    })
+
+def main():
+    parser = argparse.ArgumentParser(description="Permutation-based case/control significance per STR locus.")
+    parser.add_argument("txt_file", help="Sample file with 0 (control) / 1 (case) labels, e.g. affected.txt")
+    parser.add_argument("merged_files", nargs='*', help="process_vcf_files outputs (cases_1.txt controls_0.txt)")
+    parser.add_argument("--matrix-dir", default="cohort_matrix",
+                        help="Cached cohort matrix (rebuilt from merged_files if missing or built from other files)")
+    parser.add_argument("--permutations", type=int, default=10000, help="Number of label shuffles")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducible shuffles")
+    parser.add_argument("--output", default="permutation_loci.txt", help="Ranked output table")
+    args = parser.parse_args()
+
+    try:
+        loci, _, samples = load_or_build_matrix(args.matrix_dir, merged_files=args.merged_files)
+    except ValueError as error:
+        parser.error(str(error))
+
+    group_0, group_1 = read_sample_file(args.txt_file)
+    results = permutation_test(args.matrix_dir, samples, group_0, group_1,
+                               args.permutations, args.workers, args.seed)
+    results['PERM_Q'] = benjamini_hochberg(results['PERM_P'])
+
+    ranked = pd.concat([loci, results], axis=1).sort_values(by=['PERM_P', 'STAT'], ascending=[True, False], kind='stable')
+    ranked.to_csv(args.output, sep='\t', index=False, float_format='%.6g')
+    print(f"Permutation results saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
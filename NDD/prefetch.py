@@ -0,0 +1,117 @@
+import zlib
+import queue
+import threading
+from collections import deque
+
+# Compressed bytes read from disk per block
+BLOCK_SIZE = 1 << 22
+# Decompressed blocks buffered per file before its reader waits for the parser
+QUEUE_BLOCKS = 8
+# Files read and decompressed ahead of the one being parsed
+FILES_AHEAD = 2
+
+# zlib window bits that accept a gzip header (and plain zlib streams)
+GZIP_WBITS = zlib.MAX_WBITS | 32
+
+def _inflate(decompressor, raw):
+    """ Decompresses raw into one buffer, starting a new decompressor at each gzip member (BGZF has thousands). """
+    chunks = []
+    while raw:
+        chunks.append(decompressor.decompress(raw))
+        if not decompressor.eof:
+            break
+        raw = decompressor.unused_data
+        decompressor = zlib.decompressobj(GZIP_WBITS)
+    return b''.join(chunks), decompressor
+
+def _put(blocks, item, stop):
+    """ Blocking put that gives up once the consumer has gone away. """
+    while not stop.is_set():
+        try:
+            blocks.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _read_blocks(path, blocks, stop, block_size):
+    """
+    Producer thread: reads and decompresses a file block by block into a bounded queue, then None.
+    File reads and zlib both release the GIL, so this overlaps with parsing in the main thread.
+    An exception is handed to the consumer instead of being lost in the thread.
+    """
+    try:
+        decompressor = zlib.decompressobj(GZIP_WBITS) if path.endswith(".gz") else None
+        with open(path, 'rb') as f:
+            while not stop.is_set():
+                raw = f.read(block_size)
+                if not raw:
+                    break
+                if decompressor is not None:
+                    raw, decompressor = _inflate(decompressor, raw)
+                if raw and not _put(blocks, raw, stop):
+                    return
+        _put(blocks, None, stop)
+    except BaseException as error:
+        _put(blocks, error, stop)
+
+def _lines(path, blocks, thread):
+    """ Lines (without the trailing newline) of the blocks a reader thread produces, in order. """
+    tail = b''
+    while True:
+        try:
+            block = blocks.get(timeout=0.1)
+        except queue.Empty:
+            if thread.is_alive():
+                continue
+            # The reader may have queued its last item just before ending
+            try:
+                block = blocks.get_nowait()
+            except queue.Empty:
+                raise RuntimeError(f"Reading {path} was stopped before its end (lines used after moving to the next file?)")
+        if block is None:
+            break
+        if isinstance(block, BaseException):
+            raise block
+        lines = (tail + block).split(b'\n')
+        tail = lines.pop()
+        yield from lines
+    if tail:
+        yield tail
+
+def _start_reader(path, block_size, queue_blocks):
+    blocks = queue.Queue(maxsize=queue_blocks)
+    stop = threading.Event()
+    thread = threading.Thread(target=_read_blocks, args=(path, blocks, stop, block_size), daemon=True,
+                              name=f"prefetch {path}")
+    thread.start()
+    return path, blocks, stop, thread
+
+def prefetch_files(paths, files_ahead=FILES_AHEAD, queue_blocks=QUEUE_BLOCKS, block_size=BLOCK_SIZE):
+    """
+    Yields (path, lines) for every file in order, where lines iterates over the file's decompressed
+    lines as bytes. While one file is parsed, it and the next files_ahead files are read and
+    decompressed by background threads. Each reader holds at most queue_blocks decompressed blocks,
+    so memory stays bounded and a slow parser throttles the reads (backpressure).
+    Each lines iterator must be consumed before the next file is requested.
+    """
+    paths = list(paths)
+    readers = deque()
+    next_path = 0
+    try:
+        for _ in range(len(paths)):
+            while next_path < len(paths) and len(readers) <= files_ahead:
+                readers.append(_start_reader(paths[next_path], block_size, queue_blocks))
+                next_path += 1
+            # The reader of the file being parsed stays in readers until its lines are done
+            path, blocks, stop, thread = readers[0]
+            yield path, _lines(path, blocks, thread)
+            readers.popleft()
+            stop.set()
+            thread.join()
+    finally:
+        # Early exit (error, break or close() in the caller, even mid-file): stop and wait for every reader
+        for _, _, stop, thread in readers:
+            stop.set()
+        for _, _, _, thread in readers:
+            thread.join()
@@ -0,0 +1,174 @@
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import resource
+import threading
+import tracemalloc
+import contextlib
+
+# Seconds between RSS samples while profiling
+SAMPLE_INTERVAL = 0.2
+# Functions / allocation sites listed in the report
+TOP_ENTRIES = 25
+
+def _rss_mb():
+    """ Current resident set size; /proc on Linux, the peak from getrusage elsewhere. """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+class Profiler:
+    """
+    Per-stage wall time, counters and peak memory for one pipeline run, plus optional cProfile and
+    tracemalloc capture. When disabled, stages and counters are still recorded (they are cheap)
+    but no sampling thread, progress line or capture runs.
+    """
+
+    def __init__(self, enabled=False, cprofile=False, tracemalloc=False, interval=SAMPLE_INTERVAL):
+        self.enabled = enabled
+        self.stages = {}
+        self.counters = {}
+        self.peak_rss_mb = _rss_mb()
+        self._active = []
+        self._lock = threading.Lock()
+        self._interval = interval
+        self._stop = threading.Event()
+        self._sampler = None
+        self._cprofile = cProfile.Profile() if enabled and cprofile else None
+        self._tracemalloc = enabled and tracemalloc
+        self._start = time.perf_counter()
+        self._progress_start = {}
+
+    def start(self):
+        if not self.enabled:
+            return self
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+        self._sampler.start()
+        if self._tracemalloc:
+            tracemalloc.start()
+        if self._cprofile is not None:
+            self._cprofile.enable()
+        return self
+
+    def stop(self):
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        self._record_rss()
+
+    def _record_rss(self):
+        rss = _rss_mb()
+        with self._lock:
+            self.peak_rss_mb = max(self.peak_rss_mb, rss)
+            for name in self._active:
+                self.stages[name]['peak_rss_mb'] = max(self.stages[name]['peak_rss_mb'], rss)
+
+    def _sample(self):
+        while not self._stop.wait(self._interval):
+            self._record_rss()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """ Times a block; repeated stages (one per file, ...) accumulate calls and seconds. """
+        with self._lock:
+            record = self.stages.setdefault(name, {'calls': 0, 'seconds': 0.0, 'peak_rss_mb': 0.0})
+            self._active.append(name)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            elapsed = time.perf_counter() - start
+            if self.enabled:
+                self._record_rss()
+            with self._lock:
+                record['calls'] += 1
+                record['seconds'] += elapsed
+                self._active.remove(name)
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def progress(self, name, done, total, unit="items"):
+        """
+        One overwritten terminal line with throughput and ETA for a loop over `total` units.
+        Call it with done=0 before the loop so the rate includes the first unit.
+        """
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        start = self._progress_start.setdefault(name, now)
+        rate = done / (now - start) if now > start else 0.0
+        eta = (total - done) / rate if rate > 0 else float('nan')
+        eta_text = time.strftime('%H:%M:%S', time.gmtime(eta)) if eta == eta else '--:--:--'
+        sys.stderr.write(f"\r[{name}] {done}/{total} {unit}  {rate:,.1f} {unit}/s  ETA {eta_text}  RSS {_rss_mb():,.0f} MB ")
+        if done >= total:
+            sys.stderr.write("\n")
+            del self._progress_start[name]
+        sys.stderr.flush()
+
+    def report(self):
+        """ Machine-readable summary: stages, counters, throughput, peak memory and optional captures. """
+        total = time.perf_counter() - self._start
+        stages = {name: {**record, 'seconds': round(record['seconds'], 4),
+                         'share': round(record['seconds'] / total, 4) if total else 0.0,
+                         'peak_rss_mb': round(record['peak_rss_mb'], 1)}
+                  for name, record in self.stages.items()}
+        report = {'total_seconds': round(total, 4), 'peak_rss_mb': round(self.peak_rss_mb, 1),
+                  'stages': stages, 'counters': self.counters}
+        if 'records' in self.counters and total:
+            report['records_per_sec'] = round(self.counters['records'] / total, 1)
+
+        if self._cprofile is not None:
+            stats = pstats.Stats(self._cprofile)
+            rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:TOP_ENTRIES]
+            report['cprofile'] = [{'function': f"{os.path.basename(file)}:{line}({func})",
+                                   'calls': nc, 'tottime': round(tt, 4), 'cumtime': round(ct, 4)}
+                                  for (file, line, func), (cc, nc, tt, ct, _) in rows]
+        if self._tracemalloc and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            report['tracemalloc'] = {
+                'peak_mb': round(peak / 2 ** 20, 1),
+                'top': [{'site': str(stat.traceback[0]), 'size_mb': round(stat.size / 2 ** 20, 2), 'blocks': stat.count}
+                        for stat in snapshot.statistics('lineno')[:TOP_ENTRIES]],
+            }
+            tracemalloc.stop()
+        return report
+
+    def write_report(self, path):
+        self.stop()
+        report = self.report()
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        if self._cprofile is not None:
+            self._cprofile.dump_stats(os.path.splitext(path)[0] + ".prof")
+        print(f"Profile report saved to {path}")
+        return report
+
+# The profiler the pipeline functions report to; replaced by enable_profiling
+_profiler = Profiler()
+
+def enable_profiling(cprofile=False, tracemalloc=False):
+    """ Installs and starts an enabled profiler for the rest of the run. """
+    global _profiler
+    _profiler = Profiler(enabled=True, cprofile=cprofile, tracemalloc=tracemalloc).start()
+    return _profiler
+
+def get_profiler():
+    return _profiler
+
+def stage(name):
+    return _profiler.stage(name)
+
+def count(name, n=1):
+    _profiler.count(name, n)
+
+def progress(name, done, total, unit="items"):
+    _profiler.progress(name, done, total, unit)
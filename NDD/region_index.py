@@ -0,0 +1,208 @@
+import io
+import os
+import re
+import argparse
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+# Data rows per indexed block; a region query decodes only the blocks it overlaps
+BLOCK_ROWS = 2048
+# Decoded blocks kept in memory across queries
+BLOCK_CACHE = 256
+INDEX_SUFFIX = ".ridx"
+
+# (chromosome, start, end) column names recognised in the headers of the merged outputs
+COORDINATE_COLUMNS = [('CHROM', 'POS', 'END'), ('seqnames', 'start', 'end'),
+                      ('chromosome', 'start', 'end'), ('chr', 'start', 'end')]
+
+def coordinate_columns(header):
+    """ Positions of the chromosome, start and end columns in a header (end falls back to start). """
+    for chrom, start, end in COORDINATE_COLUMNS:
+        if chrom in header and start in header:
+            return header.index(chrom), header.index(start), header.index(end) if end in header else header.index(start)
+    raise ValueError(f"No chromosome/position columns in header: {header[:8]}")
+
+def index_path(path):
+    return path + INDEX_SUFFIX
+
+def write_region_index(path, block_rows=BLOCK_ROWS):
+    """
+    Scans a tab-separated output once and writes <path>.ridx: one row per block of up to
+    block_rows lines of a single chromosome, with its byte OFFSET/LENGTH and the smallest
+    start and largest end it holds. The file does not need to be sorted for queries to be
+    correct; sorted files (as written by process_vcf_files) just give tighter blocks.
+    """
+    blocks = []
+    with open(path, 'rb') as f:
+        header_line = f.readline()
+        header = header_line.rstrip(b'\r\n').decode().split('\t')
+        chrom_i, start_i, end_i = coordinate_columns(header)
+        maxsplit = max(chrom_i, start_i, end_i) + 1
+        offset = len(header_line)
+
+        block = None
+        for line in f:
+            fields = line.split(b'\t', maxsplit)
+            chrom = fields[chrom_i]
+            start = int(fields[start_i])
+            end = int(fields[end_i]) if fields[end_i].strip().isdigit() else start
+            if block is None or block[0] != chrom or block[3] >= block_rows:
+                if block is not None:
+                    blocks.append(block)
+                block = [chrom, offset, 0, 0, start, end]
+            block[2] += len(line)
+            block[3] += 1
+            block[4] = min(block[4], start)
+            block[5] = max(block[5], end)
+            offset += len(line)
+        if block is not None:
+            blocks.append(block)
+
+    return _save_index(path, [[block[0].decode()] + block[1:] for block in blocks])
+
+def _save_index(path, blocks):
+    index = pd.DataFrame(blocks, columns=['CHROM', 'OFFSET', 'LENGTH', 'N_ROWS', 'MIN_START', 'MAX_END'])
+    index.to_csv(index_path(path), sep='\t', index=False)
+    print(f"Region index ({len(index)} blocks) saved to {index_path(path)}")
+    return index
+
+class RegionIndexer:
+    """
+    The blocks of write_region_index, built while a file is being written: add() takes the
+    chromosome, start, end and byte length of every line of a batch, in file order, so the
+    index is saved without reading the file again. header_bytes is the length of the header line.
+    """
+
+    def __init__(self, header_bytes, block_rows=BLOCK_ROWS):
+        self.offset = header_bytes
+        self.block_rows = block_rows
+        self.blocks = []
+        self.block = None  # [CHROM, OFFSET, LENGTH, N_ROWS, MIN_START, MAX_END] of the block still open
+
+    def add(self, chroms, starts, ends, lengths):
+        chroms = np.asarray(chroms, dtype=object)
+        offsets = self.offset + np.cumsum(lengths) - lengths
+        changes = np.flatnonzero(chroms[1:] != chroms[:-1]) + 1
+        for first, last in zip(np.concatenate([[0], changes]), np.concatenate([changes, [len(chroms)]])):
+            block = self.block
+            # Rows of the open block's chromosome fill it up first
+            if block is not None and block[0] == chroms[first] and block[3] < self.block_rows:
+                taken = min(self.block_rows - block[3], last - first)
+                block[2] += int(lengths[first:first + taken].sum())
+                block[3] += int(taken)
+                block[4] = min(block[4], int(starts[first:first + taken].min()))
+                block[5] = max(block[5], int(ends[first:first + taken].max()))
+                first += taken
+                if first == last:
+                    continue
+            if block is not None:
+                self.blocks.append(block)
+            # The rest of the run in full blocks, the last one left open
+            bounds = np.arange(first, last, self.block_rows)
+            sizes = np.diff(np.append(bounds, last))
+            new_blocks = zip(offsets[bounds].tolist(), np.add.reduceat(lengths[first:last], bounds - first).tolist(),
+                             sizes.tolist(), np.minimum.reduceat(starts[first:last], bounds - first).tolist(),
+                             np.maximum.reduceat(ends[first:last], bounds - first).tolist())
+            self.blocks.extend([chroms[first]] + list(values) for values in new_blocks)
+            self.block = self.blocks.pop()
+        self.offset += int(np.sum(lengths))
+
+    def save(self, path):
+        """ Writes <path>.ridx, the same file write_region_index would give. """
+        if self.block is not None:
+            self.blocks.append(self.block)
+            self.block = None
+        return _save_index(path, self.blocks)
+
+@lru_cache(maxsize=16)
+def _load_index(path, mtime):
+    """ Header and per-chromosome block arrays of an indexed file; keyed on mtime so rewrites are picked up. """
+    with open(path) as f:
+        header = f.readline().rstrip('\r\n').split('\t')
+    index = pd.read_csv(index_path(path), sep='\t', dtype={'CHROM': str})
+    blocks = {chrom: tuple(group[c].to_numpy() for c in ['OFFSET', 'LENGTH', 'MIN_START', 'MAX_END'])
+              for chrom, group in index.groupby('CHROM', sort=False)}
+    return header, blocks
+
+@lru_cache(maxsize=BLOCK_CACHE)
+def _read_block(path, mtime, offset, length):
+    """ Decodes one block into a string DataFrame; recently used blocks stay cached. """
+    header, _ = _load_index(path, mtime)
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        data = f.read(length)
+    return pd.read_csv(io.BytesIO(data), sep='\t', header=None, names=header, dtype=str, keep_default_na=False)
+
+def query_region(path, chrom, start, end):
+    """
+    Rows of an indexed output overlapping chrom:start-end (1-based, inclusive).
+    Only blocks whose [MIN_START, MAX_END] span meets the region are read and decoded.
+    """
+    if not os.path.exists(index_path(path)) or os.path.getmtime(index_path(path)) < os.path.getmtime(path):
+        write_region_index(path)
+    mtime = os.path.getmtime(path)
+    header, blocks = _load_index(path, mtime)
+    chrom_i, start_i, end_i = coordinate_columns(header)
+    if chrom not in blocks:
+        return pd.DataFrame(columns=header)
+
+    offsets, lengths, min_starts, max_ends = blocks[chrom]
+    hits = np.flatnonzero((min_starts <= end) & (max_ends >= start))
+    if len(hits) == 0:
+        return pd.DataFrame(columns=header)
+    frames = [_read_block(path, mtime, int(offsets[i]), int(lengths[i])) for i in hits]
+    rows = pd.concat(frames, ignore_index=True)
+
+    row_start = pd.to_numeric(rows[header[start_i]])
+    row_end = pd.to_numeric(rows[header[end_i]], errors='coerce').fillna(row_start)
+    return rows[(row_start <= end) & (row_end >= start)].reset_index(drop=True)
+
+def parse_region(text):
+    """ 'chr1:1,000-2,000' -> ('chr1', 1000, 2000); a bare chromosome covers all of it. """
+    match = re.fullmatch(r'\s*([^:\s]+)(?::([\d,]+)(?:-([\d,]+))?)?\s*', text)
+    if match is None:
+        raise ValueError(f"Cannot parse region: {text}")
+    chrom, start, end = match.groups()
+    start = int(start.replace(',', '')) if start else 1
+    end = int(end.replace(',', '')) if end else (start if match.group(2) else np.iinfo(np.int64).max)
+    return chrom, start, end
+
+def gene_regions(gene, gene_bed):
+    """ (chrom, start, end) of every interval of a gene in a BED with a symbol column (the app's target BED). """
+    genes = pd.read_csv(gene_bed, sep='\t', header=None, usecols=[0, 1, 2, 3],
+                        names=['chr', 'start', 'end', 'SYMBOL'], dtype={'chr': str, 'SYMBOL': str})
+    genes = genes[genes['SYMBOL'] == gene]
+    # BED starts are 0-based
+    return list(zip(genes['chr'], genes['start'] + 1, genes['end']))
+
+def main():
+    parser = argparse.ArgumentParser(description="Index merged outputs by region and query them without a full scan.")
+    parser.add_argument("file", help="Tab-separated output (e.g. cases_1.txt)")
+    parser.add_argument("regions", nargs='*', help="Regions to query, as chr:start-end")
+    parser.add_argument("--gene", action='append', default=[], help="Gene symbol to query (needs --gene-bed)")
+    parser.add_argument("--gene-bed", help="BED with chr, start, end, SYMBOL")
+    parser.add_argument("--block-rows", type=int, default=BLOCK_ROWS, help="Rows per indexed block")
+    parser.add_argument("--output", help="Write the matching rows here instead of the terminal")
+    args = parser.parse_args()
+
+    if not args.regions and not args.gene:
+        write_region_index(args.file, args.block_rows)
+        return
+
+    queries = [parse_region(r) for r in args.regions]
+    if args.gene:
+        if not args.gene_bed:
+            parser.error("--gene needs --gene-bed")
+        for gene in args.gene:
+            queries.extend(gene_regions(gene, args.gene_bed))
+
+    result = pd.concat([query_region(args.file, *q) for q in queries], ignore_index=True).drop_duplicates()
+    if args.output:
+        result.to_csv(args.output, sep='\t', index=False)
+        print(f"{len(result)} rows saved to {args.output}")
+    else:
+        print(result.to_string(index=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+import os
+import gzip
+import argparse
+import numpy as np
+import pandas as pd
+
+from cohort_matrix import gz_files_under, matrix_fingerprint, save_fingerprint, cached_matrix_is_current
+
+LOCUS_COLUMNS = ['CHROM', 'POS', 'REP_UNIT', 'VAR_ID']
+
+# int16 sentinel for a missing call; it sorts after every real repeat count
+MISSING = np.iinfo(np.int16).max
+# Longest repeat count stored: locus_statistics doubles counts in int16, so larger ones are clipped to it
+MAX_REPEATS = MISSING // 2
+
+# Loci per block for the sort-based statistics
+LOCUS_BLOCK = 100_000
+
+def _decode_gt(genotype):
+    """ Allele indices of the first two alleles of a GT string ('0/1', '1|2', '1', './.'); -1 when missing. """
+    alleles = genotype.split(':', 1)[0].replace('|', '/').split('/')
+    indices = [int(a) if a.isdigit() else -1 for a in alleles[:2]]
+    if len(indices) == 1:
+        indices.append(indices[0])  # haploid call
+    return indices
+
+def parse_repeat_counts(input_file):
+    """
+    Reads one VCF into (loci, repeats, sample_names): the locus table and an int16 (records x samples)
+    matrix holding the longest allele repeat count of every sample (MISSING when not called).
+    Repeat counts above MAX_REPEATS are clipped to it, with a warning.
+    Allele indices are decoded once per distinct GT string and looked up with take_along_axis.
+    """
+    open_func = gzip.open if input_file.endswith(".gz") else open
+    loci = []
+    allele_repeats = []
+    genotypes = []
+    sample_names = []
+
+    with open_func(input_file, 'rt') as f:
+        for line in f:
+            if line.startswith("#"):
+                if not line.startswith("##"):
+                    sample_names = line.rstrip("\n").split('\t')[9:]
+                continue
+
+            fields = line.rstrip("\n").split('\t')
+            info_dict = dict(item.split('=', 1) for item in fields[7].split(';') if '=' in item)
+            repeat_unit = info_dict.get('RU', '')
+            alt_alleles = [a.strip('<>').replace('STR', '') for a in fields[4].split(',') if a.startswith('<STR')]
+            if not repeat_unit or not alt_alleles:
+                continue
+
+            loci.append((fields[0], int(fields[1]), repeat_unit, info_dict.get('VARID', '.')))
+            allele_repeats.append([int(info_dict.get('REF', 0))] + [int(a) for a in alt_alleles])
+            genotypes.extend(fields[9:])
+
+    n_records, n_samples = len(loci), len(sample_names)
+    if n_records == 0:
+        return pd.DataFrame(columns=LOCUS_COLUMNS), np.empty((0, n_samples), dtype=np.int16), sample_names
+
+    # Repeat count of allele index i at record r, padded to the widest record
+    width = max(len(r) for r in allele_repeats)
+    repeat_table = np.zeros((n_records, width + 1), dtype=np.int64)
+    for r, counts in enumerate(allele_repeats):
+        repeat_table[r, :len(counts)] = counts
+    filled = np.arange(width + 1) < np.array([len(r) for r in allele_repeats])[:, None]
+    n_clipped = int((filled & (repeat_table > MAX_REPEATS)).sum())
+    if n_clipped:
+        print(f"Warning: {n_clipped} allele repeat counts in {input_file} are above {MAX_REPEATS} and were clipped to it")
+    repeat_table = np.where(filled, np.clip(repeat_table, 0, MAX_REPEATS), MISSING).astype(np.int16)
+
+    codes, uniques = pd.factorize(np.asarray(genotypes, dtype=object))
+    decoded = np.array([_decode_gt(g) for g in uniques], dtype=np.int64).reshape(-1, 2)
+    alleles = decoded[codes].reshape(n_records, n_samples, 2)
+    # Missing or out-of-range allele indices point at the padding column, which holds MISSING
+    alleles = np.where((alleles < 0) | (alleles >= width), width, alleles)
+
+    lengths = np.take_along_axis(repeat_table[:, None, :], alleles, axis=2)
+    # The longer allele decides; a half-missing call keeps its called allele
+    lengths = np.where(lengths == MISSING, -1, lengths).max(axis=2)
+    repeats = np.where(lengths < 0, MISSING, lengths).astype(np.int16)
+
+    return pd.DataFrame(loci, columns=LOCUS_COLUMNS), repeats, sample_names
+
+def build_repeat_matrix(file_paths):
+    """ Parses every VCF (or folder of .gz files, searched recursively) and merges them into one (loci x samples) int16 matrix. """
+    tables = []
+    for gz_file in gz_files_under(file_paths):
+        print(f"Processing file: {gz_file}")
+        tables.append(parse_repeat_counts(gz_file))
+
+    loci = pd.concat([t[0] for t in tables], ignore_index=True).drop_duplicates(ignore_index=True)
+    locus_index = pd.MultiIndex.from_frame(loci)
+    samples = [s for _, _, names in tables for s in names]
+    repeats = np.full((len(loci), len(samples)), MISSING, dtype=np.int16)
+    column = 0
+    for file_loci, file_repeats, names in tables:
+        rows = locus_index.get_indexer(pd.MultiIndex.from_frame(file_loci))
+        repeats[rows, column:column + len(names)] = file_repeats
+        column += len(names)
+    return loci, repeats, samples
+
+def save_repeat_matrix(output_dir, loci, repeats, samples):
+    """ Stores loci.txt, samples.txt and a memory-mappable repeats.npy. """
+    os.makedirs(output_dir, exist_ok=True)
+    loci.to_csv(os.path.join(output_dir, "loci.txt"), sep='\t', index=False)
+    with open(os.path.join(output_dir, "samples.txt"), 'w') as f:
+        f.write("\n".join(samples) + "\n")
+    np.save(os.path.join(output_dir, "repeats.npy"), repeats)
+    print(f"Repeat matrix ({repeats.shape[0]} loci x {repeats.shape[1]} samples) saved to {output_dir}")
+
+def load_repeat_matrix(matrix_dir):
+    """ Loads a matrix written by save_repeat_matrix, with the repeat counts memory-mapped. """
+    loci = pd.read_csv(os.path.join(matrix_dir, "loci.txt"), sep='\t', dtype=str, keep_default_na=False)
+    loci['POS'] = loci['POS'].astype(np.int64)
+    with open(os.path.join(matrix_dir, "samples.txt")) as f:
+        samples = [line.strip() for line in f if line.strip()]
+    return loci, np.load(os.path.join(matrix_dir, "repeats.npy"), mmap_mode='r'), samples
+
+def _sorted_quantiles(sorted_block, n_valid, quantiles):
+    """ Linear-interpolated quantiles of rows already sorted with MISSING at the end. """
+    result = []
+    last = np.maximum(n_valid - 1, 0)
+    for q in quantiles:
+        position = q * last
+        lower = np.floor(position).astype(np.int64)
+        upper = np.minimum(lower + 1, last)
+        lo = np.take_along_axis(sorted_block, lower[:, None], axis=1)[:, 0].astype(np.float32)
+        hi = np.take_along_axis(sorted_block, upper[:, None], axis=1)[:, 0].astype(np.float32)
+        value = lo + (hi - lo) * (position - lower)
+        result.append(np.where(n_valid > 0, value, np.nan))
+    return result
+
+def locus_statistics(repeats, block=LOCUS_BLOCK):
+    """
+    Per-locus median, MAD and 95th/99th percentiles of the called repeat counts.
+    Each block is sorted once along the sample axis (MISSING sorts last), so every statistic
+    is an index lookup rather than a per-locus Python computation. Deviations from the median
+    are kept as int16 half units so the MAD sort stays on the fast integer path.
+    """
+    n_loci = repeats.shape[0]
+    stats = {name: np.empty(n_loci, dtype=np.float32) for name in ['MEDIAN', 'MAD', 'P95', 'P99']}
+    n_called = np.empty(n_loci, dtype=np.int64)
+    for start in range(0, n_loci, block):
+        values = np.asarray(repeats[start:start + block])
+        s = slice(start, start + len(values))
+        valid = values != MISSING
+        n_valid = valid.sum(axis=1)
+        median, p95, p99 = _sorted_quantiles(np.sort(values, axis=1), n_valid, [0.5, 0.95, 0.99])
+
+        # 2 * median is an integer and counts are at most MAX_REPEATS, so |2x - 2 * median| is exact in int16
+        double_median = np.nan_to_num(2 * median).astype(np.int16)
+        deviation = np.abs(2 * values - double_median[:, None])
+        deviation[~valid] = MISSING
+        mad, = _sorted_quantiles(np.sort(deviation, axis=1), n_valid, [0.5])
+
+        stats['MEDIAN'][s], stats['MAD'][s], stats['P95'][s], stats['P99'][s] = median, mad / 2, p95, p99
+        n_called[s] = n_valid
+    stats['N_CALLED'] = n_called
+    return pd.DataFrame(stats)
+
+def find_outliers(loci, repeats, samples, stats, z_threshold=3.5, min_excess=2, block=LOCUS_BLOCK):
+    """
+    Samples whose repeat count exceeds the locus median by at least min_excess units and by
+    z_threshold robust z-scores (|x - median| / (1.4826 * MAD)); a MAD of 0 counts as infinite z.
+    Both conditions fold into one repeat-count cutoff per locus, so each block costs one comparison.
+    """
+    median = stats['MEDIAN'].to_numpy()
+    scale = 1.4826 * stats['MAD'].to_numpy()
+    cutoff = median + np.maximum(min_excess, z_threshold * scale)
+    # Loci with no calls never flag; MISSING itself is excluded below
+    cutoff = np.nan_to_num(cutoff, nan=np.inf)
+    # Starts with an empty hit so that no loci (or no outliers) give an empty table with the same columns
+    hits = [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=repeats.dtype))]
+    for start in range(0, repeats.shape[0], block):
+        values = np.asarray(repeats[start:start + block])
+        flagged = (values >= cutoff[start:start + len(values), None]) & (values != MISSING)
+        rows, cols = np.nonzero(flagged)
+        hits.append((rows + start, cols, values[rows, cols]))
+
+    rows = np.concatenate([h[0] for h in hits])
+    cols = np.concatenate([h[1] for h in hits])
+    outliers = loci.iloc[rows].reset_index(drop=True)
+    outliers['SAMPLE'] = np.asarray(samples, dtype=object)[cols]
+    outliers['REPEATS'] = np.concatenate([h[2] for h in hits])
+    outliers = pd.concat([outliers, stats.iloc[rows].reset_index(drop=True)], axis=1)
+    with np.errstate(divide='ignore'):
+        outliers['Z'] = np.where(scale[rows] > 0, (outliers['REPEATS'] - median[rows]) / scale[rows], np.inf)
+    return outliers.sort_values(by=['Z', 'REPEATS'], ascending=False, kind='stable')
+
+def main():
+    parser = argparse.ArgumentParser(description="Flag samples with outlying STR repeat expansions per locus.")
+    parser.add_argument("inputs", nargs='*', help="VCF files or folders of .vcf.gz files (subfolders included)")
+    parser.add_argument("--matrix-dir", default="repeat_matrix",
+                        help="Cached int16 repeat-count matrix (rebuilt when the inputs differ from the ones it was built from)")
+    parser.add_argument("--z-threshold", type=float, default=3.5, help="Minimum robust z-score")
+    parser.add_argument("--min-excess", type=int, default=2, help="Minimum repeat units above the locus median")
+    parser.add_argument("--output", default="repeat_outliers.txt", help="Outlier table")
+    parser.add_argument("--locus-stats", help="Optional per-locus statistics table")
+    args = parser.parse_args()
+
+    # Without inputs the cached matrix is used as it is
+    repeats_path = os.path.join(args.matrix_dir, "repeats.npy")
+    if args.inputs:
+        gz_files = gz_files_under(args.inputs)
+        if not gz_files:
+            parser.error("no .gz files found in the inputs")
+        fingerprint = matrix_fingerprint(gz_files, {'max_repeats': MAX_REPEATS})
+        if not cached_matrix_is_current(repeats_path, fingerprint):
+            if os.path.exists(repeats_path):
+                print(f"Repeat matrix in {args.matrix_dir} was built from other inputs, rebuilding it")
+            save_repeat_matrix(args.matrix_dir, *build_repeat_matrix(gz_files))
+            save_fingerprint(args.matrix_dir, fingerprint)
+    elif not os.path.exists(repeats_path):
+        parser.error("no cached matrix found; pass VCF files or folders to build it")
+    loci, repeats, samples = load_repeat_matrix(args.matrix_dir)
+
+    stats = locus_statistics(repeats)
+    if args.locus_stats:
+        pd.concat([loci, stats], axis=1).to_csv(args.locus_stats, sep='\t', index=False, float_format='%.6g')
+
+    outliers = find_outliers(loci, repeats, samples, stats, args.z_threshold, args.min_excess)
+    outliers.to_csv(args.output, sep='\t', index=False, float_format='%.6g')
+    print(f"{len(outliers)} outlying calls saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
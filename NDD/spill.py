@@ -0,0 +1,103 @@
+import os
+import re
+import shutil
+import tempfile
+import pandas as pd
+
+import profiling
+
+try:
+    import pyarrow  # noqa: F401 (pandas writes Feather through it)
+except ImportError:  # spill files are pickled without it
+    pyarrow = None
+
+# Suffixes accepted by parse_memory ('500M', '32G', ...)
+UNITS = {'': 1, 'K': 2 ** 10, 'M': 2 ** 20, 'G': 2 ** 30, 'T': 2 ** 40}
+
+def parse_memory(text):
+    """ '32G' / '500M' / '1.5g' / '1000000' -> bytes. """
+    match = re.fullmatch(r'\s*([\d.]+)\s*([KMGT]?)i?B?\s*', str(text), flags=re.IGNORECASE)
+    if match is None:
+        raise ValueError(f"Cannot parse memory size: {text}")
+    return int(float(match.group(1)) * UNITS[match.group(2).upper()])
+
+# Rows whose deep memory is measured to estimate the size of a whole parsed frame
+SAMPLE_ROWS = 1000
+
+def estimated_bytes(df, sample_rows=SAMPLE_ROWS):
+    """ Deep memory of the first sample_rows rows scaled to the frame; VCF fields vary little in length from row to row. """
+    if len(df) <= sample_rows:
+        return int(df.memory_usage(deep=True).sum())
+    return int(df.iloc[:sample_rows].memory_usage(deep=True).sum() * len(df) / sample_rows)
+
+def _write_block(part, path_prefix):
+    """ Writes one frame's rows of one chromosome as Feather (with pyarrow) or a pickle; returns the path. """
+    if pyarrow is not None:
+        path = path_prefix + ".feather"
+        part.reset_index(drop=True).to_feather(path)
+    else:
+        path = path_prefix + ".pkl"
+        part.to_pickle(path)
+    return path
+
+def _read_block(path):
+    return pd.read_feather(path) if path.endswith(".feather") else pd.read_pickle(path)
+
+class SpillStore:
+    """
+    Parsed per-file frames partitioned by chromosome. Frames stay in memory until together they
+    take more than memory_limit bytes (estimated_bytes); then every frame held is split by CHROM
+    and written to a temporary folder (Feather files with pyarrow, pickles without it, one file
+    per frame and chromosome), and memory starts again from zero. partition(chrom) returns one chromosome's pieces in the order the
+    frames were added, so per-chromosome merges match the merge of the whole cohort.
+    """
+
+    def __init__(self, memory_limit, spill_dir=None):
+        self.memory_limit = memory_limit
+        self.directory = tempfile.mkdtemp(prefix="ndd_spill_", dir=spill_dir)
+        self.held = []
+        self.held_bytes = 0
+        self.spilled = {}  # chrom -> [(frame number, path)]
+        self.chrom_ids = {}  # chrom -> number used in file names (chromosome names may not be valid file names)
+        self.n_frames = 0
+        self.n_spills = 0
+
+    def add(self, df):
+        self.held.append((self.n_frames, df))
+        self.n_frames += 1
+        self.held_bytes += estimated_bytes(df)
+        if self.held_bytes > self.memory_limit:
+            self.spill()
+
+    def spill(self):
+        """ Writes every frame held in memory to per-chromosome files and drops it. """
+        with profiling.stage('spill'):
+            for number, df in self.held:
+                for chrom, part in df.groupby('CHROM', sort=False):
+                    chrom_id = self.chrom_ids.setdefault(chrom, len(self.chrom_ids))
+                    path = _write_block(part, os.path.join(self.directory, f"{chrom_id}_{number}"))
+                    self.spilled.setdefault(chrom, []).append((number, path))
+            self.n_spills += 1
+        print(f"Spilled {len(self.held)} parsed files ({self.held_bytes / 2 ** 20:,.0f} MB) to {self.directory}")
+        self.held = []
+        self.held_bytes = 0
+
+    def __len__(self):
+        return self.n_frames
+
+    def chromosomes(self):
+        chroms = set(self.spilled)
+        for _, df in self.held:
+            chroms.update(df['CHROM'].unique())
+        return chroms
+
+    def partition(self, chrom):
+        """ Rows of one chromosome from every frame (disk and memory), one piece per frame, in add order. """
+        pieces = [(number, _read_block(path)) for number, path in self.spilled.get(chrom, [])]
+        pieces += [(number, df[df['CHROM'] == chrom]) for number, df in self.held]
+        return [piece for _, piece in sorted(pieces, key=lambda item: item[0]) if len(piece)]
+
+    def close(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.held = []
+        self.spilled = {}
@@ -0,0 +1,130 @@
+import os
+from bisect import bisect_right
+
+from region_index import parse_region
+
+def _alias(chrom):
+    """ The same chromosome with the 'chr' prefix toggled, so 'chr1' regions match '1' records and back. """
+    return chrom[3:] if chrom.startswith('chr') else 'chr' + chrom
+
+def read_regions(items):
+    """
+    Regions from BED files (0-based starts) and/or 'chr1:1,000-2,000' strings, merged per chromosome.
+    Returns {chrom as bytes: (starts, ends)} with 1-based inclusive bounds, under both chromosome spellings.
+    """
+    intervals = {}
+    for item in items:
+        if os.path.isfile(item):
+            with open(item) as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) < 3 or parts[0].startswith(('#', 'track', 'browser')):
+                        continue
+                    intervals.setdefault(parts[0], []).append((int(parts[1]) + 1, int(parts[2])))
+        else:
+            chrom, start, end = parse_region(item)
+            intervals.setdefault(chrom, []).append((start, end))
+
+    regions = {}
+    for chrom, spans in intervals.items():
+        starts, ends = [], []
+        for start, end in sorted(spans):
+            if ends and start <= ends[-1] + 1:
+                ends[-1] = max(ends[-1], end)
+            else:
+                starts.append(start)
+                ends.append(end)
+        regions[chrom.encode()] = (starts, ends)
+    for chrom in list(intervals):
+        regions.setdefault(_alias(chrom).encode(), regions[chrom.encode()])
+    return regions
+
+def read_samples(items):
+    """ Sample names given directly and/or as files with the name in the first column (affected.txt works). """
+    samples = set()
+    for item in items:
+        if os.path.isfile(item):
+            with open(item) as f:
+                samples.update(line.split()[0] for line in f if line.strip())
+        else:
+            samples.add(item)
+    return samples
+
+def _info_value(info, key):
+    """ Raw value of key=value in a bytes INFO field, or None. """
+    if info.startswith(key + b'='):
+        start = len(key) + 1
+    else:
+        start = info.find(b';' + key + b'=')
+        if start < 0:
+            return None
+        start += len(key) + 2
+    end = info.find(b';', start)
+    return info[start:] if end < 0 else info[start:end]
+
+class RecordFilter:
+    """
+    Record and sample selection applied while reading a VCF, on the raw bytes of a line split
+    only up to the sample columns, so rejected records never become Python strings or dicts.
+    Records are kept when their POS falls in a region, FILTER is PASS, QUAL >= min_qual and the
+    RU length is within bounds; each unset criterion keeps everything.
+    """
+
+    def __init__(self, regions=None, pass_only=False, min_qual=None, min_ru_length=None,
+                 max_ru_length=None, samples=None):
+        self.regions = read_regions(regions) if regions else None
+        self.pass_only = pass_only
+        self.min_qual = min_qual
+        self.min_ru_length = min_ru_length
+        self.max_ru_length = max_ru_length
+        self.samples = read_samples(samples) if samples else None
+
+    @property
+    def active(self):
+        return (self.regions is not None or self.pass_only or self.min_qual is not None
+                or self.min_ru_length is not None or self.max_ru_length is not None or self.samples is not None)
+
+    def sample_indices(self, sample_names):
+        """ Positions of the wanted samples among a VCF's sample columns; None keeps all of them. """
+        if self.samples is None:
+            return None
+        return [i for i, name in enumerate(sample_names) if name in self.samples]
+
+    def accept(self, fields):
+        """ fields: a data line as bytes split on tabs (at least up to INFO). Cheapest tests first. """
+        if self.regions is not None:
+            spans = self.regions.get(fields[0])
+            if spans is None:
+                return False
+            pos = int(fields[1])
+            i = bisect_right(spans[0], pos) - 1
+            if i < 0 or pos > spans[1][i]:
+                return False
+        if self.pass_only and fields[6] != b'PASS':
+            return False
+        if self.min_qual is not None and (fields[5] == b'.' or float(fields[5]) < self.min_qual):
+            return False
+        if self.min_ru_length is not None or self.max_ru_length is not None:
+            repeat_unit = _info_value(fields[7], b'RU')
+            if repeat_unit is None:
+                return False
+            if self.min_ru_length is not None and len(repeat_unit) < self.min_ru_length:
+                return False
+            if self.max_ru_length is not None and len(repeat_unit) > self.max_ru_length:
+                return False
+        return True
+
+def add_filter_arguments(parser):
+    """ The record/sample filter options shared by the VCF parsing scripts. """
+    parser.add_argument("--regions", nargs='+', help="BED files and/or chr:start-end regions; only records whose POS falls inside are parsed")
+    parser.add_argument("--pass-only", action='store_true', help="Only parse records with FILTER=PASS")
+    parser.add_argument("--min-qual", type=float, help="Only parse records with QUAL >= this value ('.' fails)")
+    parser.add_argument("--min-ru-length", type=int, help="Shortest repeat unit (bp) to parse")
+    parser.add_argument("--max-ru-length", type=int, help="Longest repeat unit (bp) to parse")
+    parser.add_argument("--samples", nargs='+', help="Sample names and/or files listing them; other samples are skipped")
+
+def filter_from_args(args):
+    """ RecordFilter from add_filter_arguments options, or None when no filter was asked for. """
+    record_filter = RecordFilter(args.regions, args.pass_only, args.min_qual, args.min_ru_length,
+                                 args.max_ru_length, args.samples)
+    return record_filter if record_filter.active else None
@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+from pandas.api.types import infer_dtype
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet output is optional
+    pa = pq = None
+
+from region_index import BLOCK_ROWS, RegionIndexer, coordinate_columns
+
+# Rows formatted and written per chunk
+CHUNK_ROWS = 100_000
+
+def _column_text(column):
+    """
+    One column of a chunk as a list of str. Integers go through tolist() and str() in C instead of
+    pandas' per-cell formatter, string columns are used as they are and missing values become ''.
+    """
+    values = column.to_numpy()
+    if values.dtype.kind in 'iu':
+        return list(map(str, values.tolist()))
+    if column.isna().any():
+        column = column.astype(object).where(column.notna(), '')
+    values = column.to_numpy(dtype=object)
+    if infer_dtype(values, skipna=False) == 'string':
+        return values.tolist()
+    return list(map(str, values.tolist()))
+
+def _tsv_lines(columns):
+    """ Tab-joined lines of already formatted columns. """
+    return '\n'.join(map('\t'.join, zip(*columns))) + '\n'
+
+def _byte_lengths(lines, encoding):
+    """ Encoded length of every line plus its newline; ASCII lines are not encoded to find it. """
+    if all(map(str.isascii, lines)):
+        return np.fromiter(map(len, lines), dtype=np.int64, count=len(lines)) + 1
+    return np.array([len(line.encode(encoding)) + 1 for line in lines], dtype=np.int64)
+
+def _index_lines(indexer, chunk, lines, encoding):
+    """ Feeds the coordinates and byte lengths of a written chunk to a RegionIndexer. """
+    chrom_i, start_i, end_i = coordinate_columns(list(chunk.columns))
+    starts = pd.to_numeric(chunk.iloc[:, start_i]).to_numpy(dtype=np.int64)
+    # Non-numeric ends count as the start, as in write_region_index
+    ends = pd.to_numeric(chunk.iloc[:, end_i], errors='coerce').to_numpy(dtype=np.float64)
+    ends = np.where(np.isnan(ends), starts, ends).astype(np.int64)
+    indexer.add(chunk.iloc[:, chrom_i].astype(str).to_numpy(dtype=object), starts, ends, _byte_lengths(lines, encoding))
+
+def _bed_lines(chunk):
+    """ 0-based BED lines (CHROM, POS-1, END, VAR_ID) of a chunk of a merged table. """
+    starts = pd.to_numeric(chunk['POS']).to_numpy(dtype=np.int64) - 1
+    ends = pd.to_numeric(chunk['END']).to_numpy(dtype=np.int64)
+    return _tsv_lines([_column_text(chunk['CHROM']), list(map(str, starts.tolist())),
+                       list(map(str, ends.tolist())), _column_text(chunk['VAR_ID'])])
+
+def write_merged(df, tsv_path, bed_path=None, parquet_path=None, chunk_rows=CHUNK_ROWS, region_index=False):
+    """
+    Writes a merged table as TSV (the same text as to_csv(sep='\t', index=False) for tab- and
+    quote-free values), and in the same pass over row chunks an optional headerless 0-based BED
+    (CHROM, POS-1, END, VAR_ID) and an optional Parquet file. With region_index the TSV's .ridx
+    block index (region_index.py) is built from the byte offsets of the written lines.
+    Returns the number of rows written.
+    """
+    return write_merged_chunks([df], tsv_path, bed_path, parquet_path, chunk_rows, region_index)
+
+def write_merged_chunks(frames, tsv_path, bed_path=None, parquet_path=None, chunk_rows=CHUNK_ROWS,
+                        region_index=False, block_rows=BLOCK_ROWS):
+    """
+    write_merged for a table that arrives as consecutive frames with the same columns (e.g. one
+    per chromosome), each consumed and written before the next is requested.
+    """
+    if parquet_path is not None and pq is None:
+        raise ImportError("Parquet output needs pyarrow (pip install pyarrow)")
+
+    bed = open(bed_path, 'w') if bed_path is not None else None
+    parquet = None
+    indexer = None
+    n_rows = 0
+    empty = None
+    try:
+        with open(tsv_path, 'w') as tsv:
+            for df in frames:
+                if empty is None:
+                    header = '\t'.join(map(str, df.columns))
+                    tsv.write(header + '\n')
+                    empty = df.iloc[:0]
+                    if region_index:
+                        indexer = RegionIndexer(int(_byte_lengths([header], tsv.encoding)[0]), block_rows)
+                for start in range(0, len(df), chunk_rows):
+                    chunk = df.iloc[start:start + chunk_rows]
+                    lines = list(map('\t'.join, zip(*[_column_text(chunk.iloc[:, i]) for i in range(chunk.shape[1])])))
+                    tsv.write('\n'.join(lines) + '\n')
+                    if indexer is not None:
+                        _index_lines(indexer, chunk, lines, tsv.encoding)
+                    if bed is not None:
+                        bed.write(_bed_lines(chunk))
+                    if parquet_path is not None:
+                        table = pa.Table.from_pandas(chunk, preserve_index=False)
+                        if parquet is None:
+                            parquet = pq.ParquetWriter(parquet_path, table.schema)
+                        parquet.write_table(table.cast(parquet.schema))
+                n_rows += len(df)
+        if parquet_path is not None and parquet is None and empty is not None:
+            pq.write_table(pa.Table.from_pandas(empty, preserve_index=False), parquet_path)
+        if indexer is not None:
+            indexer.save(tsv_path)
+    finally:
+        if bed is not None:
+            bed.close()
+        if parquet is not None:
+            parquet.close()
+    return n_rows
@@ -1,40 +1,63 @@
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 import sys
 import gzip
+from array import array
 
-# Get file paths from command line arguments
-vcf_file = sys.argv[1]
-bed_file = sys.argv[2]
+# Variants and BED regions are aggregated into windows of this many bp before plotting
+WINDOW_SIZE = 100000
 
 def parse_vcf(file_path):
-    """Parse a VCF file and extract chromosome, position, and ADSP fields."""
-    data = []
+    """
+    Stream a VCF file and extract chromosome, position, and ADSP fields into typed arrays.
+    The ADSP index is looked up once per distinct FORMAT string instead of on every line.
+    """
+    chrom_codes = {}
+    codes = array('H')
+    positions = array('q')
+    adsp_values = array('q')
+    adsp_index_by_format = {}
     try:
         with gzip.open(file_path, 'rt') as file:
             for line in file:
                 if line.startswith("#"):
                     continue
-                columns = line.strip().split("\t")
+                # Only the first sample is used, so leave the remaining columns unsplit
+                columns = line.rstrip("\n").split("\t", 10)
                 if len(columns) <= 9:
                     print(f"Malformed line skipped: {line.strip()}")
                     continue
-                chrom, pos, info = columns[0], int(columns[1]), columns[7]
-                format_fields = columns[8].split(":")
-                sample_fields = columns[9].split(":")
-                
+                chrom, pos = columns[0], int(columns[1])
+
+                adsp_index = adsp_index_by_format.get(columns[8])
+                if adsp_index is None:
+                    format_fields = columns[8].split(":")
+                    adsp_index = format_fields.index("ADSP") if "ADSP" in format_fields else -1
+                    adsp_index_by_format[columns[8]] = adsp_index
+
                 adsp = 0  # Default value if ADSP is not present
-                if "ADSP" in format_fields:
-                    adsp_index = format_fields.index("ADSP")
+                if adsp_index >= 0:
                     try:
-                        adsp = int(sample_fields[adsp_index].split("/")[0])
+                        adsp = int(columns[9].split(":")[adsp_index].split("/")[0])
                     except (ValueError, IndexError):
                         print(f"Invalid ADSP value at position {pos} in {chrom}")
 
-                data.append((chrom, pos, adsp))
+                code = chrom_codes.get(chrom)
+                if code is None:
+                    code = chrom_codes[chrom] = len(chrom_codes)
+                codes.append(code)
+                positions.append(pos)
+                adsp_values.append(adsp)
     except Exception as e:
         print(f"Error reading VCF file: {e}")
-    return pd.DataFrame(data, columns=["chrom", "pos", "adsp"])
+
+    return pd.DataFrame({
+        "chrom": pd.Categorical.from_codes(np.frombuffer(codes, dtype=np.uint16).astype(np.int32),
+                                           categories=list(chrom_codes)),
+        "pos": np.frombuffer(positions, dtype=np.int64),
+        "adsp": np.frombuffer(adsp_values, dtype=np.int64),
+    })
 
 def parse_bed(file_path):
     """Parse a BED file and extract chromosome, start, and end positions."""
@@ -44,53 +67,84 @@ def parse_bed(file_path):
         print(f"Error reading BED file: {e}")
         return pd.DataFrame(columns=["chrom", "start", "end"])
 
-# Parse the input files
-vcf_data = parse_vcf(vcf_file)
-bed_data = parse_bed(bed_file)
-
-# Group data by chromosome for faster access
-vcf_grouped = vcf_data.groupby("chrom")
-bed_grouped = bed_data.groupby("chrom")
-
-# Prepare the figure
-fig, axes = plt.subplots(24, 1, figsize=(10, 40), sharex=True)
-
-for idx, ax in enumerate(axes):
-    # Define chromosome label
-    if idx < 22:
-        label = str(idx + 1)
-    elif idx == 22:
-        label = "X"
-    else:
-        label = "Y"
-
-    chrom = f"chr{label}"
-
-    # Get VCF and BED subsets for the current chromosome
-    vcf_subset = vcf_grouped.get_group(chrom) if chrom in vcf_grouped.groups else pd.DataFrame(columns=["pos", "adsp"])
-    bed_subset = bed_grouped.get_group(chrom) if chrom in bed_grouped.groups else pd.DataFrame(columns=["start", "end"])
-
-    # Plot VCF data (red bars)
-    if not vcf_subset.empty:
-        ax.bar(vcf_subset["pos"], vcf_subset["adsp"], color="red", label="VCF Source")
-
-    # Plot BED data (blue bars)
-    if not bed_subset.empty:
-        midpoints = (bed_subset["start"] + bed_subset["end"]) / 2
-        ax.bar(midpoints, -1, color="blue", label="BED Source")
-
-    # Add a horizontal reference line at y=0
-    ax.axhline(0, color="black", linestyle="--", linewidth=0.5)
-
-    # Set subplot title
-    ax.set_title(f"Chromosome {label}", fontsize=10)
-
-    # Avoid repeating labels in the legend
-    if idx == 0:
-        ax.legend()
-
-# Add common labels and adjust layout
-plt.xlabel("Position on Chromosome", fontsize=14)
-plt.tight_layout()
-plt.savefig("chromosome_bar_plot.png", dpi=300)
-plt.show()
+def bin_vcf(vcf_data, window_size=WINDOW_SIZE):
+    """Highest ADSP value per chromosome window, as (chrom, window_start, adsp) rows."""
+    windows = vcf_data["pos"] // window_size * window_size
+    binned = vcf_data.groupby([vcf_data["chrom"].astype(str), windows], sort=False)["adsp"].max()
+    return binned.rename_axis(["chrom", "window_start"]).reset_index()
+
+def bin_bed(bed_data, window_size=WINDOW_SIZE):
+    """Distinct (chrom, window_start) windows containing a BED region midpoint."""
+    midpoints = (bed_data["start"] + bed_data["end"]) // 2
+    binned = pd.DataFrame({"chrom": bed_data["chrom"].astype(str),
+                           "window_start": midpoints // window_size * window_size})
+    return binned.drop_duplicates()
+
+def plot_chromosomes(vcf_bins, bed_bins, window_size=WINDOW_SIZE, output_file="chromosome_bar_plot.png"):
+    """Draw one subplot per chromosome with one bar per window instead of one per variant."""
+    # Group data by chromosome for faster access
+    vcf_grouped = vcf_bins.groupby("chrom")
+    bed_grouped = bed_bins.groupby("chrom")
+
+    # Prepare the figure
+    fig, axes = plt.subplots(24, 1, figsize=(10, 40), sharex=True)
+
+    for idx, ax in enumerate(axes):
+        # Define chromosome label
+        if idx < 22:
+            label = str(idx + 1)
+        elif idx == 22:
+            label = "X"
+        else:
+            label = "Y"
+
+        chrom = f"chr{label}"
+
+        # Get VCF and BED windows for the current chromosome
+        vcf_subset = vcf_grouped.get_group(chrom) if chrom in vcf_grouped.groups else pd.DataFrame(columns=["window_start", "adsp"])
+        bed_subset = bed_grouped.get_group(chrom) if chrom in bed_grouped.groups else pd.DataFrame(columns=["window_start"])
+
+        # Plot VCF data (red bars)
+        if not vcf_subset.empty:
+            ax.bar(vcf_subset["window_start"] + window_size / 2, vcf_subset["adsp"],
+                   width=window_size, color="red", label="VCF Source")
+
+        # Plot BED data (blue bars)
+        if not bed_subset.empty:
+            ax.bar(bed_subset["window_start"] + window_size / 2, -1,
+                   width=window_size, color="blue", label="BED Source")
+
+        # Add a horizontal reference line at y=0
+        ax.axhline(0, color="black", linestyle="--", linewidth=0.5)
+
+        # Set subplot title
+        ax.set_title(f"Chromosome {label}", fontsize=10)
+
+        # Avoid repeating labels in the legend
+        if idx == 0:
+            ax.legend()
+
+    # Add common labels and adjust layout
+    plt.xlabel("Position on Chromosome", fontsize=14)
+    plt.tight_layout()
+    plt.savefig(output_file, dpi=300)
+    plt.show()
+
+def main():
+    if len(sys.argv) < 3:
+        print("Usage: python 24chr_plot.py <file.vcf.gz> <regions.bed> [window_size]")
+        sys.exit(1)
+
+    # Get file paths from command line arguments
+    vcf_file = sys.argv[1]
+    bed_file = sys.argv[2]
+    window_size = int(sys.argv[3]) if len(sys.argv) > 3 else WINDOW_SIZE
+
+    # Parse the input files and aggregate them per chromosome window
+    vcf_bins = bin_vcf(parse_vcf(vcf_file), window_size)
+    bed_bins = bin_bed(parse_bed(bed_file), window_size)
+
+    plot_chromosomes(vcf_bins, bed_bins, window_size)
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,20 @@
 import os
 import sys
 import gzip
+import numpy as np
 import pandas as pd
 
-def process_vcf_files(file_paths, output_file, output_dir='./output'):
+# The NDD modules (genotype decoding, ...) live two folders up
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'NDD'))
+from genotypes import alt_allele_counts, decompose_alts
+from prefetch import prefetch_files
+from writers import write_merged
+
+def process_vcf_files(file_paths, output_file, output_dir='./output', bed_file=None):
     """
-    Process VCF files, split multiallelic records, and create a consolidated DataFrame
+    Process VCF files, split multiallelic records, and create a consolidated DataFrame.
+    With bed_file, the 0-based BED (CHROM, POS-1, END, VAR_ID) that txt_to_bed.py used to make
+    from the .txt is written in the same pass
     """
     dataframes = []
     all_sample_names = set()
@@ -16,9 +25,10 @@ def process_vcf_files(file_paths, output_file, output_dir='./output'):
         else:
             gz_files = [file] if file.endswith('.gz') else []
 
-        for gz_file in gz_files:
+        # The next files are read and decompressed in background threads while this one is parsed
+        for gz_file, lines in prefetch_files(gz_files):
             print(f"Processing file: {gz_file}")
-            df, sample_names = _process_single_vcf(gz_file)
+            df, sample_names = _process_single_vcf(gz_file, lines)
             dataframes.append(df)
             all_sample_names.update(sample_names)
 
@@ -33,11 +43,8 @@ def process_vcf_files(file_paths, output_file, output_dir='./output'):
 
     merged_df = merged_df.fillna(".")
 
-    # Count alternate alleles
-    def count_ones(row):
-        return sum((genotype.count('1')) + (genotype.count('2')) for genotype in row[7:])
-
-    merged_df['AC'] = merged_df.apply(count_ones, axis=1)
+    # Count alternate alleles, decoding each distinct genotype string once
+    merged_df['AC'] = alt_allele_counts(merged_df.iloc[:, 7:].to_numpy())
 
     # Sort and prepare output
     #merged_df['POS'] = merged_df['POS'].astype(int)
@@ -67,97 +74,80 @@ def process_vcf_files(file_paths, output_file, output_dir='./output'):
     # Create output directory if not exists
     os.makedirs(output_dir, exist_ok=True)
     output_path = os.path.join(output_dir, output_file)
-    merged_df.to_csv(output_path, sep='\t', index=False)
+    write_merged(merged_df, output_path, bed_file)
     print(f"Merged DataFrame saved to {output_path}")
+    if bed_file is not None:
+        print(f"BED saved to {bed_file}")
     _check_tab_separated_columns(output_path)
 
-def _process_single_vcf(input_file):
+def _process_single_vcf(input_file, lines=None):
     """
-    Process a single VCF file and return a DataFrame with split records
+    Process a single VCF file and return a DataFrame with split records: one row per ALT allele
+    carried by at least one sample, with '1' for its carriers and '.' for everybody else.
+    lines: the file's lines as bytes when they are already being read (prefetch.prefetch_files)
     """
-    open_func = gzip.open if input_file.endswith(".gz") else open
-
-    records = []
+    if lines is None:
+        open_func = gzip.open if input_file.endswith(".gz") else open
+        with open_func(input_file, 'rb') as f:
+            return _process_single_vcf(input_file, f)
+
+    loci = []
+    alt_repeats = []
+    genotypes = []
     columns = None
     sample_names = []
 
-    with open_func(input_file, 'rt') as f:
-        for line in f:
-            if line.startswith("#"):
-                if not line.startswith("##") and columns is None:
-                    columns = line.strip().split('\t')
-                    if columns[0].startswith('#'):
-                        columns[0] = 'CHROM'
-                    sample_names = columns[9:]
-                continue
-
-            fields = line.strip().split('\t')
-            
-            # Parse VCF record
-            chrom = fields[0]
-            pos = int(fields[1])
-            ref = fields[3]
-            alt = fields[4]
-            info = fields[7]
-            sample_data = fields[9:]
-
-            # Extract key information from INFO field
-            info_dict = dict(item.split('=') for item in info.split(';') if '=' in item)
-
-            repeat_unit = info_dict.get('RU', '')
-            ref_repeats = int(info_dict.get('REF', 1))
-
-            # Extract and parse ALT field 
-            alt_alleles = [allele.strip('<>').replace('STR', '') for allele in alt.split(',') if allele.startswith('<STR')]
-            
-            # Map allele indexes to repeat counts
-            allele_repeat_counts = {str(i + 1): int(repeat_count) for i, repeat_count in enumerate(alt_alleles)} if alt_alleles else {}
-
-            # Process samples
-            sample_variants = {name: '.' for name in sample_names}
-
-            for sample_idx, sample_gt in enumerate(sample_data):
-                genotype = sample_gt.split(':')[0]
-
-                # Skip records with no variation or homozygous reference
-                if genotype in {"./.", "0/0"}:
-                    continue
-
-                if not repeat_unit:
-                    continue
-
-                repeat_unit_length = len(repeat_unit)
-
-                # Process each allele in the genotype
-                alleles = genotype.split('/')
-                unique_alleles = set(alleles) - {"0"}  # Exclude reference allele
-
-                for allele in unique_alleles:
-                    if allele.isdigit() and (not allele_repeat_counts or allele in allele_repeat_counts):
-                        alt_repeats = allele_repeat_counts.get(allele, ref_repeats)
-                        total_repeat_length = repeat_unit_length * alt_repeats
-                        end_pos = pos + total_repeat_length
-
-                        record = {
-                            'CHROM': chrom,
-                            'POS': pos,
-                            'REF': ref,
-                            'ALT': f'STR{alt_repeats}',
-                            'END': end_pos,
-                            'REP_UNIT': repeat_unit,
-                            'VAR_ID': info_dict.get('VARID', '.')
-                        }
-                        # Update sample variant column
-                        sample_name = sample_names[sample_idx]
-                        sample_variants[sample_name] = '1'
-                        
-                        # Add sample variants to the record
-                        record.update(sample_variants)
-                        
-                        records.append(record)
-
-    df = pd.DataFrame(records)
-    return df, sample_names
+    for line in lines:
+        line = line.decode()
+        if line.startswith("#"):
+            if not line.startswith("##") and columns is None:
+                columns = line.strip().split('\t')
+                if columns[0].startswith('#'):
+                    columns[0] = 'CHROM'
+                sample_names = columns[9:]
+            continue
+
+        fields = line.strip().split('\t')
+        
+        # Parse VCF record
+        chrom = fields[0]
+        pos = int(fields[1])
+        ref = fields[3]
+        alt = fields[4]
+        info = fields[7]
+        sample_data = fields[9:]
+
+        # Extract key information from INFO field
+        info_dict = dict(item.split('=') for item in info.split(';') if '=' in item)
+
+        repeat_unit = info_dict.get('RU', '')
+        ref_repeats = int(info_dict.get('REF', 1))
+        if not repeat_unit:
+            continue
+
+        # Extract and parse ALT field; without STR alleles the first ALT is reported at the reference length
+        alt_alleles = [allele.strip('<>').replace('STR', '') for allele in alt.split(',') if allele.startswith('<STR')]
+
+        loci.append((chrom, pos, ref, repeat_unit, info_dict.get('VARID', '.')))
+        alt_repeats.append([int(repeat_count) for repeat_count in alt_alleles] or [ref_repeats])
+        genotypes.extend(sample_gt.split(':', 1)[0] for sample_gt in sample_data)
+
+    columns = ['CHROM', 'POS', 'REF', 'ALT', 'END', 'REP_UNIT', 'VAR_ID'] + sample_names
+    if not loci:
+        return pd.DataFrame(columns=columns), sample_names
+
+    # Copies of every ALT in every sample, compared for all records at once; each row has its own carriers
+    record_rows, _, dosages = decompose_alts(
+        np.asarray(genotypes, dtype=object).reshape(len(loci), len(sample_names)),
+        [len(repeats) for repeats in alt_repeats])
+    repeats = np.concatenate([np.asarray(r, dtype=np.int64) for r in alt_repeats])
+    carried = (dosages > 0).any(axis=1)
+
+    df = pd.DataFrame(loci, columns=['CHROM', 'POS', 'REF', 'REP_UNIT', 'VAR_ID']).iloc[record_rows[carried]].reset_index(drop=True)
+    df['ALT'] = [f'STR{r}' for r in repeats[carried]]
+    df['END'] = df['POS'] + df['REP_UNIT'].str.len() * repeats[carried]
+    df[sample_names] = np.where(dosages[carried] > 0, '1', '.').astype(object)
+    return df[columns], sample_names
 
 def _check_tab_separated_columns(file_path):
     """
@@ -172,23 +162,31 @@ def _check_tab_separated_columns(file_path):
         print("Warning: Column names are NOT tab-separated.")
 
 def main():
-    if len(sys.argv) < 4 or sys.argv[1] not in ['--files', '--folder']:
-        print("Usage: python script.py --files <file1.gz file2.gz ...> --output <output_file>")
-        print("Or: python script.py --folder <folder_name> --output <output_file>")
+    # Optional '--bed <bed_file>' anywhere on the command line; taken out before the other arguments are read
+    argv = list(sys.argv)
+    bed_file = None
+    if '--bed' in argv:
+        i = argv.index('--bed')
+        bed_file = argv[i + 1]
+        del argv[i:i + 2]
+
+    if len(argv) < 4 or argv[1] not in ['--files', '--folder']:
+        print("Usage: python script.py --files <file1.gz file2.gz ...> --output <output_file> [--bed <bed_file>]")
+        print("Or: python script.py --folder <folder_name> --output <output_file> [--bed <bed_file>]")
         sys.exit(1)
 
-    if sys.argv[1] == '--files':
-        files = sys.argv[2:-2]
-    elif sys.argv[1] == '--folder':
-        folder = sys.argv[2]
+    if argv[1] == '--files':
+        files = argv[2:-2]
+    elif argv[1] == '--folder':
+        folder = argv[2]
         files = [folder]
 
-    if '--output' in sys.argv:
-        output_file = sys.argv[sys.argv.index('--output') + 1]
+    if '--output' in argv:
+        output_file = argv[argv.index('--output') + 1]
     else:
         output_file = 'merged_output.txt'
 
-    process_vcf_files(files, output_file)
+    process_vcf_files(files, output_file, bed_file=bed_file)
 
 if __name__ == "__main__":
     main()
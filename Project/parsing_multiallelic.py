@@ -2,9 +2,66 @@ import os
 import sys
 import pandas as pd
 import gzip
+import argparse
 import subprocess
 
-def process_vcf_files(file_paths, output_file, output_dir='./output'):
+# The NDD modules (record filters, ...) live next to this folder
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'NDD'))
+from genotypes import alt_allele_counts
+from prefetch import prefetch_files
+from checkpoint import RunCheckpoint
+from vcf_filters import add_filter_arguments, filter_from_args
+
+# VCF columns this script never outputs; they are not kept past the line split
+DROPPED_COLUMNS = {'ID', 'QUAL', 'FILTER', 'FORMAT'}
+
+def _parse_file(lines, record_filter=None):
+    """ The filtered DataFrame of one VCF's lines (as bytes), or None if it has no records. """
+    vcf_data = []
+    columns = []
+    keep = []
+
+    for line in lines:
+        if line.startswith(b"#"):
+            if not line.startswith(b"##"):  # Header line
+                columns = line.decode().strip().split('\t')
+                if columns[0].startswith('#'):
+                    columns[0] = 'CHROM'
+                keep = [i for i, column in enumerate(columns[:9]) if column not in DROPPED_COLUMNS]
+                sample_indices = record_filter.sample_indices(columns[9:]) if record_filter is not None else None
+                if sample_indices is None:
+                    sample_indices = range(len(columns) - 9)
+                keep += [9 + i for i in sample_indices]
+                columns = [columns[i] for i in keep]
+                if len(sample_indices) == 0:
+                    break
+        else:
+            fields = line.strip().split(b'\t')
+            if record_filter is not None and not record_filter.accept(fields):
+                continue
+            vcf_data.append([fields[i].decode() for i in keep])
+
+    vcf_df = pd.DataFrame(vcf_data, columns=columns)
+    if vcf_df.empty:
+        return None
+    filtered_df = vcf_df
+    last_column = columns[-1]
+
+    # Extract 'REP UNIT' and 'VAR ID' from the 'INFO' column
+    filtered_df[['REP_UNIT', 'VAR_ID']] = filtered_df['INFO'].str.extract(r'RU=(.*?);VARID=(.*);')
+    filtered_df = filtered_df.drop(columns=['INFO'], errors='ignore')
+
+    filtered_df[last_column] = filtered_df[last_column].str.split(':').str[0]
+    cols = list(filtered_df.columns)
+    cols.remove(last_column)
+    cols.append(last_column)
+    return filtered_df[cols]
+
+def process_vcf_files(file_paths, output_file, output_dir='./output', record_filter=None, checkpoint=None):
+    """
+    record_filter (NDD/vcf_filters.RecordFilter) rejects records and samples from the raw bytes of each line.
+    checkpoint (NDD/checkpoint.RunCheckpoint): files it already parsed are loaded from it, the others saved to it.
+    """
     dataframes = []  # List to hold all filtered DataFrames
 
     for file in file_paths:
@@ -14,58 +71,50 @@ def process_vcf_files(file_paths, output_file, output_dir='./output'):
         else:
             gz_files = [file] if file.endswith('.gz') else []
 
-        for gz_file in gz_files:
-            print(f"Processing file: {gz_file}")
-
-            vcf_data = []
-            columns = []
-
-            with gzip.open(gz_file, 'rt') as f:
-                for line in f:
-                    if line.startswith("#"):
-                        if not line.startswith("##"):  # Header line
-                            columns = line.strip().split('\t')
-                            if columns[0].startswith('#'):
-                                columns[0] = 'CHROM'
+        # The next files are read and decompressed in background threads while this one is parsed
+        saved = {f for f in gz_files if checkpoint is not None and checkpoint.is_parsed(f)}
+        prefetched = prefetch_files([f for f in gz_files if f not in saved])
+        try:
+            for gz_file in gz_files:
+                # Saved as (filtered_df,) so that a file without records is not mistaken for a missing entry
+                result = checkpoint.load(gz_file) if gz_file in saved else None
+                if result is not None:
+                    print(f"Loaded parsed file from checkpoint: {gz_file}")
+                else:
+                    print(f"Processing file: {gz_file}")
+                    if gz_file in saved:  # damaged checkpoint entry, parsed again without prefetching
+                        with gzip.open(gz_file, 'rb') as f:
+                            result = (_parse_file(f, record_filter),)
                     else:
-                        vcf_data.append(line.strip().split('\t'))
-
-            vcf_df = pd.DataFrame(vcf_data, columns=columns)
-            filtered_df = vcf_df.drop(columns=['ID', 'QUAL', 'FILTER', 'FORMAT'], errors='ignore')
+                        result = (_parse_file(next(prefetched)[1], record_filter),)
+                    if checkpoint is not None:
+                        checkpoint.save(gz_file, result)
 
-            # Extract 'REP UNIT' and 'VAR ID' from the 'INFO' column
-            filtered_df[['REP_UNIT', 'VAR_ID']] = filtered_df['INFO'].str.extract(r'RU=(.*?);VARID=(.*);')
-            filtered_df = filtered_df.drop(columns=['INFO'], errors='ignore')
+                filtered_df, = result
+                if filtered_df is not None:
+                    dataframes.append(filtered_df)
+        finally:
+            prefetched.close()
 
-            last_column = vcf_df.columns[-1]
-            filtered_df[last_column] = filtered_df[last_column].str.split(':').str[0]
-            cols = list(filtered_df.columns)
-            cols.remove(last_column)
-            cols.append(last_column)
-            filtered_df = filtered_df[cols]
+    if not dataframes:
+        print("No records left to merge (no .gz files, or every record was filtered out); nothing written.")
+        return None
 
-            dataframes.append(filtered_df)
+    merged_df = dataframes[0]
+    for df in dataframes[1:]:
+        merged_df = pd.merge(merged_df, df, how='outer', on=list(merged_df.columns.intersection(df.columns)))
 
-    if dataframes:
-        merged_df = dataframes[0]
-        for df in dataframes[1:]:
-            merged_df = pd.merge(merged_df, df, how='outer', on=list(merged_df.columns.intersection(df.columns)))
+    merged_df = merged_df.fillna(".")
 
-        merged_df = merged_df.fillna(".")
+    # Count the non-reference alleles in the genotypes from the 7th column onward (any allele index,
+    # phased or haploid), decoding each distinct genotype string once
+    merged_df['AC'] = alt_allele_counts(merged_df.iloc[:, 6:].to_numpy())
 
-        # Define a function to count occurrences of '1' in the genotypes from the 8th column onward
-        def count_ones(row):
-            # Count occurrences of '1' in each row starting from the 8th column
-            return sum((genotype.count('1'))+(genotype.count('2')) for genotype in row[6:])
-
-        # Apply the function to calculate allele counts and store them in the 'AC' column
-        merged_df['AC'] = merged_df.apply(count_ones, axis=1)
-
-        cols = list(merged_df.columns)
-        if 'AC' in cols:
-            cols.remove('AC')
-        cols.insert(6, 'AC')
-        merged_df = merged_df[cols]
+    cols = list(merged_df.columns)
+    if 'AC' in cols:
+        cols.remove('AC')
+    cols.insert(6, 'AC')
+    merged_df = merged_df[cols]
 
     output_txt_path = os.path.join(output_dir, output_file)
     merged_df.to_csv(output_txt_path, sep='\t', index=False)
@@ -83,26 +132,35 @@ def check_tab_separated_columns(file_path):
         print("Warning: Column names are NOT tab-separated.")
 
 def main():
-    if len(sys.argv) < 4 or sys.argv[1] not in ['--files', '--folder']:
-        print("Usage: python my_script.py --files <file1.gz file2.gz ...> --output <output_file>")
-        print("Or: python my_script.py --folder <folder_name> --output <output_file>")
-        sys.exit(1)
-
-    if sys.argv[1] == '--files':
-        files = sys.argv[2:-2]
-    elif sys.argv[1] == '--folder':
-        folder = sys.argv[2]
-        files = [folder]
-
-    if '--output' in sys.argv:
-        output_file = sys.argv[sys.argv.index('--output') + 1]
-    else:
-        output_file = 'merged_output.txt'
+    parser = argparse.ArgumentParser(description="Merge multiallelic STR VCFs into one table with AC.")
+    inputs = parser.add_mutually_exclusive_group(required=True)
+    inputs.add_argument("--files", nargs='+', help="VCF .gz files to merge")
+    inputs.add_argument("--folder", help="Folder of .gz files to merge")
+    parser.add_argument("--output", default='merged_output.txt', help="Output file name, written in ./output")
+    parser.add_argument("--resume", action='store_true', help="Continue an interrupted run from the files it had already parsed")
+    parser.add_argument("--checkpoint-dir",
+                        help="Checkpoint parsed files here so the run can be resumed "
+                             "(with --resume alone: ./output/.checkpoint); off by default")
+    add_filter_arguments(parser)
+    args = parser.parse_args()
+    record_filter = filter_from_args(args)
+    files = args.files if args.files is not None else [args.folder]
 
     output_dir = './output'
     os.makedirs(output_dir, exist_ok=True)
 
-    process_vcf_files(files, output_file, output_dir=output_dir)
+    checkpoint = None
+    if args.checkpoint_dir or args.resume:
+        settings = {'files': [os.path.abspath(f) for f in files], 'filters': [args.regions, args.pass_only,
+                    args.min_qual, args.min_ru_length, args.max_ru_length, args.samples]}
+        try:
+            checkpoint = RunCheckpoint(args.checkpoint_dir or os.path.join(output_dir, ".checkpoint"), settings,
+                                       args.resume)
+        except ValueError as error:
+            parser.error(str(error))
+    process_vcf_files(files, args.output, output_dir=output_dir, record_filter=record_filter, checkpoint=checkpoint)
+    if checkpoint is not None:
+        checkpoint.remove()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,115 @@
+import os
+import sys
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import pysam
+except ImportError:
+    pysam = None
+
+from coverage_matrix import DTYPE, target_positions, create_coverage_matrix
+
+# Target rows per task: a task covers one sample over a block of contiguous target runs
+BLOCK_ROWS = 500_000
+
+# Per-worker writable memmap of counts.bin, opened once by _open_counts
+_counts = None
+
+def target_blocks(positions, block_rows=BLOCK_ROWS):
+    """
+    Splits the sorted target positions into (chrom, [(row_start, row_end, first_pos, last_pos), ...])
+    blocks. Each run is a stretch of consecutive bases, queried from the BAM in one call, so gaps
+    between targets are never read; its 1-based first and last positions travel with the task.
+    """
+    blocks = []
+    row_offset = 0
+    for chrom, chrom_positions in positions.items():
+        breaks = np.flatnonzero(np.diff(chrom_positions) != 1) + 1
+        starts = np.concatenate([[0], breaks])
+        ends = np.concatenate([breaks, [len(chrom_positions)]])
+        runs = []
+        n_rows = 0
+        for start, end in zip(starts, ends):
+            runs.append((row_offset + int(start), row_offset + int(end),
+                         int(chrom_positions[start]), int(chrom_positions[end - 1])))
+            n_rows += end - start
+            if n_rows >= block_rows:
+                blocks.append((chrom, runs))
+                runs, n_rows = [], 0
+        if runs:
+            blocks.append((chrom, runs))
+        row_offset += len(chrom_positions)
+    return blocks
+
+def _read_filter(min_mapq):
+    def keep(read):
+        return (read.mapping_quality >= min_mapq and not read.is_unmapped and not read.is_secondary
+                and not read.is_qcfail and not read.is_duplicate)
+    return keep
+
+def _open_counts(output_dir, n_rows, n_samples):
+    """ Worker initializer: maps counts.bin once per process instead of once per task. """
+    global _counts
+    _counts = np.memmap(os.path.join(output_dir, "counts.bin"), dtype=DTYPE, mode='r+', shape=(n_rows, n_samples))
+
+def _fill_block(task):
+    """ Worker: per-base depth of one BAM over one block of target runs, written into its column. """
+    column, bam_file, chrom, runs, min_mapq, min_base_quality = task
+    keep = _read_filter(min_mapq)
+    # Opened per task (a task spans up to block_rows bases), so a worker never holds more than one BAM
+    with pysam.AlignmentFile(bam_file, "rb") as bam:
+        for row_start, row_end, first_pos, last_pos in runs:
+            # count_coverage is 0-based half-open; positions are 1-based
+            acgt = bam.count_coverage(chrom, first_pos - 1, last_pos,
+                                      quality_threshold=min_base_quality, read_callback=keep)
+            _counts[row_start:row_end, column] = np.sum(acgt, axis=0, dtype=np.int64)
+    _counts.flush()
+    return bam_file, chrom
+
+def build_from_bams(target_bed, bam_files, output_dir, workers=None, min_mapq=0, min_base_quality=0,
+                    block_rows=BLOCK_ROWS):
+    """
+    Builds the coverage matrix of all BAMs over the target regions with a process pool.
+    Tasks are (sample, block of target runs) pairs, so a few large BAMs still spread over all workers.
+    """
+    positions = target_positions(target_bed)
+    samples = [os.path.basename(f) for f in bam_files]
+    counts = create_coverage_matrix(output_dir, positions, samples)
+    shape = counts.shape
+    del counts
+
+    blocks = target_blocks(positions, block_rows)
+    tasks = [(column, bam_file, chrom, runs, min_mapq, min_base_quality)
+             for column, bam_file in enumerate(bam_files) for chrom, runs in blocks]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_open_counts, initargs=(output_dir, *shape)) as pool:
+        for done, _ in enumerate(pool.map(_fill_block, tasks), 1):
+            print(f"Coverage blocks done: {done}/{len(tasks)}", end='\r')
+    print()
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-base sample x position coverage matrix from BAM files, restricted to the targets.")
+    parser.add_argument("target_bed", help="Target regions (chr, start, end[, SYMBOL])")
+    parser.add_argument("bam_list", help="File with one BAM path per row (the app's BAM list)")
+    parser.add_argument("--output-dir", default="coverage_matrix", help="Matrix directory to write")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes")
+    parser.add_argument("--mapq", type=int, default=0, help="Minimum mapping quality (the app's MAPQ)")
+    parser.add_argument("--base-qual", type=int, default=0, help="Minimum base quality (the app's base_qual)")
+    parser.add_argument("--block-rows", type=int, default=BLOCK_ROWS, help="Target bases per task")
+    args = parser.parse_args()
+
+    if pysam is None:
+        sys.exit("bam_coverage.py needs pysam (pip install pysam)")
+
+    with open(args.bam_list) as f:
+        bam_files = [line.strip() for line in f if line.strip()]
+    try:
+        build_from_bams(args.target_bed, bam_files, args.output_dir, args.workers,
+                        args.mapq, args.base_qual, args.block_rows)
+    except ValueError as error:
+        parser.error(str(error))
+    print(f"Coverage matrix saved to {args.output_dir}")
+
+if __name__ == "__main__":
+    main()
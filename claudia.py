@@ -4,47 +4,53 @@ import seaborn as sns
 import matplotlib.pyplot as plt
 import sys
 from matplotlib.ticker import FuncFormatter
+from Claudia.summary_stats import SUMMARY_THRESHOLD, summarize_categories, draw_summary
 
-# Dictionary to store extracted data by category
+# Metrics extracted from every CSV file; Indels is derived column-wise
 target_strings = ["Total", "Biallelic", "Multiallelic", "SNPs", "Ti/Tv ratio", "Het/Hom ratio"]
-data_by_category = {key: [] for key in target_strings}
-data_by_category["Indels"] = []  # Add Indels as a category
+
+def parse_metric_lines(lines, target_strings, file_name=""):
+    """ Returns {metric: value} for one metrics file; a metric seen twice keeps its last value. """
+    values = {}
+    for line in lines:
+        fields = line.strip().split(',')
+        for i, field in enumerate(fields):
+            if field in target_strings:
+                # Check if there's a field after the target string
+                if i + 1 < len(fields):
+                    try:
+                        values[field] = float(fields[i + 1])
+                    except ValueError:
+                        print(f"Invalid value for {field} in file {file_name}. Skipping.")
+    return values
 
 def process_csv_files(parent_directory, target_strings):
+    """ Builds a (sample x metric) matrix, one row per CSV file found under parent_directory. """
+    rows = {}
     for root, dirs, files in os.walk(parent_directory):
         for file_name in files:
             if file_name.endswith(".csv"):
                 file_path = os.path.join(root, file_name)
+                # Relative path without extension keeps same-named files in different folders apart
+                sample = os.path.relpath(file_path, parent_directory)[:-len(".csv")]
                 try:
                     with open(file_path, 'r') as file:
-                        total_value = None
-                        snps_value = None
-
-                        for line in file:
-                            fields = line.strip().split(',')
-                            for i, field in enumerate(fields):
-                                if field in target_strings:
-                                    # Check if there's a field after the target string
-                                    if i + 1 < len(fields):
-                                        try:
-                                            value = float(fields[i + 1])
-                                            data_by_category[field].append(value)
-
-                                            # Track Total and SNPs for calculating Indels
-                                            if field == "Total":
-                                                total_value = value
-                                            elif field == "SNPs":
-                                                snps_value = value
-                                        except ValueError:
-                                            print(f"Invalid value for {field} in file {file_name}. Skipping.")
-                                            
-                        # Add Indels to the data_by_category if both Total and SNPs are valid
-                        if total_value is not None and snps_value is not None:
-                            indels_value = total_value - snps_value
-                            data_by_category["Indels"].append(indels_value)
+                        rows[sample] = parse_metric_lines(file, target_strings, file_name)
                 except Exception as e:
                     print(f"Error processing {file_name}: {e}")
 
+    return build_metrics_matrix(rows, target_strings)
+
+def build_metrics_matrix(rows, target_strings):
+    """ Turns {sample: {metric: value}} into a wide DataFrame and adds the derived Indels column. """
+    metrics = pd.DataFrame.from_dict(rows, orient='index', columns=target_strings, dtype=float)
+    metrics.index.name = "Sample"
+    # Files without any of the target metrics contribute nothing, as before
+    metrics = metrics.dropna(how='all')
+    # Indels stays NaN for a sample missing Total or SNPs instead of borrowing another file's values
+    metrics["Indels"] = metrics["Total"] - metrics["SNPs"]
+    return metrics
+
 def format_millions(x, _):
     """Custom formatter for y-axis to display values in millions and thousands."""
     if x >= 1e6:
@@ -53,25 +59,16 @@ def format_millions(x, _):
         return f"{x / 1e3:.1f} K"
     return f"{x:.0f}"
 
-def create_combined_plots(data_by_category):
-    # Convert dictionary to DataFrame for easier plotting
-    plot_data = []
-    for category, values in data_by_category.items():
-        for value in values:
-            plot_data.append({"Category": category, "Value": value})
-
-    plot_df = pd.DataFrame(plot_data)
-
-    # Exclude 'Total' from the main plot
-    main_categories = plot_df[~plot_df["Category"].isin(["Total", "Het/Hom ratio", "Ti/Tv ratio"])]
-    het_hom_ratio = plot_df[plot_df["Category"] == "Het/Hom ratio"].copy()
-    ti_tv_ratio = plot_df[plot_df["Category"] == "Ti/Tv ratio"].copy()
-
-    # Rename categories for plotting
-    main_categories = main_categories.copy()
-    main_categories["Category"] = main_categories["Category"].replace({
+def create_combined_plots(metrics, summary_threshold=SUMMARY_THRESHOLD, summary_kind="box",
+                          output_plot_file="anna.png"):
+    # Bars and dots are drawn straight from the wide (sample x metric) matrix
+    main_categories = metrics[["Biallelic", "Multiallelic", "SNPs", "Indels"]].rename(columns={
         "SNPs": "SNVs"
     })
+    ratios_data = metrics[["Het/Hom ratio", "Ti/Tv ratio"]]
+
+    # Large cohorts get summary plots instead of one dot per sample
+    use_summary = len(metrics) > summary_threshold
 
     # Define custom color palette
     custom_colors = ['crimson', "#EF4026", 'orangered', "#FFA500", 'purple']
@@ -80,54 +77,61 @@ def create_combined_plots(data_by_category):
     fig, axes = plt.subplots(2, 1, figsize=(12, 16), gridspec_kw={'height_ratios': [3, 1]})
 
     # Plot 1: Main categories bar plot
-    sns.barplot(
-        x="Category", y="Value", data=main_categories, palette=custom_colors,
-        errorbar=None, ax=axes[0]
-    )
-    sns.stripplot(
-        x="Category", y="Value", data=main_categories, color='black',
-        jitter=True, dodge=True, ax=axes[0], alpha=0.6
-    )
+    if use_summary:
+        stats = summarize_categories({c: main_categories[c].to_numpy() for c in main_categories})
+        draw_summary(axes[0], stats, custom_colors, kind=summary_kind, annotate=True)
+    else:
+        sns.barplot(
+            data=main_categories, palette=custom_colors,
+            errorbar=None, ax=axes[0]
+        )
+        sns.stripplot(
+            data=main_categories, color='black',
+            jitter=True, dodge=True, ax=axes[0], alpha=0.6
+        )
+
+        # Add value labels on top of each bar in the first plot
+        for p in axes[0].patches:
+            axes[0].annotate(f'{p.get_height():.2f}', (p.get_x() + p.get_width() / 2., p.get_height()),
+                             ha='center', va='center', fontsize=10, color='red', rotation=0,
+                             xytext=(0, 20), textcoords='offset points')
     axes[0].set_title("Variant Categories")
     axes[0].set_ylabel("Value")
     axes[0].set_xlabel("Category")
     axes[0].tick_params(axis='x', rotation=45)
 
-    # Add value labels on top of each bar in the first plot
-    for p in axes[0].patches:
-        axes[0].annotate(f'{p.get_height():.2f}', (p.get_x() + p.get_width() / 2., p.get_height()),
-                         ha='center', va='center', fontsize=10, color='red', rotation=0,
-                         xytext=(0, 20), textcoords='offset points')
-
     # Format y-axis to display 'K' and 'M'
     axes[0].yaxis.set_major_formatter(FuncFormatter(format_millions))
 
     # Plot 2: Het/Hom and Ti/Tv ratios
-    ratios_data = pd.concat([het_hom_ratio, ti_tv_ratio])
-    sns.barplot(
-        x="Category", y="Value", data=ratios_data,
-        palette=["#2a9df4", "#FF6347"], errorbar=None, ax=axes[1]
-    )
-    sns.stripplot(
-        x="Category", y="Value", data=ratios_data, color='black',
-        jitter=True, dodge=True, ax=axes[1], alpha=0.6
-    )
+    ratio_colors = ["#2a9df4", "#FF6347"]
+    if use_summary:
+        stats = summarize_categories({c: ratios_data[c].to_numpy() for c in ratios_data})
+        draw_summary(axes[1], stats, ratio_colors, kind=summary_kind, annotate=True)
+    else:
+        sns.barplot(
+            data=ratios_data,
+            palette=ratio_colors, errorbar=None, ax=axes[1]
+        )
+        sns.stripplot(
+            data=ratios_data, color='black',
+            jitter=True, dodge=True, ax=axes[1], alpha=0.6
+        )
+
+        # Add value labels on top of each bar in the second plot
+        for p in axes[1].patches:
+            axes[1].annotate(f'{p.get_height():.2f}', (p.get_x() + p.get_width() / 2., p.get_height()),
+                             ha='center', va='center', fontsize=10, color='red', rotation=0,
+                             xytext=(0, 20), textcoords='offset points')
     axes[1].set_title("Het/Hom and Ti/Tv Ratios")
     axes[1].set_ylabel("Value")
     axes[1].set_xlabel("Category")
     axes[1].tick_params(axis='x', rotation=45)
 
-    # Add value labels on top of each bar in the second plot
-    for p in axes[1].patches:
-        axes[1].annotate(f'{p.get_height():.2f}', (p.get_x() + p.get_width() / 2., p.get_height()),
-                         ha='center', va='center', fontsize=10, color='red', rotation=0,
-                         xytext=(0, 20), textcoords='offset points')
-
     # Format y-axis for second plot to display 'K' and 'M'
     axes[1].yaxis.set_major_formatter(FuncFormatter(format_millions))
 
     # Save the combined plot
-    output_plot_file = "anna.png"
     plt.tight_layout()
     plt.savefig(output_plot_file)
     plt.close()
@@ -149,5 +153,8 @@ if __name__ == "__main__":
 
     print(f"Using root directory: {root_directory}")
 
-    process_csv_files(root_directory, target_strings)
-    create_combined_plots(data_by_category)
+    metrics = process_csv_files(root_directory, target_strings)
+    if metrics.empty:
+        print("No matching data found.")
+        sys.exit(1)
+    create_combined_plots(metrics)
@@ -0,0 +1,154 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+# Coverage BED rows read per block
+CHUNK_SIZE = 1_000_000
+
+# On-disk layout of a coverage matrix directory (all integers are little-endian int32):
+#   positions.bin  1-based position of every row
+#   counts.bin     row-major (positions x samples) coverage
+#   index.tsv      chrom, row_start, n_rows, first_pos, last_pos
+#   samples.txt    one sample name per column
+DTYPE = np.dtype('<i4')
+
+# Per-worker target positions and writable counts.bin, set once by _init_worker
+_positions = None
+_counts = None
+
+def target_positions(target_bed):
+    """
+    Sorted, de-duplicated 1-based positions covered by a target BED (chr, start, end, ...),
+    per chromosome in the order the chromosomes first appear. A BED without any target base is
+    rejected (ValueError) rather than giving an empty matrix.
+    """
+    targets = pd.read_csv(target_bed, sep='\t', header=None, usecols=[0, 1, 2], comment='#',
+                          names=['chr', 'start', 'end'], dtype={'chr': str, 'start': np.int64, 'end': np.int64})
+    positions = {}
+    for chrom, group in targets.groupby('chr', sort=False):
+        lengths = (group['end'] - group['start']).to_numpy()
+        if lengths.sum() <= 0:
+            continue
+        # BED is 0-based half-open: [start, end) covers bases start + 1 .. end
+        first = np.repeat(group['start'].to_numpy() + 1, lengths)
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        positions[chrom] = np.unique(first + offsets)
+    if not positions:
+        raise ValueError(f"No target bases in {target_bed}")
+    return positions
+
+def create_coverage_matrix(output_dir, positions, samples):
+    """
+    Writes positions.bin, index.tsv and samples.txt and returns a writable int32 memmap of
+    counts.bin (positions x samples, zero-filled) for the caller to fill.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    rows = []
+    row_start = 0
+    for chrom, chrom_positions in positions.items():
+        rows.append((chrom, row_start, len(chrom_positions), int(chrom_positions[0]), int(chrom_positions[-1])))
+        row_start += len(chrom_positions)
+    pd.DataFrame(rows, columns=['chrom', 'row_start', 'n_rows', 'first_pos', 'last_pos']).to_csv(
+        os.path.join(output_dir, "index.tsv"), sep='\t', index=False)
+    np.concatenate(list(positions.values())).astype(DTYPE).tofile(os.path.join(output_dir, "positions.bin"))
+    with open(os.path.join(output_dir, "samples.txt"), 'w') as f:
+        f.write("\n".join(samples) + "\n")
+    return np.memmap(os.path.join(output_dir, "counts.bin"), dtype=DTYPE, mode='w+',
+                     shape=(row_start, len(samples)))
+
+def open_coverage_matrix(matrix_dir, mode='r'):
+    """ Returns (index, positions, counts, samples) of a matrix directory; counts is memory-mapped. """
+    index = pd.read_csv(os.path.join(matrix_dir, "index.tsv"), sep='\t', dtype={'chrom': str})
+    with open(os.path.join(matrix_dir, "samples.txt")) as f:
+        samples = [line.strip() for line in f if line.strip()]
+    positions = np.fromfile(os.path.join(matrix_dir, "positions.bin"), dtype=DTYPE)
+    counts = np.memmap(os.path.join(matrix_dir, "counts.bin"), dtype=DTYPE, mode=mode,
+                       shape=(len(positions), len(samples)))
+    return index, positions, counts, samples
+
+def sample_coverage(bed_file, positions, chunk_size=CHUNK_SIZE):
+    """
+    Coverage of one sample at every target position, from a coverage BED (chr, start, end, count).
+    The BED is streamed in blocks; each interval is located in the sorted target positions with
+    searchsorted and added to a difference array, so the cost is one pass over the file plus one
+    cumulative sum per chromosome, whatever the number of targets. Overlapping intervals add up.
+    """
+    diffs = {chrom: np.zeros(len(p) + 1, dtype=np.int64) for chrom, p in positions.items()}
+    chunks = pd.read_csv(bed_file, sep='\t', header=None, usecols=[0, 1, 2, 3], comment='#',
+                         names=['chr', 'start', 'end', 'count'], dtype={'chr': str},
+                         chunksize=chunk_size)
+    for chunk in chunks:
+        for chrom, group in chunk.groupby('chr', sort=False):
+            if chrom not in positions:
+                continue
+            chrom_positions = positions[chrom]
+            lo = np.searchsorted(chrom_positions, group['start'].to_numpy() + 1, side='left')
+            hi = np.searchsorted(chrom_positions, group['end'].to_numpy(), side='right')
+            count = group['count'].to_numpy(dtype=float)
+            n = len(chrom_positions) + 1
+            diffs[chrom] += np.rint(np.bincount(lo, count, n) - np.bincount(hi, count, n)).astype(np.int64)
+    return np.concatenate([np.cumsum(diffs[chrom][:-1]) for chrom in positions]).astype(DTYPE)
+
+def _init_worker(output_dir, positions, n_samples):
+    """ Worker initializer: receives the target positions and maps counts.bin once per process. """
+    global _positions, _counts
+    _positions = positions
+    n_rows = sum(len(p) for p in positions.values())
+    _counts = np.memmap(os.path.join(output_dir, "counts.bin"), dtype=DTYPE, mode='r+', shape=(n_rows, n_samples))
+
+def _fill_column(task):
+    """ Worker: computes one sample's coverage and writes it into its column of counts.bin. """
+    column, bed_file = task
+    _counts[:, column] = sample_coverage(bed_file, _positions)
+    _counts.flush()
+    return bed_file
+
+def build_from_beds(target_bed, bed_files, output_dir, workers=None):
+    """ Builds the coverage matrix of all coverage BEDs over the target regions, one sample per task. """
+    positions = target_positions(target_bed)
+    samples = [os.path.basename(f) for f in bed_files]
+    counts = create_coverage_matrix(output_dir, positions, samples)
+    del counts
+
+    tasks = list(enumerate(bed_files))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(output_dir, positions, len(samples))) as pool:
+        for done, bed_file in enumerate(pool.map(_fill_column, tasks), 1):
+            print(f"Coverage done: {done}/{len(tasks)} ({bed_file})")
+
+def read_region(matrix_dir, chrom, start, end):
+    """ seqnames/start/end/count_<sample> rows of one region (1-based, inclusive), like coverage_input() in the app. """
+    index, positions, counts, samples = open_coverage_matrix(matrix_dir)
+    entry = index[index['chrom'] == chrom]
+    if entry.empty:
+        return pd.DataFrame(columns=['seqnames', 'start', 'end'] + [f"count_{s}" for s in samples])
+    row_start, n_rows = int(entry['row_start'].iloc[0]), int(entry['n_rows'].iloc[0])
+    chrom_positions = positions[row_start:row_start + n_rows]
+    lo = row_start + np.searchsorted(chrom_positions, start, side='left')
+    hi = row_start + np.searchsorted(chrom_positions, end, side='right')
+    region = pd.DataFrame(np.asarray(counts[lo:hi]), columns=[f"count_{s}" for s in samples])
+    region.insert(0, 'seqnames', chrom)
+    region.insert(1, 'start', positions[lo:hi])
+    region.insert(2, 'end', positions[lo:hi])
+    return region
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-base sample x position coverage matrix from per-sample coverage BEDs.")
+    parser.add_argument("target_bed", help="Target regions (chr, start, end[, SYMBOL])")
+    parser.add_argument("coverage_list", help="File with one coverage BED path per row (the app's coverage list)")
+    parser.add_argument("--output-dir", default="coverage_matrix", help="Matrix directory to write")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes")
+    args = parser.parse_args()
+
+    with open(args.coverage_list) as f:
+        bed_files = [line.strip() for line in f if line.strip()]
+    try:
+        build_from_beds(args.target_bed, bed_files, args.output_dir, args.workers)
+    except ValueError as error:
+        parser.error(str(error))
+    print(f"Coverage matrix saved to {args.output_dir}")
+
+if __name__ == "__main__":
+    main()
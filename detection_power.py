@@ -0,0 +1,150 @@
+import argparse
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from coverage_matrix import open_coverage_matrix
+
+# Matrix rows compared per block when building the track
+BLOCK_ROWS = 1_000_000
+
+def power_table(max_depth, allele_fractions, min_reads):
+    """
+    Detection power P(X > r) for X ~ Binomial(depth, AF), the value the app reports as
+    1 - pbinom(num_all, depth, p), for every depth 0..max_depth, AF and read threshold r,
+    in one vectorized survival-function call. Returns a (depths x AF x r) array.
+    """
+    depths = np.arange(max_depth + 1)
+    allele_fractions = np.asarray(allele_fractions, dtype=float)
+    min_reads = np.asarray(min_reads)
+    return stats.binom.sf(min_reads[None, None, :], depths[:, None, None], allele_fractions[None, :, None])
+
+def interval_table(max_depth, allele_fractions, level=0.95):
+    """ qbinom(0.025) and qbinom(0.975) variant-read bounds per depth and AF, as in the app's message. """
+    depths = np.arange(max_depth + 1)[:, None]
+    allele_fractions = np.asarray(allele_fractions, dtype=float)[None, :]
+    tail = (1 - level) / 2
+    return (stats.binom.ppf(tail, depths, allele_fractions).astype(np.int64),
+            stats.binom.ppf(1 - tail, depths, allele_fractions).astype(np.int64))
+
+def long_table(max_depth, allele_fractions, min_reads, level=0.95):
+    """ One row per (DEPTH, AF, MIN_READS) with POWER and the variant-read interval, for the app to look up. """
+    power = power_table(max_depth, allele_fractions, min_reads)
+    low, high = interval_table(max_depth, allele_fractions, level)
+    depth, af, reads = np.meshgrid(np.arange(max_depth + 1), np.arange(len(allele_fractions)),
+                                   np.arange(len(min_reads)), indexing='ij')
+    return pd.DataFrame({
+        'DEPTH': depth.ravel(),
+        'AF': np.asarray(allele_fractions, dtype=float)[af.ravel()],
+        'MIN_READS': np.asarray(min_reads)[reads.ravel()],
+        'POWER': power.ravel(),
+        'CI_LOW': low[depth.ravel(), af.ravel()],
+        'CI_HIGH': high[depth.ravel(), af.ravel()],
+    })
+
+def minimum_depths(power, min_power):
+    """
+    Smallest depth reaching min_power for every (AF, r); power grows with depth, so a position
+    is under-powered exactly when its coverage is below this value. max_depth + 1 if never reached.
+    """
+    reached = power >= min_power
+    return np.where(reached.any(axis=0), reached.argmax(axis=0), power.shape[0])
+
+def _nonzero_by_sample(mask, row_offset):
+    """ (sample, row) of the set cells of a (rows x samples) mask, rows shifted by row_offset. """
+    samples, rows = np.nonzero(mask.T)
+    return samples, rows + row_offset
+
+def under_powered_runs(positions, low_blocks):
+    """
+    Collapses under-powered masks into runs of consecutive bases. low_blocks yields the consecutive
+    (rows x samples) masks of one chromosome, block by block; only the last row of the previous block
+    is carried over, so memory stays at one block. Returns (sample, first row, last row) arrays
+    ordered by sample, then row; gaps between target regions end a run.
+    """
+    starts, ends = [], []
+    previous = None  # last mask row of the previous block, whose run ends are decided by this block
+    offset = 0
+    for low in low_blocks:
+        block_positions = positions[offset:offset + len(low)]
+        gap = np.ones(len(low), dtype=bool)
+        gap[1:] = block_positions[1:] != block_positions[:-1] + 1
+        before = np.zeros(low.shape[1], dtype=bool) if previous is None else previous
+        if previous is not None:
+            gap[0] = block_positions[0] != positions[offset - 1] + 1
+            ended = previous & (~low[0] | gap[0])
+            ends.append((np.flatnonzero(ended), np.full(ended.sum(), offset - 1)))
+
+        starts.append(_nonzero_by_sample(low[:1] & (~before | gap[0]), offset))
+        starts.append(_nonzero_by_sample(low[1:] & (~low[:-1] | gap[1:, None]), offset + 1))
+        ends.append(_nonzero_by_sample(low[:-1] & (~low[1:] | gap[1:, None]), offset))
+        previous = low[-1]
+        offset += len(low)
+    if previous is not None:
+        ends.append((np.flatnonzero(previous), np.full(previous.sum(), offset - 1)))
+    if not starts:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+
+    start_samples, start_rows = (np.concatenate(parts) for parts in zip(*starts))
+    end_samples, end_rows = (np.concatenate(parts) for parts in zip(*ends))
+    # Every run has one start and one end, so both lists pair up once ordered by sample, then row
+    start_order = np.lexsort((start_rows, start_samples))
+    end_order = np.lexsort((end_rows, end_samples))
+    return start_samples[start_order], start_rows[start_order], end_rows[end_order]
+
+def under_powered_track(matrix_dir, allele_fraction, min_reads, min_depth, block_rows=BLOCK_ROWS):
+    """
+    BED-like runs (chrom, start, end, sample) of target bases whose coverage is below min_depth.
+    The matrix is compared block_rows rows at a time, so memory does not grow with the chromosome.
+    """
+    index, positions, counts, samples = open_coverage_matrix(matrix_dir)
+    samples = np.asarray(samples, dtype=object)
+    frames = []
+    for entry in index.itertuples():
+        chrom_positions = positions[entry.row_start:entry.row_start + entry.n_rows]
+        low_blocks = (np.asarray(counts[entry.row_start + start:entry.row_start + min(start + block_rows, entry.n_rows)])
+                      < min_depth for start in range(0, entry.n_rows, block_rows))
+        run_samples, first, last = under_powered_runs(chrom_positions, low_blocks)
+        frames.append(pd.DataFrame({
+            'chrom': entry.chrom,
+            # BED: 0-based start, 1-based inclusive end
+            'start': chrom_positions[first] - 1,
+            'end': chrom_positions[last],
+            'sample': samples[run_samples],
+        }))
+    track = pd.concat(frames, ignore_index=True)
+    track['AF'] = allele_fraction
+    track['MIN_READS'] = min_reads
+    track['MIN_DEPTH'] = min_depth
+    return track.sort_values(by=['sample', 'chrom', 'start'], kind='stable')
+
+def main():
+    parser = argparse.ArgumentParser(description="Binomial detection-power table and under-powered target positions.")
+    parser.add_argument("--matrix-dir", help="Coverage matrix from coverage_matrix.py / bam_coverage.py")
+    parser.add_argument("--max-depth", type=int, default=None, help="Largest depth in the table (default: matrix maximum, or 1000)")
+    parser.add_argument("--af", type=float, nargs='+', default=[0.05], help="Allele fractions (the app's 'Allele Fraction')")
+    parser.add_argument("--min-reads", type=int, nargs='+', default=[10], help="Variant read thresholds (the app's 'Variant reads')")
+    parser.add_argument("--min-power", type=float, default=0.95, help="Power below which a position is under-powered")
+    parser.add_argument("--table", default="detection_power.tsv", help="Power lookup table")
+    parser.add_argument("--track", default="underpowered.bed", help="Under-powered positions track")
+    args = parser.parse_args()
+
+    max_depth = args.max_depth
+    if max_depth is None:
+        max_depth = int(np.max(open_coverage_matrix(args.matrix_dir)[2])) if args.matrix_dir else 1000
+
+    table = long_table(max_depth, args.af, args.min_reads)
+    table.to_csv(args.table, sep='\t', index=False, float_format='%.6g')
+    print(f"Power table ({len(table)} rows) saved to {args.table}")
+
+    if args.matrix_dir:
+        depths = minimum_depths(power_table(max_depth, args.af, args.min_reads), args.min_power)
+        tracks = [under_powered_track(args.matrix_dir, af, r, int(depths[i, j]))
+                  for i, af in enumerate(args.af) for j, r in enumerate(args.min_reads)]
+        track = pd.concat(tracks, ignore_index=True)
+        track.to_csv(args.track, sep='\t', index=False, header=False)
+        print(f"{len(track)} under-powered runs saved to {args.track}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The scripts import their siblings by name, as they do when run from their own folder
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for folder in ['NDD', 'Project', '']:
+    sys.path.insert(0, os.path.join(ROOT, folder))
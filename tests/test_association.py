@@ -0,0 +1,18 @@
+import pandas as pd
+
+import association
+
+def allele_table(rows):
+    return pd.DataFrame(rows, columns=association.KEY_COLUMNS + ['AC_CASE', 'AC_CONTROL'])
+
+def test_window_association_counts_loci_per_window():
+    table = allele_table([['chr1', 100, 'N', '<STR>', '130', 'CAG', 'a', 2, 0],
+                          ['chr1', 350, 'N', '<STR>', '380', 'CAG', 'b', 1, 1]])
+    windows = association.window_association(table, 10, 10, window_size=400, window_step=200)
+    assert windows[['START', 'N_LOCI', 'AC_CASE', 'AC_CONTROL']].values.tolist() == [[0, 2, 3, 1], [200, 1, 1, 1]]
+
+def test_window_association_of_an_empty_table():
+    windows = association.window_association(allele_table([]), 10, 10, window_size=400, window_step=200)
+    assert windows.empty
+    assert list(windows.columns) == ['CHROM', 'START', 'END', 'N_LOCI', 'AC_CASE', 'AC_CONTROL',
+                                     'OR', 'FISHER_P', 'CHI2_P', 'BINOM_P', 'FISHER_Q', 'CHI2_Q', 'BINOM_Q']
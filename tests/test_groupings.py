@@ -0,0 +1,36 @@
+import gzip
+import os
+
+import groupings
+
+MERGED_HEADER = "CHROM\tPOS\tREF\tALT\tEND\tREP_UNIT\tVAR_ID\tAC\tS1\tS2\n"
+VCF = ("##fileformat=VCFv4.1\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\n"
+       "chr1\t100\t.\tN\t<STR12>\t.\tPASS\tEND=130;REF=10;RU=CAG;VARID=chr1_100;REPID=chr1_100\tGT:SO\t0/1:SPANNING\n")
+
+def write_merged(path, genotypes):
+    with open(path, 'w') as f:
+        f.write(MERGED_HEADER + "chr1\t100\tN\t<STR12>\t130\tCAG\tchr1_100\t1\t" + "\t".join(genotypes) + "\n")
+
+def test_cached_matrix_is_rebuilt_when_an_input_changes(tmp_path):
+    merged = tmp_path / "cases_1.txt"
+    matrix_dir = str(tmp_path / "matrix")
+    write_merged(merged, ["0/1", "./."])
+    _, dosages, _ = groupings.load_or_build_matrix(matrix_dir, merged_files=[str(merged)])
+    assert dosages.tolist() == [[1, 0]]
+
+    write_merged(merged, ["1/1", "0/1"])
+    os.utime(merged, ns=(0, os.stat(merged).st_mtime_ns + 10**9))
+    _, dosages, _ = groupings.load_or_build_matrix(matrix_dir, merged_files=[str(merged)])
+    assert dosages.tolist() == [[2, 1]]
+
+    # Without inputs the cache is used as it is
+    _, dosages, _ = groupings.load_or_build_matrix(matrix_dir)
+    assert dosages.tolist() == [[2, 1]]
+
+def test_folder_is_searched_recursively(tmp_path):
+    os.makedirs(tmp_path / "vcf" / "batch1")
+    with gzip.open(tmp_path / "vcf" / "batch1" / "S1.vcf.gz", 'wt') as f:
+        f.write(VCF)
+    loci, dosages, samples = groupings.load_or_build_matrix(str(tmp_path / "matrix"), folder=str(tmp_path / "vcf"))
+    assert samples == ["S1"]
+    assert dosages.tolist() == [[1]]
@@ -0,0 +1,32 @@
+import gzip
+import os
+
+import parsing_multiallelic
+from vcf_filters import RecordFilter
+
+HEADER = "##fileformat=VCFv4.1\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\n"
+RECORD = "chr1\t100\t.\tN\t<STR12>\t.\tPASS\tEND=130;REF=10;RU=CAG;VARID=chr1_100;REPID=chr1_100\tGT:SO\t0/1:SPANNING\n"
+
+def write_vcf(path, records):
+    with gzip.open(path, 'wt') as f:
+        f.write(HEADER + records)
+
+def test_merges_records(tmp_path):
+    write_vcf(tmp_path / "S1.vcf.gz", RECORD)
+    parsing_multiallelic.process_vcf_files([str(tmp_path)], "merged.txt", output_dir=str(tmp_path))
+    with open(tmp_path / "merged.txt") as f:
+        lines = f.read().splitlines()
+    assert len(lines) == 2
+    assert lines[1].split('\t')[6] == '1'  # AC
+
+def test_filters_rejecting_every_record_write_nothing(tmp_path, capsys):
+    write_vcf(tmp_path / "S1.vcf.gz", RECORD)
+    record_filter = RecordFilter(min_ru_length=5)
+    parsing_multiallelic.process_vcf_files([str(tmp_path)], "merged.txt", output_dir=str(tmp_path),
+                                           record_filter=record_filter)
+    assert not os.path.exists(tmp_path / "merged.txt")
+    assert "nothing written" in capsys.readouterr().out
+
+def test_folder_without_vcfs(tmp_path):
+    parsing_multiallelic.process_vcf_files([str(tmp_path)], "merged.txt", output_dir=str(tmp_path))
+    assert not os.path.exists(tmp_path / "merged.txt")
@@ -0,0 +1,30 @@
+import gzip
+import threading
+
+from prefetch import prefetch_files
+
+def write_lines(path, n_lines):
+    with gzip.open(path, 'wt') as f:
+        f.write(''.join(f"line {i}\n" for i in range(n_lines)))
+
+def reader_threads():
+    return [t for t in threading.enumerate() if t.name.startswith("prefetch ")]
+
+def test_reads_every_line_in_order(tmp_path):
+    paths = [str(tmp_path / f"{i}.gz") for i in range(4)]
+    for path in paths:
+        write_lines(path, 1000)
+    for path, lines in prefetch_files(paths, files_ahead=1, block_size=512):
+        assert list(lines) == [f"line {i}".encode() for i in range(1000)]
+    assert not reader_threads()
+
+def test_close_mid_file_stops_every_reader(tmp_path):
+    paths = [str(tmp_path / f"{i}.gz") for i in range(4)]
+    for path in paths:
+        write_lines(path, 200_000)
+    # Tiny blocks and queues keep the readers blocked on a full queue when the caller stops
+    files = prefetch_files(paths, files_ahead=2, queue_blocks=1, block_size=256)
+    path, lines = next(files)
+    next(lines)
+    files.close()
+    assert not reader_threads()